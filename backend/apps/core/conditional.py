@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def conditional_response(request, etag: str, last_modified: datetime | None, build):
+    """
+    Answer ``If-None-Match``/``If-Modified-Since`` with a 304 when the client's
+    copy is still current, otherwise call ``build()`` for the full response.
+    Either way the ETag and Last-Modified validators are set on the result.
+    """
+    etag = quote_etag(etag)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build()
+
+    response["ETag"] = etag
+    if timestamp is not None:
+        response["Last-Modified"] = http_date(timestamp)
+    return response
@@ -0,0 +1,6 @@
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream service whose circuit breaker is open."""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit for '{name}' is open, skipping the request.")
+        self.name = name
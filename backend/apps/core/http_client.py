@@ -0,0 +1,167 @@
+import threading
+import time
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+from .exceptions import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLIENT_OPTIONS = {
+    "connect_timeout": 3.05,
+    "read_timeout": 15,
+    "retries": 2,
+    # A read timeout means the upstream got the request and is still working on
+    # it, retrying would only multiply the wait, so only connect errors and
+    # retryable status codes are retried by default
+    "read_retries": 0,
+    "backoff_factor": 0.3,
+    "backoff_jitter": 0.3,
+    "pool_maxsize": 10,
+    "failure_threshold": 5,
+    "reset_timeout": 30,
+}
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and rejects calls for
+    ``reset_timeout`` seconds. After that one trial call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if (
+                self.state == self.OPEN
+                and time.monotonic() - self.opened_at >= self.reset_timeout
+            ):
+                self.state = self.HALF_OPEN
+                return True
+            # Either still open, or a half-open trial call is already in flight
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Give back a half-open trial slot whose call never got an answer."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                # opened_at is already past reset_timeout, the next call is the trial
+                self.state = self.OPEN
+
+
+class HttpClient:
+    """
+    Shared transport for calls to external services: a pooled keep-alive
+    session, connect/read timeouts on every request, bounded retries with
+    jittered backoff and a circuit breaker in front of it all.
+    """
+
+    def __init__(self, name: str, **options):
+        options = {**DEFAULT_CLIENT_OPTIONS, **options}
+        self.name = name
+        self.timeout = (options["connect_timeout"], options["read_timeout"])
+        self.breaker = CircuitBreaker(
+            options["failure_threshold"], options["reset_timeout"]
+        )
+
+        retry = Retry(
+            total=options["retries"],
+            read=options["read_retries"],
+            backoff_factor=options["backoff_factor"],
+            backoff_jitter=options["backoff_jitter"],
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=None,  # upstream calls are idempotent, POST included
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=options["pool_maxsize"],
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(self.name)
+
+        kwargs.setdefault("timeout", self.timeout)
+        succeeded = None
+        try:
+            response = self.session.request(method, url, **kwargs)
+            succeeded = response.status_code < 500
+        except requests.RequestException:
+            succeeded = False
+            raise
+        finally:
+            if succeeded is None:
+                # Raised before reaching the upstream (say a TypeError encoding
+                # json=), which says nothing about its health
+                self.breaker.release_trial()
+            elif succeeded:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+_clients: dict[str, HttpClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_http_client(name: str) -> HttpClient:
+    """
+    Return the process-wide client for an upstream service, configured from
+    ``settings.EXTERNAL_HTTP_CLIENTS[name]`` on top of the defaults.
+    """
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                options = getattr(settings, "EXTERNAL_HTTP_CLIENTS", {}).get(name, {})
+                client = HttpClient(name, **options)
+                _clients[name] = client
+                logger.info("Created HTTP client for %s with options %s", name, options)
+    return client
@@ -0,0 +1,141 @@
+import json
+import random
+import statistics
+import time
+import uuid
+from datetime import UTC, date, datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from ...renderer import PreRenderedJSON, StandardResponseRenderer, orjson
+
+
+class _Response:
+    status_code = 200
+
+
+def trip_payload(days: int, events_per_day: int, seed: int = 0) -> dict:
+    """
+    Shaped like TripDetailSerializer output: fields are already strings except
+    for related primary keys, which DRF leaves as UUIDs.
+    """
+    rng = random.Random(seed)
+    trip_id = uuid.uuid4()
+    start_date = date(2030, 1, 1)
+    return {
+        "id": str(trip_id),
+        "name": "Benchmark trip",
+        "start_date": start_date.isoformat(),
+        "end_date": (start_date + timedelta(days=days - 1)).isoformat(),
+        "created_at": datetime.now(UTC).isoformat(),
+        "is_public": False,
+        "public_url": None,
+        "total_days": days,
+        "trip_days": [
+            {
+                "id": str(uuid.uuid4()),
+                "trip": trip_id,
+                "date": (start_date + timedelta(days=d)).isoformat(),
+                "events": [
+                    {
+                        "id": str(uuid.uuid4()),
+                        "trip_day": uuid.uuid4(),
+                        "place_details": {
+                            "id": str(uuid.uuid4()),
+                            "external_id": uuid.uuid4().hex,
+                            "name": f"Stop {d}-{e}",
+                            "address": "1 Rue de Rivoli, 75001 Paris, France",
+                            "latitude": f"{48.8 + rng.random() / 10:.16f}",
+                            "longitude": f"{2.3 + rng.random() / 10:.16f}",
+                        },
+                        "notes": "Book tickets in advance" if e % 3 == 0 else None,
+                        "position": e + 1,
+                        "type": "ACTIVITY",
+                    }
+                    for e in range(events_per_day)
+                ],
+            }
+            for d in range(days)
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare StandardResponseRenderer against the plain DRF JSONRenderer "
+        "on trip sized payloads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30)
+        parser.add_argument("--events", type=int, default=8, help="Events per day.")
+        parser.add_argument("--repeat", type=int, default=200)
+        parser.add_argument("--output", help="Also write the results as JSON here.")
+
+    def handle(self, *args, **options):
+        data = trip_payload(options["days"], options["events"])
+        context = {"response": _Response()}
+        standard = StandardResponseRenderer()
+        drf = JSONRenderer()
+        snapshot = PreRenderedJSON(standard.encode(data))
+
+        def render_drf():
+            # What StandardResponseRenderer did before: envelope, then stdlib json
+            return drf.render(
+                {"status": True, "message": "OK", "data": data},
+                "application/json",
+                context,
+            )
+
+        scenarios = {
+            "drf_json": render_drf,
+            "standard": lambda: standard.render(data, "application/json", context),
+            "pre_rendered": lambda: standard.render(
+                snapshot, "application/json", context
+            ),
+        }
+
+        expected = json.loads(render_drf())
+        results = {}
+        for name, render in scenarios.items():
+            if json.loads(render()) != expected:
+                raise RuntimeError(f"{name} renders a different document")
+
+            samples = []
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                render()
+                samples.append(time.perf_counter() - start)
+            results[name] = {
+                "median_ms": round(statistics.median(samples) * 1000, 4),
+                "min_ms": round(min(samples) * 1000, 4),
+                "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+            }
+
+        baseline = results["drf_json"]["median_ms"]
+        self.stdout.write(
+            f"payload {len(snapshot.content) / 1024:.1f} KiB, "
+            f"orjson {'enabled' if orjson else 'not installed'}"
+        )
+        for name, result in results.items():
+            result["speedup"] = round(baseline / result["median_ms"], 2)
+            self.stdout.write(
+                f"{name:<14} median {result['median_ms']:>9.4f} ms   "
+                f"x{result['speedup']}"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as report_file:
+                json.dump(
+                    {
+                        "params": {
+                            key: options[key] for key in ["days", "events", "repeat"]
+                        },
+                        "orjson": orjson.__version__ if orjson else None,
+                        "payload_bytes": len(snapshot.content),
+                        "scenarios": results,
+                    },
+                    report_file,
+                    indent=2,
+                )
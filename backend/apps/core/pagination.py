@@ -0,0 +1,60 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination, newest first. Pages are fetched with a
+    ``WHERE created_at < <cursor>`` on an index instead of an OFFSET, so deep
+    pages cost the same as the first one. The total is only counted (an extra
+    ``COUNT(*)``) when asked for with ``?count=true``. A view can page by
+    another key by defining ``get_pagination_ordering()``.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    count_query_param = "count"
+
+    def get_ordering(self, request, queryset, view):
+        # Views can key a narrower list differently, e.g. one day's events by position
+        get_ordering = getattr(view, "get_pagination_ordering", None)
+        ordering = get_ordering() if get_ordering else None
+        return ordering or super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ["1", "true"]:
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "count": self.count,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count"] = {
+            "type": "integer",
+            "nullable": True,
+            "example": 123,
+        }
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.count_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Include the total number of results.",
+                "schema": {"type": "boolean"},
+            }
+        ]
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """Messages of one channel for one listener, read from its event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_pending: int):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        # Set once messages had to be dropped, the listener has to resync
+        self.overflowed = False
+
+    def deliver(self, message: dict):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The listener's loop is gone, it will unsubscribe on its way out
+            pass
+
+    def _put(self, message: dict):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            # Drop the backlog, the listener resyncs from scratch anyway
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self) -> dict | None:
+        """The next message, or None once messages were dropped."""
+        return await self.queue.get()
+
+
+class InProcessBroker:
+    """
+    Publish/subscribe between the requests of this process. Publishing is
+    thread-safe and never blocks, a listener that falls more than
+    ``max_pending`` messages behind gets None and should resync.
+
+    Listeners on other processes hear nothing, set PUBSUB_BROKER to a broker
+    with the same publish()/subscribe() interface to go beyond one process.
+    """
+
+    def __init__(self, max_pending: int = 256):
+        self.max_pending = max_pending
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel: str, message: dict):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        subscription = Subscription(asyncio.get_running_loop(), self.max_pending)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                subscriptions = self._subscriptions.get(channel, set())
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    self._subscriptions.pop(channel, None)
+
+    def subscriber_count(self, channel: str) -> int:
+        with self._lock:
+            return len(self._subscriptions.get(channel, ()))
+
+
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def get_broker():
+    """The PUBSUB_BROKER instance of this process, built on first use."""
+    path = settings.PUBSUB_BROKER
+    with _brokers_lock:
+        if path not in _brokers:
+            _brokers[path] = import_string(path)()
+        return _brokers[path]
@@ -1,4 +1,12 @@
+import json
+
 from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
 
 
 def _first_str(value, default: str) -> str:
@@ -10,14 +18,48 @@ def _first_str(value, default: str) -> str:
     return default
 
 
+class PreRenderedJSON:
+    """
+    Response data that is already JSON, e.g. a stored snapshot. The renderer
+    splices it into the envelope as is instead of decoding and re-encoding it.
+    """
+
+    __slots__ = ["content"]
+
+    def __init__(self, content: bytes | str):
+        self.content = content.encode() if isinstance(content, str) else content
+
+
+_drf_encoder = encoders.JSONEncoder()
+
+if orjson is not None:
+    # UTC as "Z", like DRF's encoder
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+
+def _orjson_default(obj):
+    # Lazy strings, Decimals, generators... whatever DRF's encoder knows about
+    return _drf_encoder.default(obj)
+
+
 class StandardResponseRenderer(JSONRenderer):
     def render(self, data, accepted_media_type=None, renderer_context=None):
         renderer_context = renderer_context or {}
         response = renderer_context.get("response")
         status_code = response.status_code if response else 200
+
+        if isinstance(data, PreRenderedJSON):
+            if (
+                response is not None
+                and status_code < 400
+                and not self.get_indent(accepted_media_type, renderer_context)
+            ):
+                return b'{"status":true,"message":"OK","data":' + data.content + b"}"
+            data = json.loads(data.content)
+
         # If DRF did not provide a response object, fallback to default JSON rendering.
         if response is None:
-            return super().render(data, accepted_media_type, renderer_context)
+            return self.encode(data, accepted_media_type, renderer_context)
 
         formatted_data: dict = {"status": True, "message": "OK", "data": data}
 
@@ -42,4 +84,30 @@ class StandardResponseRenderer(JSONRenderer):
                 "previous": data.get("previous"),
             }
 
-        return super().render(formatted_data, accepted_media_type, renderer_context)
+        return self.encode(formatted_data, accepted_media_type, renderer_context)
+
+    def encode(self, data, accepted_media_type=None, renderer_context=None) -> bytes:
+        """
+        The output of JSONRenderer.render(), through orjson when it is installed.
+        The bytes match except for floats: orjson writes small ones without an
+        exponent (``0.00001`` for ``1e-05``) and NaN/Infinity as ``null``, where
+        DRF's strict encoder raises. Indented output (the browsable API) keeps
+        using the stdlib encoder.
+        """
+        if (
+            orjson is None
+            or data is None
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            content = orjson.dumps(data, default=_orjson_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Integers past 64 bits and the like, leave them to the stdlib
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Like JSONRenderer, escape the two line terminators JavaScript chokes on
+        return content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
@@ -0,0 +1,106 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def parse_field_paths(value: str | None) -> dict | None:
+    """
+    ``"name,trip_days.date,trip_days.events"`` as a tree of dicts:
+    ``{"name": {}, "trip_days": {"date": {}, "events": {}}}``.
+    None when the parameter was not given at all.
+    """
+    if value is None:
+        return None
+
+    tree = {}
+    for path in value.split(","):
+        node = tree
+        for name in path.strip().split("."):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+def prune_fields(fields, only: dict | None, expand: dict | None):
+    """
+    Drop the readable fields not listed in ``only`` (when it lists any at this
+    level) and the nested serializers not listed in ``expand`` (when it is given),
+    then recurse into the nested serializers that are left.
+    """
+    for name in list(fields):
+        field = fields[name]
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        is_nested = isinstance(nested, serializers.BaseSerializer)
+
+        if field.write_only:
+            # Never rendered anyway, and writes still need them
+            continue
+        if (only and name not in only) or (
+            is_nested and expand is not None and name not in expand
+        ):
+            del fields[name]
+        elif is_nested:
+            prune_fields(
+                nested.fields,
+                only.get(name) if only else None,
+                expand.get(name) if expand is not None else None,
+            )
+
+
+class DynamicFieldsMixin:
+    """
+    Lets clients shape a read with dotted paths into the nested serializers:
+    ``?fields=`` keeps only the listed fields and ``?expand=`` embeds only the
+    listed nested serializers (all of them are embedded without it), e.g.
+    ``?fields=name,trip_days.date&expand=trip_days``.
+
+    Only the serializer the view creates reads the request, the nested ones
+    are pruned through it.
+    """
+
+    fields_query_param = "fields"
+    expand_query_param = "expand"
+
+    def get_fields(self):
+        fields = super().get_fields()
+
+        request = self.context.get("request")
+        parent = getattr(self, "parent", None)
+        is_root = parent is None or (
+            isinstance(parent, serializers.ListSerializer)
+            and getattr(parent, "parent", None) is None
+        )
+        if request is not None and is_root:
+            prune_fields(
+                fields,
+                parse_field_paths(request.query_params.get(self.fields_query_param)),
+                parse_field_paths(request.query_params.get(self.expand_query_param)),
+            )
+        return fields
+
+
+def has_dynamic_fields(request) -> bool:
+    return any(
+        param in request.query_params
+        for param in [
+            DynamicFieldsMixin.fields_query_param,
+            DynamicFieldsMixin.expand_query_param,
+        ]
+    )
+
+
+def model_field_names(serializer, model, required=()) -> list[str]:
+    """
+    Model fields the serializer's readable fields are sourced from, plus the
+    primary key and ``required``, for ``QuerySet.only()``.
+    """
+    names = {model._meta.pk.name, *required}
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*":
+            continue
+        try:
+            model_field = model._meta.get_field(field.source.split(".")[0])
+        except FieldDoesNotExist:
+            continue
+        if model_field.concrete:
+            names.add(model_field.name)
+    return sorted(names)
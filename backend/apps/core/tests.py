@@ -1 +1,248 @@
-# Create your tests here.
+import json
+import threading
+import time
+import uuid
+from datetime import UTC, datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .exceptions import CircuitOpenError
+from .http_client import CircuitBreaker, HttpClient
+from .renderer import PreRenderedJSON, StandardResponseRenderer
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch(
+            "apps.core.http_client.time.monotonic", side_effect=lambda: self.now
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    def open(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        # A success resets the count
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow_request())
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_half_open_trial_closes(self):
+        self.open()
+        self.now += 29
+        self.assertFalse(self.breaker.allow_request())
+
+        self.now += 1
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        # Only one trial call at a time
+        self.assertFalse(self.breaker.allow_request())
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_failed_trial_opens_again(self):
+        self.open()
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_released_trial_is_given_to_the_next_call(self):
+        self.open()
+        self.now += 30
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.release_trial()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+
+class UpstreamServer:
+    """Answers each POST with the next of ``statuses`` after ``delay`` seconds."""
+
+    def __init__(self, statuses=(200,), delay=0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.request_count = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                server.request_count += 1
+                status = server.statuses[
+                    min(server.request_count, len(server.statuses)) - 1
+                ]
+                time.sleep(server.delay)
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        host, port = self._server.server_address[:2]
+        self.url = f"http://{host}:{port}/"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class HttpClientTests(SimpleTestCase):
+    def http_client(self, **options):
+        return HttpClient(
+            "test", backoff_factor=0, backoff_jitter=0, failure_threshold=2, **options
+        )
+
+    def test_retries_status_codes(self):
+        with UpstreamServer(statuses=[503, 503, 200]) as upstream:
+            response = self.http_client(retries=2).post(upstream.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(upstream.request_count, 3)
+
+    def test_read_timeout_is_not_retried(self):
+        client = self.http_client(retries=2, read_timeout=0.1)
+        with UpstreamServer(delay=0.5) as upstream:
+            with self.assertRaises(requests.ConnectionError):
+                client.post(upstream.url)
+            self.assertEqual(upstream.request_count, 1)
+
+            with self.assertRaises(requests.ConnectionError):
+                client.post(upstream.url)
+            # The breaker opened after the second failure
+            with self.assertRaises(CircuitOpenError):
+                client.post(upstream.url)
+            self.assertEqual(upstream.request_count, 2)
+
+    def test_trial_call_that_never_leaves(self):
+        client = self.http_client(retries=0, reset_timeout=0)
+        with UpstreamServer(statuses=[500, 500, 200]) as upstream:
+            client.post(upstream.url)
+            client.post(upstream.url)
+            self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+            # The half-open trial fails encoding the body, before any request
+            with self.assertRaises(TypeError):
+                client.post(upstream.url, json={"at": object()})
+            self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+            response = client.post(upstream.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+
+class StandardResponseRendererTests(SimpleTestCase):
+    data = {
+        "id": uuid.UUID("6f1c2a84-7d43-4a4e-9a31-5d8e0f1b2c3d"),
+        "created_at": datetime(2026, 10, 18, 9, 30, 15, 123456, tzinfo=UTC),
+        "price": Decimal("12.50"),
+        "name": gettext_lazy("Café \u2028 corner"),
+        "tags": ["a", "b"],
+        "position": 1024,
+        "lat": 48.8566,
+        "note": None,
+    }
+
+    def render(self, data, status=200):
+        response = Response(status=status)
+        return StandardResponseRenderer().render(
+            data, "application/json", {"response": response}
+        )
+
+    def assertRendersLike(self, content, expected):
+        self.assertEqual(content, JSONRenderer().render(expected))
+
+    def test_success(self):
+        self.assertRendersLike(
+            self.render(self.data),
+            {"status": True, "message": "OK", "data": self.data},
+        )
+
+    def test_error(self):
+        errors = {"name": ["This field is required."]}
+        self.assertRendersLike(
+            self.render({"detail": "Not found."}, status=404),
+            {
+                "status": False,
+                "message": "Not found.",
+                "errors": {"detail": "Not found."},
+            },
+        )
+        self.assertRendersLike(
+            self.render(errors, status=400),
+            {"status": False, "message": "An error occurred", "errors": errors},
+        )
+
+    def test_paginated(self):
+        page = {
+            "count": None,
+            "next": "http://testserver/api/trips/?cursor=cD0y",
+            "previous": None,
+            "results": [self.data],
+        }
+        self.assertRendersLike(
+            self.render(page),
+            {
+                "status": True,
+                "message": "OK",
+                "data": [self.data],
+                "meta": {
+                    "count": None,
+                    "next": page["next"],
+                    "previous": None,
+                },
+            },
+        )
+
+    def test_pre_rendered(self):
+        content = JSONRenderer().render(self.data)
+        self.assertRendersLike(
+            self.render(PreRenderedJSON(content)),
+            {"status": True, "message": "OK", "data": self.data},
+        )
+        # Errors still go through the envelope of their own
+        self.assertRendersLike(
+            self.render(PreRenderedJSON(b'{"detail": "Gone."}'), status=410),
+            {"status": False, "message": "Gone.", "errors": {"detail": "Gone."}},
+        )
+
+    def test_float_spelling(self):
+        # orjson writes small floats without an exponent and non-finite ones as
+        # null: same values, where DRF's encoder would spell or reject them
+        content = self.render({"distance": 1e-05, "missing": float("nan")})
+        self.assertEqual(
+            content,
+            b'{"status":true,"message":"OK","data":{"distance":0.00001,"missing":null}}',
+        )
+        self.assertEqual(json.loads(content)["data"]["distance"], 1e-05)
@@ -1,6 +1,15 @@
 from django.contrib import admin
 
-from apps.itineraries.models import Event, Lodging, Trip, TripDay, TripSavedPlace
+from apps.itineraries.models import (
+    Event,
+    Lodging,
+    RouteOptimizationJob,
+    Trip,
+    TripDay,
+    TripSavedPlace,
+    TripSnapshot,
+    TripTombstone,
+)
 
 # Register your models here.
 admin.site.register(Event)
@@ -8,3 +17,6 @@ admin.site.register(Lodging)
 admin.site.register(Trip)
 admin.site.register(TripDay)
 admin.site.register(TripSavedPlace)
+admin.site.register(RouteOptimizationJob)
+admin.site.register(TripSnapshot)
+admin.site.register(TripTombstone)
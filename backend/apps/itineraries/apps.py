@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ItinerariesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.itineraries"
+
+    def ready(self):
+        import apps.itineraries.signals  # noqa
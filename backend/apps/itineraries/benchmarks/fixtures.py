@@ -0,0 +1,87 @@
+import random
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+from apps.places.models import Place
+from ..models import POSITION_GAP, Event, Lodging, Trip, TripDay, UserTrip
+
+# Rough city bounding box (lat, lng) the synthetic places are scattered in
+DEFAULT_CENTER = (48.8566, 2.3522)
+DEFAULT_SPREAD = 0.08
+
+
+def generate_trip(
+    user,
+    days: int,
+    events_per_day: int,
+    seed: int = 0,
+    with_lodging: bool = True,
+    center=DEFAULT_CENTER,
+    spread: float = DEFAULT_SPREAD,
+) -> Trip:
+    """
+    Create a trip of ``days`` days with ``events_per_day`` events each (and a
+    lodging covering the whole stay) using bulk inserts.
+    """
+    rng = random.Random(seed)
+    start_date = date(2030, 1, 1)
+    end_date = start_date + timedelta(days=days - 1)
+
+    trip = Trip.objects.create(
+        name=f"Benchmark trip {days}x{events_per_day}",
+        start_date=start_date,
+        end_date=end_date,
+        user=user,
+    )
+    UserTrip.objects.create(user=user, trip=trip)
+    trip_days = TripDay.objects.bulk_create(
+        [TripDay(trip=trip, date=start_date + timedelta(days=i)) for i in range(days)]
+    )
+
+    def random_place(label):
+        lat = center[0] + rng.uniform(-spread, spread)
+        lng = center[1] + rng.uniform(-spread, spread)
+        return Place(
+            external_id=f"benchmark:{label}:{uuid.uuid4().hex}",
+            name=label,
+            latitude=Decimal(f"{lat:.7f}"),
+            longitude=Decimal(f"{lng:.7f}"),
+        )
+
+    places = Place.objects.bulk_create(
+        [random_place(f"Stop {i}") for i in range(days * events_per_day)]
+    )
+    Event.objects.bulk_create(
+        [
+            Event(
+                trip_day=trip_day,
+                place=places[d * events_per_day + i],
+                position=(i + 1) * POSITION_GAP,
+            )
+            for d, trip_day in enumerate(trip_days)
+            for i in range(events_per_day)
+        ]
+    )
+
+    if with_lodging:
+        hotel = random_place("Hotel")
+        hotel.save()
+        Lodging.objects.create(
+            trip=trip, place=hotel, arrival_date=start_date, departure_date=end_date
+        )
+
+    return trip
+
+
+def random_coordinates(
+    count: int, seed: int = 0, center=DEFAULT_CENTER, spread=DEFAULT_SPREAD
+):
+    rng = random.Random(seed)
+    return [
+        (
+            center[0] + rng.uniform(-spread, spread),
+            center[1] + rng.uniform(-spread, spread),
+        )
+        for _ in range(count)
+    ]
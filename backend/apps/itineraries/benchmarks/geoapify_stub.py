@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from apps.places.geo import estimate_travel_matrices
+from ..services.route_solver import LocalRouteSolver
+
+
+class GeoapifyStubServer:
+    """
+    Local stand-in for the parts of the Geoapify API the backend calls:
+    ``POST /v1/routeplanner`` and ``POST /v1/routematrix``.
+
+    Responses are computed with the local solver/estimator, so they have the
+    real response shape, and every request is delayed by ``latency`` seconds
+    to mimic the network round trip.
+
+        with GeoapifyStubServer(latency=0.2) as stub:
+            settings.GEOAPIFY_BASE_URL = stub.url
+    """
+
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count_request(self):
+        with self._lock:
+            self.request_count += 1
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                stub._count_request()
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                path = urlparse(self.path).path
+                if path == "/v1/routeplanner":
+                    self._send(200, route_planner_response(payload))
+                elif path == "/v1/routematrix":
+                    self._send(200, route_matrix_response(payload))
+                else:
+                    self._send(404, {"error": "Not Found"})
+
+            def _send(self, status_code, body):
+                content = json.dumps(body).encode()
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def route_planner_response(payload: dict) -> dict:
+    response = LocalRouteSolver(payload.get("mode", "drive")).solve(payload)
+    response["properties"]["engine"] = "geoapify-stub"
+    return response
+
+
+def route_matrix_response(payload: dict) -> dict:
+    sources = [item["location"] for item in payload["sources"]]
+    targets = [item["location"] for item in payload["targets"]]
+    coordinates = [(lat, lng) for lng, lat in sources + targets]
+    distances, durations = estimate_travel_matrices(
+        coordinates, payload.get("mode", "drive")
+    )
+
+    offset = len(sources)
+    return {
+        "sources_to_targets": [
+            [
+                {
+                    "distance": round(float(distances[i, offset + j])),
+                    "time": round(float(durations[i, offset + j])),
+                    "source_index": i,
+                    "target_index": j,
+                }
+                for j in range(len(targets))
+            ]
+            for i in range(len(sources))
+        ]
+    }
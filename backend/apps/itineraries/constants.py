@@ -8,3 +8,47 @@ class EventType(models.TextChoices):
     MEAL = "MEAL", "Meal"
     ACTIVITY = "ACTIVITY", "Activity"
     OTHER = "OTHER", "Other"
+
+
+class RouteEngine(models.TextChoices):
+    GEOAPIFY = "geoapify", "Geoapify"
+    LOCAL = "local", "Local"
+
+
+class JobStatus(models.TextChoices):
+    PENDING = "PENDING", "Pending"
+    RUNNING = "RUNNING", "Running"
+    SUCCEEDED = "SUCCEEDED", "Succeeded"
+    FAILED = "FAILED", "Failed"
+
+
+class RouteMode(models.TextChoices):
+    DRIVE = "drive", "Drive"
+    WALK = "walk", "Walk"
+    BICYCLE = "bicycle", "Bicycle"
+    TRANSIT = "approximated_transit", "Transit"
+
+
+class TripResource(models.TextChoices):
+    """What a trip is made of, as keyed in the changes feed."""
+
+    TRIP_DAYS = "trip_days", "Trip days"
+    EVENTS = "events", "Events"
+    LODGINGS = "lodgings", "Lodgings"
+    SAVED_PLACES = "saved_places", "Saved places"
+
+
+class EventOperation(models.TextChoices):
+    CREATE = "create", "Create"
+    UPDATE = "update", "Update"
+    DELETE = "delete", "Delete"
+    MOVE = "move", "Move"
+
+
+class TripDateChange(models.TextChoices):
+    """What happens to the days when a trip's dates change."""
+
+    # Days keep their date, the ones out of the new range are deleted
+    RESIZE = "resize", "Resize"
+    # Days (with their events) and lodgings move with the start date
+    SHIFT = "shift", "Shift"
@@ -0,0 +1,251 @@
+import json
+import platform
+import statistics
+import time
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.places.geo import estimate_travel_matrices
+from ...benchmarks.fixtures import generate_trip, random_coordinates
+from ...benchmarks.geoapify_stub import GeoapifyStubServer
+from ...constants import RouteEngine
+from ...services.lodging_coverage import get_lodging_coverage
+from ...services.route_optimizer import RouteOptimizer
+from ...services.route_solver import (
+    HELD_KARP_MAX_JOBS,
+    held_karp_path,
+    improve_path,
+    nearest_neighbour_path,
+    path_cost,
+)
+from ...views import TripEventViewset, TripViewset
+
+User = get_user_model()
+
+
+def summarize(samples: list[float]) -> dict:
+    """Timing samples (seconds) as milliseconds statistics."""
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(
+            ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3
+        ),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+def heuristic_path(matrix: list[list[float]]) -> list[int]:
+    return improve_path(matrix, nearest_neighbour_path(matrix))
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark route optimization against a local Geoapify stand-in "
+        "and write the results to a JSON report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7)
+        parser.add_argument("--events", type=int, default=8, help="Events per day.")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.2,
+            help="Simulated Geoapify round trip, in seconds.",
+        )
+        parser.add_argument(
+            "--solver-sizes",
+            default="5,8,10,12,15,25,40",
+            help="Comma separated job counts for the solver quality scenario.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="route_benchmark.json")
+
+    def handle(self, *args, **options):
+        report = {
+            "generated_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "database": settings.DATABASES["default"]["ENGINE"],
+            "params": {
+                key: options[key]
+                for key in ["days", "events", "repeat", "latency", "seed"]
+            },
+            "scenarios": {},
+        }
+        scenarios = report["scenarios"]
+
+        with (
+            GeoapifyStubServer(latency=options["latency"]) as stub,
+            # The benchmark fires far more requests than the user throttle allows
+            mock.patch.object(TripViewset, "throttle_classes", []),
+            mock.patch.object(TripEventViewset, "throttle_classes", []),
+            override_settings(
+                GEOAPIFY_BASE_URL=stub.url,
+                GEOAPIFY_API_KEY="benchmark",
+                ALLOWED_HOSTS=["testserver"],
+            ),
+            transaction.atomic(),
+        ):
+            user = User.objects.create_user(
+                email=f"benchmark-{time.time_ns()}@example.com",
+                first_name="Benchmark",
+                last_name="User",
+                password=None,
+            )
+            trip = generate_trip(
+                user, options["days"], options["events"], seed=options["seed"]
+            )
+            client = APIClient()
+            client.force_authenticate(user)
+
+            scenarios["payload_build"] = self.bench_payload_build(
+                trip, options["repeat"]
+            )
+            for engine in RouteEngine.values:
+                scenarios[f"optimize_route_view.{engine}"] = self.bench_day_view(
+                    client, trip, engine, options["repeat"]
+                )
+                scenarios[f"optimize_trip_view.{engine}"] = self.bench_trip_view(
+                    client, trip, engine, options["repeat"]
+                )
+            scenarios["optimize_route_view.cached"] = self.bench_day_view(
+                client, trip, RouteEngine.GEOAPIFY, options["repeat"], cached=True
+            )
+            report["stub_requests"] = stub.request_count
+
+            # Leave no benchmark data behind
+            transaction.set_rollback(True)
+
+        scenarios["solver_quality"] = self.bench_solver(
+            [int(size) for size in options["solver_sizes"].split(",")],
+            options["seed"],
+            options["repeat"],
+        )
+
+        with open(options["output"], "w") as report_file:
+            json.dump(report, report_file, indent=2)
+
+        for name, result in scenarios.items():
+            if "median_ms" in result:
+                self.stdout.write(
+                    f"{name:<40} median {result['median_ms']:>10.3f} ms   "
+                    f"p95 {result['p95_ms']:>10.3f} ms"
+                )
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    def bench_payload_build(self, trip, repeat: int) -> dict:
+        days = [
+            (
+                trip_day,
+                list(trip_day.events.select_related("place").order_by("position")),
+                trip_day.lodging,
+            )
+            for trip_day in get_lodging_coverage(trip)
+        ]
+
+        samples = []
+        for _ in range(repeat):
+            for trip_day, events, lodging in days:
+                optimizer = RouteOptimizer(trip_day)
+                start = time.perf_counter()
+                agent, jobs_list = optimizer._determine_agent_and_jobs(events, lodging)
+                optimizer._build_payload(agent, jobs_list)
+                samples.append(time.perf_counter() - start)
+        return summarize(samples)
+
+    def bench_day_view(self, client, trip, engine, repeat: int, cached=False) -> dict:
+        url = f"/api/trips/{trip.id}/events/optimize-route/"
+        trip_days = list(trip.trip_days.order_by("date"))
+
+        if cached:
+            # Warm the route cache so every timed request is a hit
+            for trip_day in trip_days:
+                client.post(
+                    url,
+                    {"trip_day_id": str(trip_day.id), "engine": engine},
+                    format="json",
+                )
+
+        samples = []
+        for _ in range(repeat):
+            for trip_day in trip_days:
+                if not cached:
+                    caches[settings.ROUTE_CACHE_ALIAS].clear()
+                elapsed, response = timed(
+                    client.post,
+                    url,
+                    {"trip_day_id": str(trip_day.id), "engine": engine},
+                    format="json",
+                )
+                if response.status_code != 200:
+                    raise RuntimeError(f"{url} returned {response.status_code}")
+                samples.append(elapsed)
+        return summarize(samples)
+
+    def bench_trip_view(self, client, trip, engine, repeat: int) -> dict:
+        url = f"/api/trips/{trip.id}/optimize-routes/"
+
+        samples = []
+        for _ in range(repeat):
+            caches[settings.ROUTE_CACHE_ALIAS].clear()
+            elapsed, response = timed(
+                client.post, url, {"engine": engine}, format="json"
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} returned {response.status_code}")
+            samples.append(elapsed)
+        return summarize(samples)
+
+    def bench_solver(self, sizes: list[int], seed: int, repeat: int) -> dict:
+        """
+        Time and tour length of the heuristic (nearest neighbour + 2-opt/Or-opt)
+        against Held-Karp where it is tractable, else against nearest neighbour.
+        """
+        results = {}
+        for size in sizes:
+            heuristic_times, exact_times, gaps, gains = [], [], [], []
+            for run in range(repeat):
+                coordinates = random_coordinates(size + 1, seed=seed + run)
+                distances, _ = estimate_travel_matrices(coordinates, "drive")
+                matrix = distances.tolist()
+
+                elapsed, route = timed(heuristic_path, matrix)
+                heuristic_times.append(elapsed)
+                heuristic_cost = path_cost(matrix, route)
+                baseline_cost = path_cost(matrix, nearest_neighbour_path(matrix))
+                gains.append(1 - heuristic_cost / baseline_cost)
+
+                if size <= HELD_KARP_MAX_JOBS:
+                    elapsed, order = timed(held_karp_path, distances)
+                    exact_times.append(elapsed)
+                    gaps.append(heuristic_cost / path_cost(matrix, [0, *order]) - 1)
+
+            result = {
+                "heuristic": summarize(heuristic_times),
+                "improvement_over_nearest_neighbour": round(float(np.mean(gains)), 4),
+            }
+            if exact_times:
+                result["held_karp"] = summarize(exact_times)
+                result["heuristic_gap_to_optimal"] = round(float(np.mean(gaps)), 4)
+            results[str(size)] = result
+        return results
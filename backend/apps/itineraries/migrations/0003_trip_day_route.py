@@ -0,0 +1,55 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:44
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("itineraries", "0002_route_optimization_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TripDayRoute",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("mode", models.CharField(max_length=32)),
+                (
+                    "engine",
+                    models.CharField(
+                        choices=[("geoapify", "Geoapify"), ("local", "Local")],
+                        max_length=20,
+                    ),
+                ),
+                ("polyline", models.TextField()),
+                ("precision", models.PositiveSmallIntegerField(default=5)),
+                ("point_count", models.PositiveIntegerField(default=0)),
+                ("distance_km", models.FloatField(default=0)),
+                ("time_hours", models.FloatField(default=0)),
+                ("checksum", models.CharField(max_length=64)),
+                (
+                    "trip_day",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="route",
+                        to="itineraries.tripday",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+def drop_snapshots(apps, schema_editor):
+    # Snapshots are rebuilt on the next read, with their checksum this time
+    apps.get_model("itineraries", "TripSnapshot").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("itineraries", "0004_trip_snapshot"),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_snapshots, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="tripsnapshot",
+            name="checksum",
+            field=models.CharField(default="", max_length=64),
+            preserve_default=False,
+        ),
+    ]
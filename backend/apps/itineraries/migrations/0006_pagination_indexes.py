@@ -0,0 +1,37 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("itineraries", "0005_trip_snapshot_checksum"),
+        ("places", "0002_place_distance"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["trip_day", "-created_at", "-id"], name="event_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="lodging",
+            index=models.Index(
+                fields=["trip", "-created_at", "-id"], name="lodging_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="trip",
+            index=models.Index(fields=["-created_at", "-id"], name="trip_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="tripsavedplace",
+            index=models.Index(
+                fields=["trip", "-created_at", "-id"], name="saved_place_created_idx"
+            ),
+        ),
+    ]
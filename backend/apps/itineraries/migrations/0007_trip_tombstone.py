@@ -0,0 +1,51 @@
+# Generated by Django 6.1.2 on 2026-10-18 00:00
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("itineraries", "0006_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TripTombstone",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("trip_id", models.UUIDField()),
+                (
+                    "resource",
+                    models.CharField(
+                        choices=[
+                            ("trip_days", "Trip days"),
+                            ("events", "Events"),
+                            ("lodgings", "Lodgings"),
+                            ("saved_places", "Saved places"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("object_id", models.UUIDField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["trip_id", "created_at"], name="tombstone_trip_idx"
+                    ),
+                    models.Index(fields=["created_at"], name="tombstone_created_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.1.2 on 2026-10-18 00:03
+
+from django.db import migrations, models
+
+POSITION_GAP = 1024
+
+
+def spread_positions(apps, schema_editor, gap=POSITION_GAP):
+    """Existing days are numbered 1..n, space them out."""
+    Event = apps.get_model("itineraries", "Event")
+    events = Event.objects.order_by("trip_day_id", "position", "created_at").only(
+        "id", "trip_day_id", "position"
+    )
+    changed, trip_day_id, index = [], None, 0
+    for event in events.iterator(chunk_size=2000):
+        if event.trip_day_id != trip_day_id:
+            trip_day_id, index = event.trip_day_id, 0
+        index += 1
+        if event.position != index * gap:
+            event.position = index * gap
+            changed.append(event)
+    Event.objects.bulk_update(changed, ["position"], batch_size=500)
+
+
+def renumber_positions(apps, schema_editor):
+    spread_positions(apps, schema_editor, gap=1)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("itineraries", "0007_trip_tombstone"),
+        ("places", "0002_place_distance"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["trip_day", "position"], name="event_position_idx"
+            ),
+        ),
+        migrations.RunPython(spread_positions, renumber_positions),
+    ]
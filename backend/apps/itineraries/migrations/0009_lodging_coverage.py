@@ -0,0 +1,61 @@
+# Generated by Django 6.1.2 on 2026-10-18 00:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_lodging_coverage(apps, schema_editor):
+    """Point existing days at the first lodging to arrive among the covering ones."""
+    Lodging = apps.get_model("itineraries", "Lodging")
+    TripDay = apps.get_model("itineraries", "TripDay")
+    lodgings = {}
+    for lodging in Lodging.objects.order_by("arrival_date", "created_at").only(
+        "id", "trip_id", "arrival_date", "departure_date"
+    ):
+        lodgings.setdefault(lodging.trip_id, []).append(lodging)
+
+    changed = []
+    trip_days = TripDay.objects.filter(trip_id__in=lodgings).only(
+        "id", "trip_id", "date"
+    )
+    for trip_day in trip_days.iterator(chunk_size=2000):
+        trip_day.lodging_id = next(
+            (
+                lodging.id
+                for lodging in lodgings[trip_day.trip_id]
+                if lodging.arrival_date <= trip_day.date <= lodging.departure_date
+            ),
+            None,
+        )
+        if trip_day.lodging_id:
+            changed.append(trip_day)
+    TripDay.objects.bulk_update(changed, ["lodging"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("itineraries", "0008_sparse_event_positions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tripday",
+            name="lodging",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="covered_days",
+                to="itineraries.lodging",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="lodging",
+            index=models.Index(
+                fields=["trip", "arrival_date", "departure_date"],
+                name="lodging_dates_idx",
+            ),
+        ),
+        migrations.RunPython(fill_lodging_coverage, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,55 @@
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 
-from .constants import EventType
+from .constants import EventType, JobStatus, RouteEngine, TripResource
 from apps.core.models import BaseModel
 import uuid
 
+# Events are ordered by sparse positions, so one can be put between two others
+# by writing that event alone
+POSITION_GAP = 1024
+
+
+def itinerary_prefetch(
+    events=True,
+    places=True,
+    day_fields: list[str] | None = None,
+    event_fields: list[str] | None = None,
+    place_fields: list[str] | None = None,
+) -> models.Prefetch:
+    """
+    Prefetch of a trip's days by date, their events by position and the events'
+    places. ``events``/``places`` leave out the deeper levels and the
+    ``*_fields`` lists narrow each level with only().
+    """
+    days = TripDay.objects.order_by("date")
+    if day_fields:
+        days = days.only(*day_fields)
+
+    if events:
+        day_events = Event.objects.order_by("position")
+        if places:
+            day_events = day_events.select_related("place")
+        if event_fields:
+            if places and place_fields:
+                event_fields = event_fields + [f"place__{f}" for f in place_fields]
+            day_events = day_events.only(*event_fields)
+        days = days.prefetch_related(models.Prefetch("events", queryset=day_events))
+
+    return models.Prefetch("trip_days", queryset=days)
+
+
+class TripQuerySet(models.QuerySet):
+    def with_itinerary(self, **kwargs):
+        """
+        Prefetch what TripDetailSerializer walks: days by date, their events by
+        position with the place joined in. Two extra queries, whatever the size.
+        See itinerary_prefetch() for the options.
+        """
+        return self.prefetch_related(itinerary_prefetch(**kwargs))
+
 
 class Trip(BaseModel):
     name = models.CharField(max_length=255)
@@ -21,6 +66,8 @@ class Trip(BaseModel):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="trips"
     )
 
+    objects = TripQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name} ({self.start_date} to {self.end_date})"
 
@@ -42,6 +89,10 @@ class Trip(BaseModel):
                 name="unique_public_token",
             ),
         ]
+        indexes = [
+            # Keyset pagination order
+            models.Index(fields=["-created_at", "-id"], name="trip_created_idx"),
+        ]
 
 
 class UserTrip(BaseModel):
@@ -64,18 +115,37 @@ class UserTrip(BaseModel):
 class TripDay(BaseModel):
     date = models.DateField()
     trip = models.ForeignKey("Trip", on_delete=models.CASCADE, related_name="trip_days")
+    # The lodging covering the day, kept up to date by refresh_lodging_coverage
+    lodging = models.ForeignKey(
+        "Lodging",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="covered_days",
+    )
 
     def __str__(self):
         return f"{self.trip.name} - {self.date}"
 
-    def normalize_position(self):
-        events = self.events.all().order_by(
-            models.F("position").asc(nulls_last=True), "position"
-        )
+    def normalize_position(self, events: list[Event] | None = None):
+        """
+        Spread the positions of the day's events (or of ``events``, in that
+        order) POSITION_GAP apart again, in a single bulk_update.
+        """
+        if events is None:
+            events = self.events.order_by("position", "created_at")
+
+        now = timezone.now()
+        changed = []
         for index, event in enumerate(events, start=1):
-            if event.position != index:
-                event.position = index
-                event.save(update_fields=["position"])
+            if event.position != index * POSITION_GAP:
+                event.position = index * POSITION_GAP
+                # bulk_update leaves auto_now fields alone
+                event.updated_at = now
+                changed.append(event)
+        Event.objects.bulk_update(changed, ["position", "updated_at"])
+        return changed
 
     class Meta:
         constraints = [
@@ -106,6 +176,11 @@ class TripSavedPlace(BaseModel):
                 fields=["trip", "place"], name="unique_saved_place_per_trip"
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["trip", "-created_at", "-id"], name="saved_place_created_idx"
+            ),
+        ]
 
 
 # TODO: make tests to make sure constraints are behaving as expected
@@ -128,6 +203,15 @@ class Lodging(BaseModel):
                 name="arrival_date_before_departure_date",
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=["trip", "-created_at", "-id"], name="lodging_created_idx"
+            ),
+            models.Index(
+                fields=["trip", "arrival_date", "departure_date"],
+                name="lodging_dates_idx",
+            ),
+        ]
 
 
 class Event(BaseModel):
@@ -141,7 +225,7 @@ class Event(BaseModel):
         "places.Place", on_delete=models.SET_NULL, null=True, blank=True
     )
 
-    # index of order of events in a day
+    # order of the event in its day, POSITION_GAP apart when evenly spread
     position = models.PositiveIntegerField()
 
     notes = models.TextField(blank=True, null=True)
@@ -149,3 +233,109 @@ class Event(BaseModel):
     def __str__(self):
         place_name = self.place.name if self.place else "Unknown Place"
         return f"{place_name} on {self.trip_day.date}"
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["trip_day", "-created_at", "-id"], name="event_created_idx"
+            ),
+            models.Index(fields=["trip_day", "position"], name="event_position_idx"),
+        ]
+
+
+class TripDayRoute(BaseModel):
+    """Geometry of the last optimized route of a day, as an encoded polyline."""
+
+    trip_day = models.OneToOneField(
+        "TripDay", on_delete=models.CASCADE, related_name="route"
+    )
+    mode = models.CharField(max_length=32)
+    engine = models.CharField(max_length=20, choices=RouteEngine.choices)
+
+    polyline = models.TextField()
+    precision = models.PositiveSmallIntegerField(default=5)
+    point_count = models.PositiveIntegerField(default=0)
+    distance_km = models.FloatField(default=0)
+    time_hours = models.FloatField(default=0)
+    # content hash, used as the ETag
+    checksum = models.CharField(max_length=64)
+
+    def __str__(self):
+        return f"Route for {self.trip_day_id} ({self.point_count} points)"
+
+
+class RouteOptimizationJob(BaseModel):
+    """
+    Route optimization run in the background. The table doubles as the job
+    queue, so no external broker is needed.
+    """
+
+    trip = models.ForeignKey(
+        "Trip", on_delete=models.CASCADE, related_name="route_optimization_jobs"
+    )
+    trip_day = models.ForeignKey(
+        "TripDay", on_delete=models.CASCADE, related_name="route_optimization_jobs"
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    mode = models.CharField(max_length=32, default="drive")
+    engine = models.CharField(
+        max_length=20, choices=RouteEngine.choices, blank=True, null=True
+    )
+
+    status = models.CharField(
+        max_length=20, choices=JobStatus.choices, default=JobStatus.PENDING
+    )
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True, null=True)
+
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # finished jobs are kept until then so their result can still be fetched
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Route optimization for {self.trip_day_id} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["expires_at"]),
+        ]
+
+
+class TripSnapshot(BaseModel):
+    """
+    Pre-rendered TripDetailSerializer JSON of a trip. Deleted whenever the trip,
+    its days, events or their places change, and rebuilt on the next read.
+    """
+
+    trip = models.OneToOneField(
+        "Trip", on_delete=models.CASCADE, related_name="snapshot"
+    )
+    content = models.TextField()
+    checksum = models.CharField(max_length=64)
+
+    def __str__(self):
+        return f"Snapshot of {self.trip_id}"
+
+
+class TripTombstone(BaseModel):
+    """
+    Marks a row of a trip deleted, so the changes feed can report deletions.
+    Plain ids rather than foreign keys, the rows they point at are gone.
+    """
+
+    trip_id = models.UUIDField()
+    resource = models.CharField(max_length=20, choices=TripResource.choices)
+    object_id = models.UUIDField()
+
+    def __str__(self):
+        return f"Deleted {self.resource} {self.object_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["trip_id", "created_at"], name="tombstone_trip_idx"),
+            models.Index(fields=["created_at"], name="tombstone_created_idx"),
+        ]
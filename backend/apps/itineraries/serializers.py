@@ -2,15 +2,45 @@ from django.utils import timezone
 import uuid
 from django.conf import settings
 from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import Trip, TripDay, TripSavedPlace, Event, Lodging
+from apps.core.serializers import DynamicFieldsMixin, model_field_names
+from .constants import (
+    EventOperation,
+    EventType,
+    RouteEngine,
+    RouteMode,
+    TripDateChange,
+)
+from .models import (
+    Trip,
+    TripDay,
+    TripSavedPlace,
+    Event,
+    Lodging,
+    RouteOptimizationJob,
+    TripDayRoute,
+    itinerary_prefetch,
+)
+from .services.event_positions import next_position
 from apps.places.models import Place
 from apps.places.serializers import PlaceSerializer, CreatePlaceSerializer
+from apps.places.services import get_or_create_place
 from apps.accounts.serializers import UserSimpleSerializer
 
 
 class TripSerializer(serializers.ModelSerializer):
     public_url = serializers.SerializerMethodField(read_only=True)
+    date_change = serializers.ChoiceField(
+        choices=TripDateChange.choices,
+        default=TripDateChange.RESIZE,
+        write_only=True,
+        help_text=(
+            "On date changes, resize keeps each day on its date and deletes the "
+            "ones out of the new range, shift moves the days, their events and "
+            "the lodgings along with the start date."
+        ),
+    )
 
     def get_public_url(self, obj):
         if obj.is_public and obj.public_token:
@@ -27,6 +57,7 @@ class TripSerializer(serializers.ModelSerializer):
             "created_at",
             "is_public",
             "public_url",
+            "date_change",
         ]
         read_only_fields = ["id", "created_at", "is_public", "public_url"]
 
@@ -35,6 +66,15 @@ class TripSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("End date must be after start date.")
         return attrs
 
+    def create(self, validated_data):
+        # Only tells the view what to do with the days
+        validated_data.pop("date_change", None)
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        validated_data.pop("date_change", None)
+        return super().update(instance, validated_data)
+
 
 class SavePlaceToTripSerializer(serializers.ModelSerializer):
     # Write-only nested serializer
@@ -54,9 +94,7 @@ class SavePlaceToTripSerializer(serializers.ModelSerializer):
         # get or create the place using CreatePlaceSerializer
         place_data = validated_data.pop("place")
 
-        place, _ = Place.objects.get_or_create(
-            external_id=place_data["external_id"], defaults=place_data
-        )
+        place = get_or_create_place(place_data)
 
         # Get or create TripSavedPlace
         instance, _ = TripSavedPlace.objects.get_or_create(
@@ -72,7 +110,7 @@ class RemoveSavedPlaceFromTripSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     trip_day_pk = serializers.PrimaryKeyRelatedField(
         queryset=TripDay.objects.all(), write_only=True, source="trip_day"
     )
@@ -107,13 +145,15 @@ class EventSerializer(serializers.ModelSerializer):
         trip_day = validated_data.pop("trip_day")
         place_data = validated_data.pop("place")
 
-        place, _ = Place.objects.get_or_create(
-            external_id=place_data["external_id"], defaults=place_data
-        )
+        place = get_or_create_place(place_data)
 
-        return Event.objects.create(
-            trip_day=trip_day, place=place, position=9999, **validated_data
-        )
+        with transaction.atomic():
+            return Event.objects.create(
+                trip_day=trip_day,
+                place=place,
+                position=next_position(trip_day.id),
+                **validated_data,
+            )
 
     def update(self, instance, validated_data):
         # ignore/pop trip_day as it's not allowed to change the day of the event
@@ -122,15 +162,13 @@ class EventSerializer(serializers.ModelSerializer):
 
         if "place" in validated_data:
             place_data = validated_data.pop("place")
-            place, _ = Place.objects.get_or_create(
-                external_id=place_data["external_id"], defaults=place_data
-            )
+            place = get_or_create_place(place_data)
             instance.place = place
 
         return super().update(instance, validated_data)
 
 
-class TripDaySerializer(serializers.ModelSerializer):
+class TripDaySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     events = EventSerializer(many=True, read_only=True)
 
     class Meta:
@@ -139,7 +177,7 @@ class TripDaySerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "trip", "date", "events"]
 
 
-class TripDetailSerializer(TripSerializer):
+class TripDetailSerializer(DynamicFieldsMixin, TripSerializer):
     total_days = serializers.SerializerMethodField()
     trip_days = TripDaySerializer(many=True, read_only=True)
 
@@ -149,6 +187,24 @@ class TripDetailSerializer(TripSerializer):
     def get_total_days(self, obj: Trip):
         return (obj.end_date - obj.start_date).days + 1
 
+    def get_itinerary_prefetch(self) -> Prefetch | None:
+        """The prefetch for what is left of the itinerary after ?fields/?expand."""
+        trip_days = self.fields.get("trip_days")
+        if trip_days is None:
+            return None
+
+        events = trip_days.child.fields.get("events")
+        place = events.child.fields.get("place_details") if events else None
+        return itinerary_prefetch(
+            events=events is not None,
+            places=place is not None,
+            day_fields=model_field_names(trip_days.child, TripDay, ["trip"]),
+            event_fields=(
+                model_field_names(events.child, Event, ["trip_day"]) if events else None
+            ),
+            place_fields=model_field_names(place, Place) if place else None,
+        )
+
 
 class UpdateLodgingSerializer(serializers.ModelSerializer):
     place_details = PlaceSerializer(source="place", read_only=True)
@@ -187,9 +243,7 @@ class LodgingSerializer(UpdateLodgingSerializer):
         with transaction.atomic():
             # get or create the place using CreatePlaceSerializer
             place_data = validated_data.pop("place")
-            place, _ = Place.objects.get_or_create(
-                external_id=place_data["external_id"], defaults=place_data
-            )
+            place = get_or_create_place(place_data)
 
             # Check for overlapping lodging and delete
             trip = Trip.objects.get(id=self.context["trip_pk"])
@@ -245,11 +299,113 @@ class EventReorderSerializer(serializers.Serializer):
         return attrs
 
 
+class EventOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=EventOperation.choices)
+    id = serializers.UUIDField(
+        required=False, help_text="Event to update, delete or move."
+    )
+    trip_day_pk = serializers.UUIDField(
+        required=False, help_text="Day to create the event in or move it to."
+    )
+    index = serializers.IntegerField(
+        required=False,
+        min_value=0,
+        help_text="Where to put the event in its day, at the end without it.",
+    )
+    place = CreatePlaceSerializer(required=False)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    type = serializers.ChoiceField(choices=EventType.choices, required=False)
+
+    REQUIRED_FIELDS = {
+        EventOperation.CREATE: ["trip_day_pk", "place"],
+        EventOperation.UPDATE: ["id"],
+        EventOperation.DELETE: ["id"],
+        EventOperation.MOVE: ["id", "trip_day_pk"],
+    }
+
+    def validate(self, attrs):
+        missing = {
+            field: "This field is required."
+            for field in self.REQUIRED_FIELDS[attrs["op"]]
+            if field not in attrs
+        }
+        if missing:
+            raise serializers.ValidationError(missing)
+        if attrs["op"] == EventOperation.CREATE:
+            attrs.setdefault("type", EventType.OTHER)
+        return attrs
+
+
+class EventBatchSerializer(serializers.Serializer):
+    operations = serializers.ListField(
+        child=EventOperationSerializer(),
+        allow_empty=False,
+        max_length=500,
+        help_text="Run in order, all of them or none.",
+    )
+
+    class Meta:
+        fields = ["operations"]
+
+    def validate_operations(self, operations):
+        event_ids = [op["id"] for op in operations if "id" in op]
+        if len(event_ids) != len(set(event_ids)):
+            raise serializers.ValidationError(
+                "An event can only appear in one operation."
+            )
+
+        trip_pk = self.context["trip_pk"]
+        known_events = set(
+            Event.objects.filter(id__in=event_ids, trip_day__trip=trip_pk).values_list(
+                "id", flat=True
+            )
+        )
+        day_ids = {op["trip_day_pk"] for op in operations if "trip_day_pk" in op}
+        known_days = set(
+            TripDay.objects.filter(id__in=day_ids, trip=trip_pk).values_list(
+                "id", flat=True
+            )
+        )
+
+        errors = {}
+        for i, op in enumerate(operations):
+            if "id" in op and op["id"] not in known_events:
+                errors[i] = {"id": "No such event in this trip."}
+            elif "trip_day_pk" in op and op["trip_day_pk"] not in known_days:
+                errors[i] = {"trip_day_pk": "No such day in this trip."}
+        if errors:
+            raise serializers.ValidationError(errors)
+        return operations
+
+
+class EventBatchResultSerializer(serializers.Serializer):
+    events = EventSerializer(
+        many=True, help_text="Created, updated and repositioned events."
+    )
+    deleted = serializers.ListField(child=serializers.UUIDField())
+
+
 class RouteOptimizationSerializer(serializers.Serializer):
     trip_day_id = serializers.PrimaryKeyRelatedField(queryset=TripDay.objects.all())
+    engine = serializers.ChoiceField(
+        choices=RouteEngine.choices,
+        required=False,
+        help_text="Routing engine to use. Defaults to the ROUTE_OPTIMIZER_ENGINE setting.",
+    )
+    modes = serializers.ListField(
+        child=serializers.ChoiceField(choices=RouteMode.choices),
+        required=False,
+        allow_empty=False,
+        max_length=len(RouteMode.choices),
+        help_text="Travel modes to compare. Each one gets its own order and stats.",
+    )
+    run_async = serializers.BooleanField(
+        default=False,
+        help_text="Run in the background and return a job to poll instead of the route.",
+    )
 
     class Meta:
-        fields = ["trip_day_id"]
+        fields = ["trip_day_id", "engine", "modes", "run_async"]
 
     def __init__(self, instance=None, data=..., **kwargs):
         super().__init__(instance, data, **kwargs)
@@ -263,10 +419,7 @@ class RouteOptimizationSerializer(serializers.Serializer):
         trip_day = attrs.get("trip_day_id")
 
         # Check if the trip day has events or lodging
-        lodging_exists = trip_day.trip.lodgings.filter(
-            arrival_date__lte=trip_day.date,
-            departure_date__gte=trip_day.date,
-        ).exists()
+        lodging_exists = trip_day.lodging_id is not None
         events_count_valid = trip_day.events.count() > (2 if not lodging_exists else 1)
 
         if not events_count_valid:
@@ -274,9 +427,110 @@ class RouteOptimizationSerializer(serializers.Serializer):
                 "Trip day must have at least 3 events or 2 events with a lodging to optimize the route."
             )
 
+        modes = attrs.get("modes")
+        if modes:
+            # Keep the requested order, it decides which route the day keeps
+            attrs["modes"] = list(dict.fromkeys(modes))
+            if attrs["run_async"] and len(attrs["modes"]) > 1:
+                raise serializers.ValidationError(
+                    {"modes": "Background optimization supports a single mode."}
+                )
+
         return attrs
 
 
+class OptimizedRouteSerializer(serializers.Serializer):
+    """Read-only representation of RouteOptimizer.optimize_events() results."""
+
+    events = EventSerializer(many=True, read_only=True)
+    stats = serializers.DictField(read_only=True)
+    warning = serializers.CharField(read_only=True, allow_null=True)
+
+
+class ModeRouteSerializer(OptimizedRouteSerializer):
+    """One travel mode of a multi-mode optimize-route response."""
+
+    mode = serializers.ChoiceField(choices=RouteMode.choices, read_only=True)
+    status = serializers.CharField(read_only=True)
+
+
+class TripDayRouteSerializer(serializers.ModelSerializer):
+    encoding = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TripDayRoute
+        fields = [
+            "trip_day",
+            "mode",
+            "engine",
+            "encoding",
+            "precision",
+            "polyline",
+            "point_count",
+            "distance_km",
+            "time_hours",
+            "updated_at",
+        ]
+        read_only_fields = fields
+
+    def get_encoding(self, obj):
+        return "polyline"
+
+
+class RouteOptimizationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RouteOptimizationJob
+        fields = [
+            "id",
+            "trip_day",
+            "mode",
+            "engine",
+            "status",
+            "result",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+            "expires_at",
+        ]
+        read_only_fields = fields
+
+
+class TripRouteOptimizationSerializer(serializers.Serializer):
+    engine = serializers.ChoiceField(
+        choices=RouteEngine.choices,
+        required=False,
+        help_text="Routing engine to use. Defaults to the ROUTE_OPTIMIZER_ENGINE setting.",
+    )
+
+    class Meta:
+        fields = ["engine"]
+
+
+class AutoPlanSerializer(serializers.Serializer):
+    include_scheduled = serializers.BooleanField(
+        default=False,
+        help_text="Also distribute saved places that already have an event.",
+    )
+
+    class Meta:
+        fields = ["include_scheduled"]
+
+
+class CloneTripSerializer(serializers.Serializer):
+    name = serializers.CharField(
+        max_length=255, required=False, help_text="Defaults to the trip's name."
+    )
+    start_date = serializers.DateField(
+        required=False,
+        help_text="Start of the copy, the itinerary moves along. Defaults to the "
+        "trip's start date.",
+    )
+
+    class Meta:
+        fields = ["name", "start_date"]
+
+
 class ShareTripSerializer(serializers.ModelSerializer):
     public_url = serializers.SerializerMethodField(read_only=True)
 
@@ -331,3 +585,43 @@ class DateSuggestionRequestSerializer(serializers.Serializer):
         child=DailyScheduleSerializer(),
         help_text="A dictionary mapping dates (YYYY-MM-DD) to their daily schedules.",
     )
+
+
+class TripDayDetailSerializer(TripDaySerializer):
+    """A single day: its events in order and the lodging covering it."""
+
+    lodging = UpdateLodgingSerializer(allow_null=True, read_only=True)
+
+    class Meta(TripDaySerializer.Meta):
+        fields = TripDaySerializer.Meta.fields + ["lodging"]
+        read_only_fields = TripDaySerializer.Meta.read_only_fields + ["lodging"]
+
+
+class TripChangesQuerySerializer(serializers.Serializer):
+    since = serializers.DateTimeField(
+        help_text="The cursor of the previous changes, or when the trip was loaded."
+    )
+
+
+class TripDayChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TripDay
+        fields = ["id", "trip", "date"]
+        read_only_fields = ["id", "trip", "date"]
+
+
+class TripChangesSerializer(serializers.Serializer):
+    """Rows of a trip written since a cursor and the ids of the deleted ones."""
+
+    cursor = serializers.DateTimeField(
+        help_text="Pass as ?since= to get the changes after this response."
+    )
+    trip = TripSerializer(allow_null=True)
+    trip_days = TripDayChangeSerializer(many=True)
+    events = EventSerializer(many=True)
+    lodgings = UpdateLodgingSerializer(many=True)
+    saved_places = SavePlaceToTripSerializer(many=True)
+    deleted = serializers.DictField(
+        child=serializers.ListField(child=serializers.UUIDField()),
+        help_text="Deleted ids by kind. The events of a deleted day are not listed.",
+    )
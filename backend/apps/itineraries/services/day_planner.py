@@ -0,0 +1,222 @@
+import math
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+
+from apps.places.geo import estimate_travel_matrices
+from ..constants import EventType
+from ..models import POSITION_GAP, Event, Trip
+from . import route_cache
+from .route_geometry import discard_route_geometry
+from .lodging_coverage import get_lodging_coverage
+from .route_solver import LocalRouteSolver
+from .trip_snapshot import invalidate_trip_snapshots
+from .trip_stream import event_summary, publish_trip_change
+
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LNG = 111.320
+
+MAX_ITERATIONS = 25
+
+
+def plan_trip_days(trip: Trip, include_scheduled=False) -> list[Event]:
+    """
+    Spread a trip's saved places over its days and create the events.
+
+    Places are grouped with a size-balanced k-means, one cluster per day. Days
+    covered by a lodging start with their centroid on that lodging and keep
+    being pulled towards it, so every day stays close to where the user sleeps.
+    Each day's new events are ordered into a short path from the lodging (or
+    the cluster's first place) and appended after the day's existing events.
+    """
+    trip_days = get_lodging_coverage(trip)
+    saved_places = list(
+        trip.saved_places.select_related("place").order_by("created_at")
+    )
+    if not include_scheduled:
+        scheduled_place_ids = set(
+            Event.objects.filter(trip_day__trip=trip).values_list("place_id", flat=True)
+        )
+        saved_places = [
+            s for s in saved_places if s.place_id not in scheduled_place_ids
+        ]
+
+    if not trip_days or not saved_places:
+        return []
+
+    anchors = [
+        trip_day.lodging.place if trip_day.lodging else None for trip_day in trip_days
+    ]
+
+    places = [s.place for s in saved_places]
+    labels = balanced_kmeans(
+        _project([_coordinates(p) for p in places]),
+        len(trip_days),
+        [_project([_coordinates(a)])[0] if a else None for a in anchors],
+    )
+
+    members = defaultdict(list)
+    for place, label in zip(places, labels):
+        members[label].append(place)
+
+    last_positions = dict(
+        Event.objects.filter(trip_day__in=trip_days)
+        .values("trip_day")
+        .annotate(last=Max("position"))
+        .values_list("trip_day", "last")
+    )
+
+    events = []
+    for label, trip_day in enumerate(trip_days):
+        day_places = _order_places(members[label], anchors[label])
+        position = last_positions.get(trip_day.id) or 0
+        for place in day_places:
+            position += POSITION_GAP
+            events.append(
+                Event(
+                    trip_day=trip_day,
+                    place=place,
+                    position=position,
+                    type=EventType.ACTIVITY,
+                )
+            )
+
+    with transaction.atomic():
+        events = Event.objects.bulk_create(events)
+        # bulk_create skips the post_save signals that normally drop stale routes
+        planned_day_ids = {event.trip_day_id for event in events}
+        route_cache.invalidate(*planned_day_ids)
+        discard_route_geometry(*planned_day_ids)
+        invalidate_trip_snapshots(trip.id)
+        publish_trip_change(
+            trip.id,
+            "events.changed",
+            events=[event_summary(event) for event in events],
+            deleted=[],
+        )
+
+    return events
+
+
+def balanced_kmeans(
+    points: np.ndarray, k: int, anchors: list, iterations=MAX_ITERATIONS
+) -> np.ndarray:
+    """
+    Cluster ``points`` (n x 2, planar km) into ``k`` groups of floor(n / k)
+    to ceil(n / k) members and return each point's cluster label.
+
+    ``anchors`` holds one optional point per cluster. Anchored clusters start
+    on their anchor and their centroid is the midpoint between the members'
+    mean and the anchor, which keeps them from drifting away.
+    """
+    n = len(points)
+    capacity = math.ceil(n / k)
+    minimum = n // k
+    centroids = _initial_centroids(points, k, anchors)
+
+    labels = None
+    for _ in range(iterations):
+        # (n, k) distances from every point to every centroid in one pass
+        distances = np.linalg.norm(points[:, np.newaxis, :] - centroids, axis=2)
+        new_labels = _assign_with_capacity(distances, capacity, minimum)
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+
+        for cluster in range(k):
+            cluster_points = points[labels == cluster]
+            if anchors[cluster] is not None:
+                if len(cluster_points):
+                    centroids[cluster] = (
+                        cluster_points.mean(axis=0) + anchors[cluster]
+                    ) / 2
+            elif len(cluster_points):
+                centroids[cluster] = cluster_points.mean(axis=0)
+
+    return labels
+
+
+def _initial_centroids(points: np.ndarray, k: int, anchors: list) -> np.ndarray:
+    """Anchors where available, k-means++ style farthest-point seeding for the rest."""
+    centroids = np.zeros((k, 2))
+    seeded = []
+    for cluster, anchor in enumerate(anchors):
+        if anchor is not None:
+            centroids[cluster] = anchor
+            seeded.append(anchor)
+
+    for cluster, anchor in enumerate(anchors):
+        if anchor is not None:
+            continue
+        if seeded:
+            gaps = np.min(
+                np.linalg.norm(points[:, np.newaxis, :] - np.array(seeded), axis=2),
+                axis=1,
+            )
+            seed = points[int(np.argmax(gaps))]
+        else:
+            seed = points.mean(axis=0)
+        centroids[cluster] = seed
+        seeded.append(seed)
+
+    return centroids
+
+
+def _assign_with_capacity(
+    distances: np.ndarray, capacity: int, minimum: int = 0
+) -> np.ndarray:
+    """
+    Greedily hand out the globally closest (point, cluster) pairs until full,
+    then fill the clusters left under ``minimum`` by moving, one at a time, the
+    point that costs the least extra distance from a cluster that can spare it.
+    """
+    n, k = distances.shape
+    labels = np.full(n, -1)
+    sizes = np.zeros(k, dtype=int)
+
+    for flat_index in np.argsort(distances, axis=None):
+        point, cluster = divmod(int(flat_index), k)
+        if labels[point] != -1 or sizes[cluster] >= capacity:
+            continue
+        labels[point] = cluster
+        sizes[cluster] += 1
+
+    rows = np.arange(n)
+    while (short := np.flatnonzero(sizes < minimum)).size:
+        extra = distances[:, short] - distances[rows, labels][:, np.newaxis]
+        extra[sizes[labels] <= minimum] = np.inf
+        point, column = np.unravel_index(int(np.argmin(extra)), extra.shape)
+        sizes[labels[point]] -= 1
+        labels[point] = short[column]
+        sizes[short[column]] += 1
+
+    return labels
+
+
+def _order_places(places: list, anchor) -> list:
+    if len(places) < 2:
+        return places
+
+    start = [anchor] if anchor else []
+    coordinates = [_coordinates(p) for p in start + places]
+    distances, _ = estimate_travel_matrices(coordinates, "drive")
+    order = LocalRouteSolver().solve_order(distances)
+
+    stops = start + places
+    ordered = [stops[0]] + [stops[i] for i in order]
+    return ordered[1:] if anchor else ordered
+
+
+def _coordinates(place) -> tuple[float, float]:
+    return float(place.latitude), float(place.longitude)
+
+
+def _project(coordinates: list[tuple[float, float]]) -> np.ndarray:
+    """Equirectangular projection to kilometers, fine at city/region scale."""
+    coords = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+    lat, lng = coords[:, 0], coords[:, 1]
+    return np.column_stack(
+        (lng * KM_PER_DEGREE_LNG * np.cos(np.radians(lat)), lat * KM_PER_DEGREE_LAT)
+    )
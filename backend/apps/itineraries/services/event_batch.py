@@ -0,0 +1,151 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.places.services import get_or_create_places
+from ..constants import EventOperation, TripResource
+from ..models import POSITION_GAP, Event, Trip
+from . import route_cache
+from .route_geometry import discard_route_geometry
+from .trip_changes import record_tombstones
+from .trip_snapshot import invalidate_trip_snapshots
+from .trip_stream import event_summary, publish_trip_change
+
+UPDATED_FIELDS = ["trip_day", "place", "notes", "type", "position", "updated_at"]
+
+_applying = ContextVar("event_batch_applying", default=False)
+
+
+def is_applying_batch() -> bool:
+    """Whether the per-event signal receivers should leave the work to the batch."""
+    return _applying.get()
+
+
+@contextmanager
+def _batch_signals():
+    token = _applying.set(True)
+    try:
+        yield
+    finally:
+        _applying.reset(token)
+
+
+@transaction.atomic
+def apply_event_operations(trip: Trip, operations: list[dict]) -> tuple[list, list]:
+    """
+    Run a batch of validated EventOperationSerializer operations on ``trip``'s
+    events in one transaction: one bulk insert, one bulk update and one delete,
+    with the places resolved in bulk and each day that gains events renumbered
+    once. The per-event signal receivers stand aside: the batch records its
+    tombstones, drops the routes and snapshots and publishes a single change
+    itself. Operations run in order, so moves and creates with an ``index`` see
+    the earlier ones.
+
+    Returns the created, updated and repositioned events, and the deleted ids.
+    """
+    event_ids = {op["id"] for op in operations if "id" in op}
+    # Days that get events need all of theirs to place the new ones
+    target_day_ids = {
+        op["trip_day_pk"]
+        for op in operations
+        if op["op"] in [EventOperation.CREATE, EventOperation.MOVE]
+    }
+    events = {
+        event.id: event
+        for event in Event.objects.filter(
+            Q(id__in=event_ids) | Q(trip_day_id__in=target_day_ids),
+            trip_day__trip=trip,
+        )
+    }
+    days = defaultdict(list)
+    for event in sorted(events.values(), key=lambda event: event.position):
+        if event.trip_day_id in target_day_ids:
+            days[event.trip_day_id].append(event)
+
+    places = get_or_create_places([op["place"] for op in operations if op.get("place")])
+
+    created, updated, deleted_ids = [], {}, []
+    # Days whose route changes: the ones events leave, join or change in
+    trip_day_ids = set(target_day_ids)
+    for op in operations:
+        if op["op"] == EventOperation.CREATE:
+            event = Event(
+                trip_day_id=op["trip_day_pk"],
+                place=places[op["place"]["external_id"]],
+                notes=op.get("notes"),
+                type=op["type"],
+            )
+            _insert(days[event.trip_day_id], event, op.get("index"))
+            created.append(event)
+            continue
+
+        event = events[op["id"]]
+        trip_day_ids.add(event.trip_day_id)
+        if op["op"] == EventOperation.DELETE:
+            deleted_ids.append(event.id)
+            if event in days[event.trip_day_id]:
+                days[event.trip_day_id].remove(event)
+        elif op["op"] == EventOperation.MOVE:
+            if event in days[event.trip_day_id]:
+                days[event.trip_day_id].remove(event)
+            event.trip_day_id = op["trip_day_pk"]
+            _insert(days[event.trip_day_id], event, op.get("index"))
+            updated[event.id] = event
+        else:
+            for field in ["notes", "type"]:
+                if field in op:
+                    setattr(event, field, op[field])
+            if op.get("place"):
+                event.place = places[op["place"]["external_id"]]
+            updated[event.id] = event
+
+    # One renumber per day that gained events, the days that only lost some
+    # keep their gaps
+    for day_events in days.values():
+        for index, event in enumerate(day_events, start=1):
+            if event.position != index * POSITION_GAP:
+                event.position = index * POSITION_GAP
+                if event.created_at is not None:
+                    updated[event.id] = event
+
+    now = timezone.now()
+    for event in updated.values():
+        # bulk_update leaves auto_now fields alone
+        event.updated_at = now
+
+    if deleted_ids:
+        with _batch_signals():
+            Event.objects.filter(id__in=deleted_ids).delete()
+        record_tombstones(TripResource.EVENTS, trip.id, deleted_ids)
+    Event.objects.bulk_create(created)
+    Event.objects.bulk_update(updated.values(), UPDATED_FIELDS)
+
+    # None of the writes above send signals
+    route_cache.invalidate(*trip_day_ids)
+    discard_route_geometry(*trip_day_ids)
+    invalidate_trip_snapshots(trip.id)
+
+    affected_ids = [event.id for event in created] + list(updated)
+    affected = list(
+        Event.objects.filter(id__in=affected_ids)
+        .select_related("place")
+        .order_by("trip_day__date", "position")
+    )
+    publish_trip_change(
+        trip.id,
+        "events.changed",
+        events=[event_summary(event) for event in affected],
+        deleted=deleted_ids,
+    )
+    return affected, deleted_ids
+
+
+def _insert(day_events: list[Event], event: Event, index: int | None):
+    if index is None:
+        day_events.append(event)
+    else:
+        day_events.insert(index, event)
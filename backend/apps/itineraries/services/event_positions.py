@@ -0,0 +1,88 @@
+from bisect import bisect_left
+
+from django.db.models import Max
+from django.utils import timezone
+
+from ..models import POSITION_GAP, Event, TripDay
+
+
+def next_position(trip_day_id) -> int:
+    """
+    Position after the last event of the day. Call it inside the transaction
+    that creates the event: it locks the day row until then, so concurrent
+    creates on the same day queue up instead of taking the same position.
+    """
+    list(TripDay.objects.select_for_update().filter(id=trip_day_id).values("id"))
+    last = Event.objects.filter(trip_day_id=trip_day_id).aggregate(
+        last=Max("position")
+    )["last"]
+    return (last or 0) + POSITION_GAP
+
+
+def reorder_events(trip_day: TripDay, event_ids: list) -> list[Event]:
+    """
+    Put the listed events of ``trip_day`` in the given order, rewriting as few
+    positions as possible. The events already in order relative to each other
+    (the longest increasing run of their positions) keep theirs, the others get
+    one between their new neighbours, so moving one event writes one row. When
+    a gap is too narrow for that the whole day is spread out again.
+
+    Returns the listed events in their new order.
+    """
+    events = Event.objects.filter(trip_day=trip_day, id__in=event_ids).in_bulk()
+    ordered = [events[event_id] for event_id in event_ids if event_id in events]
+    kept = _longest_increasing_run([event.position for event in ordered])
+
+    moves = []
+    start = 0
+    while start < len(ordered):
+        if start in kept:
+            start += 1
+            continue
+        end = start
+        while end < len(ordered) and end not in kept:
+            end += 1
+
+        # ordered[start - 1] and ordered[end] (when there) keep their positions
+        low = ordered[start - 1].position if start else 0
+        if end < len(ordered):
+            step = (ordered[end].position - low) // (end - start + 1)
+        else:
+            step = POSITION_GAP
+        if step < 1:
+            others = trip_day.events.exclude(id__in=events).order_by("position")
+            trip_day.normalize_position([*ordered, *others])
+            return ordered
+
+        for offset, event in enumerate(ordered[start:end], start=1):
+            moves.append((event, low + step * offset))
+        start = end
+
+    now = timezone.now()
+    for event, position in moves:
+        event.position = position
+        # bulk_update leaves auto_now fields alone
+        event.updated_at = now
+    Event.objects.bulk_update([event for event, _ in moves], ["position", "updated_at"])
+    return ordered
+
+
+def _longest_increasing_run(values: list[int]) -> set[int]:
+    """Indexes of a longest strictly increasing subsequence of ``values``."""
+    tails, tail_indexes, previous = [], [], [None] * len(values)
+    for index, value in enumerate(values):
+        length = bisect_left(tails, value)
+        if length == len(tails):
+            tails.append(value)
+            tail_indexes.append(index)
+        else:
+            tails[length] = value
+            tail_indexes[length] = index
+        previous[index] = tail_indexes[length - 1] if length else None
+
+    run = set()
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        run.add(index)
+        index = previous[index]
+    return run
@@ -0,0 +1,54 @@
+from ..models import Lodging, Trip, TripDay
+
+
+def find_covering_lodging(lodgings: list[Lodging], date) -> Lodging | None:
+    return next(
+        (
+            lodging
+            for lodging in lodgings
+            if lodging.arrival_date <= date <= lodging.departure_date
+        ),
+        None,
+    )
+
+
+def refresh_lodging_coverage(trip_id) -> list[TripDay]:
+    """
+    Point each day of the trip at the lodging covering it, the first to arrive
+    (then the first created) when several do. Runs whenever the trip's lodgings
+    or days are written, with one read of each and one bulk update of the days
+    that changed. Returns those days.
+    """
+    lodgings = list(
+        Lodging.objects.filter(trip_id=trip_id)
+        .order_by("arrival_date", "created_at")
+        .only("id", "arrival_date", "departure_date")
+    )
+    changed = []
+    for trip_day in TripDay.objects.filter(trip_id=trip_id).only(
+        "id", "date", "lodging_id"
+    ):
+        lodging = find_covering_lodging(lodgings, trip_day.date)
+        lodging_id = lodging.id if lodging else None
+        if trip_day.lodging_id != lodging_id:
+            trip_day.lodging_id = lodging_id
+            changed.append(trip_day)
+    TripDay.objects.bulk_update(changed, ["lodging"])
+    return changed
+
+
+def get_lodging_coverage(trip: Trip) -> list[TripDay]:
+    """
+    The trip's days in date order, each with its covering ``lodging`` (and the
+    lodging's place) loaded, in a single query.
+    """
+    return list(trip.trip_days.select_related("lodging__place").order_by("date"))
+
+
+def get_covering_lodging(trip_day: TripDay) -> Lodging | None:
+    """The lodging covering one day, with its place, by primary key."""
+    if trip_day.lodging_id is None:
+        return None
+    return (
+        Lodging.objects.select_related("place").filter(id=trip_day.lodging_id).first()
+    )
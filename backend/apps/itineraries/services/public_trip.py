@@ -0,0 +1,40 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import Trip
+
+
+def _missing_key(token: uuid.UUID) -> str:
+    return f"public-trip:missing:{token.hex}"
+
+
+def find_public_trip(token: str) -> Trip | None:
+    """
+    The shared trip (with its snapshot) behind ``token``, or None.
+
+    Malformed tokens never reach the database, and tokens that matched no
+    shared trip are remembered for PUBLIC_TRIP_MISSING_TTL seconds, so guessing
+    links costs a cache lookup per attempt.
+    """
+    try:
+        token = uuid.UUID(token)
+    except ValueError:
+        return None
+
+    if cache.get(_missing_key(token)):
+        return None
+
+    trip = (
+        Trip.objects.select_related("snapshot")
+        .filter(public_token=token, is_public=True)
+        .first()
+    )
+    if trip is None:
+        cache.set(_missing_key(token), True, settings.PUBLIC_TRIP_MISSING_TTL)
+    return trip
+
+
+def forget_missing_token(token: uuid.UUID):
+    cache.delete(_missing_key(token))
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _cache():
+    return caches[settings.ROUTE_CACHE_ALIAS]
+
+
+def _generation_key(trip_day_id) -> str:
+    return f"route:generation:{trip_day_id}"
+
+
+def _generation(trip_day_id) -> str:
+    """
+    Random token that scopes every cached route of a trip day.
+    Invalidating the day drops the token, so its old entries become unreachable
+    and age out through the backend's own TTL/LRU eviction.
+    """
+    cache = _cache()
+    key = _generation_key(trip_day_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def make_key(trip_day_id, engine: str, payload: dict) -> str:
+    agent = payload["agents"][0]
+    jobs = sorted(
+        (job["id"], job["location"], job.get("duration")) for job in payload["jobs"]
+    )
+    content = json.dumps(
+        {
+            "engine": engine,
+            "mode": payload["mode"],
+            "agent": agent["start_location"],
+            "jobs": jobs,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    digest = hashlib.sha256(content.encode()).hexdigest()
+    return f"route:{trip_day_id}:{_generation(trip_day_id)}:{digest}"
+
+
+def get(key: str) -> dict | None:
+    return _cache().get(key)
+
+
+def store(key: str, data: dict):
+    _cache().set(key, data, timeout=settings.ROUTE_CACHE_TIMEOUT)
+
+
+def invalidate(*trip_day_ids):
+    _cache().delete_many([_generation_key(pk) for pk in trip_day_ids])
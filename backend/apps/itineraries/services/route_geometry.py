@@ -0,0 +1,128 @@
+import hashlib
+
+import numpy as np
+from django.conf import settings
+
+from apps.places.geo import EARTH_RADIUS_M
+from ..models import TripDay, TripDayRoute
+
+POLYLINE_PRECISION = 5
+
+
+def store_route_geometry(
+    trip_day: TripDay, geometry: dict | None, mode: str, engine: str, stats: dict
+) -> TripDayRoute | None:
+    """Persist a route's GeoJSON geometry as a simplified encoded polyline."""
+    coordinates = flatten_geometry(geometry)
+    if len(coordinates) < 2:
+        return None
+
+    points = simplify(coordinates, settings.ROUTE_GEOMETRY_TOLERANCE)
+    polyline = encode_polyline(points, POLYLINE_PRECISION)
+
+    route, _ = TripDayRoute.objects.update_or_create(
+        trip_day=trip_day,
+        defaults={
+            "mode": mode,
+            "engine": engine,
+            "polyline": polyline,
+            "precision": POLYLINE_PRECISION,
+            "point_count": len(points),
+            "distance_km": stats["total_distance_km"],
+            "time_hours": stats["total_time_hours"],
+            "checksum": hashlib.sha256(
+                f"{mode}:{engine}:{polyline}".encode()
+            ).hexdigest()[:32],
+        },
+    )
+    return route
+
+
+def discard_route_geometry(*trip_day_ids):
+    TripDayRoute.objects.filter(trip_day_id__in=trip_day_ids).delete()
+
+
+def flatten_geometry(geometry: dict | None) -> list[list[float]]:
+    """Join the legs of a (Multi)LineString into one list of [lng, lat] points."""
+    if not geometry:
+        return []
+    if geometry.get("type") == "LineString":
+        return list(geometry.get("coordinates", []))
+
+    points = []
+    for leg in geometry.get("coordinates", []):
+        for point in leg:
+            if not points or list(point) != list(points[-1]):
+                points.append(point)
+    return points
+
+
+def simplify(coordinates: list[list[float]], tolerance_m: float) -> np.ndarray:
+    """
+    Ramer-Douglas-Peucker on ``[lng, lat]`` points, with the tolerance in meters.
+    Returns the kept points as (lat, lng) rows, ready for polyline encoding.
+    """
+    points = np.asarray(coordinates, dtype=float)[:, ::-1]
+    if tolerance_m <= 0 or len(points) < 3:
+        return points
+
+    # Local planar projection in meters around the first point
+    lat0 = np.radians(points[0, 0])
+    planar = np.radians(points - points[0]) * EARTH_RADIUS_M
+    planar[:, 1] *= np.cos(lat0)
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        segment = planar[end] - planar[start]
+        offsets = planar[start + 1 : end] - planar[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            cross = segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]
+            distances = np.abs(cross) / length
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return points[keep]
+
+
+def encode_polyline(points: np.ndarray, precision=POLYLINE_PRECISION) -> str:
+    """Google encoded polyline of (lat, lng) rows: zigzag deltas as 5-bit varints."""
+    scaled = np.round(np.asarray(points) * 10**precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=[[0, 0]]).ravel()
+    zigzag = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    chunks = []
+    for value in zigzag.tolist():
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+
+def decode_polyline(polyline: str, precision=POLYLINE_PRECISION) -> list[list[float]]:
+    values = []
+    value, shift = 0, 0
+    for char in polyline:
+        byte = ord(char) - 63
+        value |= (byte & 0x1F) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value, shift = 0, 0
+
+    coordinates = np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0)
+    return (coordinates / 10**precision).tolist()
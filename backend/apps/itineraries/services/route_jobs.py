@@ -0,0 +1,131 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from ..constants import JobStatus
+from ..models import RouteOptimizationJob, TripDay
+from ..serializers import OptimizedRouteSerializer
+from .route_optimizer import RouteOptimizer
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Background workers, kept apart from the pool that solves the days."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ROUTE_JOB_WORKERS,
+            thread_name_prefix="route-job",
+        )
+    return _executor
+
+
+def submit_job(trip_day: TripDay, user, mode="drive", engine=None):
+    purge_expired_jobs()
+
+    job = RouteOptimizationJob.objects.create(
+        trip_id=trip_day.trip_id,
+        trip_day=trip_day,
+        requested_by=user,
+        mode=mode,
+        engine=engine,
+    )
+    # Only hand the job to a worker once its row is visible to other connections
+    transaction.on_commit(lambda: enqueue(job.id))
+
+    requeue_orphaned_jobs()
+    return job
+
+
+def enqueue(job_id):
+    get_executor().submit(run_job, job_id)
+
+
+def run_job(job_id):
+    close_old_connections()
+    try:
+        # Claim the job, so a job that was queued twice only runs once
+        claimed = RouteOptimizationJob.objects.filter(
+            id=job_id, status=JobStatus.PENDING
+        ).update(status=JobStatus.RUNNING, started_at=timezone.now())
+        if not claimed:
+            return
+
+        job = RouteOptimizationJob.objects.select_related("trip_day").get(id=job_id)
+        try:
+            optimizer = RouteOptimizer(job.trip_day, mode=job.mode, engine=job.engine)
+            events = list(
+                job.trip_day.events.select_related("place").order_by("position")
+            )
+            result = optimizer.optimize_events(events, optimizer.get_lodging())
+        except Exception as e:
+            logger.exception(f"Route optimization job {job_id} crashed")
+            result, job.error = None, str(e)
+
+        if result:
+            optimizer.save_geometry(result)
+            job.status = JobStatus.SUCCEEDED
+            job.result = OptimizedRouteSerializer(result).data
+        else:
+            job.status = JobStatus.FAILED
+            job.error = job.error or "Failed to optimize route"
+
+        job.finished_at = timezone.now()
+        job.expires_at = job.finished_at + timedelta(
+            seconds=settings.ROUTE_JOB_RESULT_TTL
+        )
+        job.save(
+            update_fields=[
+                "status",
+                "result",
+                "error",
+                "finished_at",
+                "expires_at",
+                "updated_at",
+            ]
+        )
+    finally:
+        connection.close()
+
+
+def requeue_orphaned_jobs():
+    """
+    Pending jobs are lost from memory when a process restarts, but their rows
+    remain. Put old ones back on the queue; the claim in run_job dedupes.
+
+    Jobs that were running in a process that died would stay running forever,
+    fail the ones running for longer than ROUTE_JOB_TIMEOUT so their clients
+    stop polling and the rows expire like any finished job.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.ROUTE_JOB_STALE_AFTER)
+    orphaned_ids = RouteOptimizationJob.objects.filter(
+        status=JobStatus.PENDING, created_at__lt=stale_before
+    ).values_list("id", flat=True)
+    for job_id in orphaned_ids:
+        enqueue(job_id)
+
+    RouteOptimizationJob.objects.filter(
+        status=JobStatus.RUNNING, started_at__lt=now - job_timeout()
+    ).update(
+        status=JobStatus.FAILED,
+        error="Route optimization timed out",
+        finished_at=now,
+        expires_at=now + timedelta(seconds=settings.ROUTE_JOB_RESULT_TTL),
+        updated_at=now,
+    )
+
+
+def job_timeout() -> timedelta:
+    return timedelta(seconds=settings.ROUTE_JOB_TIMEOUT)
+
+
+def purge_expired_jobs():
+    RouteOptimizationJob.objects.filter(expires_at__lt=timezone.now()).delete()
@@ -1,27 +1,54 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+
 import requests
 from requests.structures import CaseInsensitiveDict
 from django.conf import settings
-from ..models import TripDay, Lodging, Event
+from apps.core.exceptions import CircuitOpenError
+from apps.core.http_client import get_http_client
+from apps.places.services import (
+    PlaceDistanceMatrix,
+    get_distance_matrices,
+    get_distance_matrix,
+)
+from ..constants import RouteEngine
+from ..models import Trip, TripDay, Lodging, Event
+from . import route_cache
+from .lodging_coverage import get_covering_lodging, get_lodging_coverage
+from .route_geometry import store_route_geometry
+from .route_solver import LocalRouteSolver
+
+logger = logging.getLogger(__name__)
 
 
 class RouteOptimizer:
-    URL = "https://api.geoapify.com/v1/routeplanner?apiKey={}"
+    URL = "{}/v1/routeplanner?apiKey={}"
     headers = CaseInsensitiveDict()
     headers["Content-Type"] = "application/json"
 
-    def __init__(self, trip_day: TripDay, mode="drive"):
+    def __init__(
+        self,
+        trip_day: TripDay,
+        mode="drive",
+        engine=None,
+        distance_matrix: PlaceDistanceMatrix | None = None,
+    ):
         self.trip_day = trip_day
         self.mode = mode
+        self.engine = engine or settings.ROUTE_OPTIMIZER_ENGINE
+        # Preloaded place distances, used by the local engine instead of a lookup
+        self.distance_matrix = distance_matrix
 
-    def optimize_route(self) -> tuple[any, dict]:
-        lodging = Lodging.objects.filter(
-            trip=self.trip_day.trip,
-            arrival_date__lte=self.trip_day.date,
-            departure_date__gte=self.trip_day.date,
-        ).first()
+    def get_lodging(self) -> Lodging | None:
+        return get_covering_lodging(self.trip_day)
 
-        events = list(self.trip_day.events.all().order_by("position"))
+    def optimize_route(self) -> tuple[any, dict]:
+        events = list(self.trip_day.events.select_related("place").order_by("position"))
+        return self.optimize(events, self.get_lodging())
 
+    def optimize(self, events: list[Event], lodging: Lodging | None):
+        """Optimize already loaded events and lodging (places must be loaded too)."""
         if not events and not lodging:
             return None, None
 
@@ -33,29 +60,137 @@ class RouteOptimizer:
 
         # 2. Build Payload
         payload = self._build_payload(agent, jobs_list)
-        print("Payload:", payload)
+        # Lazy arguments, the payload is only formatted when debugging
+        logger.debug("Route payload for day %s: %s", self.trip_day.id, payload)
 
         if not payload:
             return None, None
 
-        # 3. Call API
+        # 3. Solve with the configured engine, unless the same stops were solved before
         try:
-            response = requests.post(
-                self.URL.format(settings.GEOAPIFY_API_KEY),
-                headers=self.headers,
-                json=payload,
-            )
-            response.raise_for_status()
-            data = response.json()
-            print("Optimized route:", data)
+            cache_key = route_cache.make_key(self.trip_day.id, self.engine, payload)
+            data = route_cache.get(cache_key)
+            if data is None:
+                data = self._solve(payload, self._stop_places(agent, events, jobs_list))
+                route_cache.store(cache_key, data)
+            logger.debug("Optimized route for day %s: %s", self.trip_day.id, data)
 
             # 👇 FIX: Return BOTH the agent object and the response data
             return agent, data
 
-        except Exception as e:
-            print("Error optimizing route:", e)
+        except (requests.RequestException, CircuitOpenError, ValueError, KeyError) as e:
+            # Upstream failures, and unusable answers from either engine
+            logger.warning(
+                "Could not optimize the route of day %s: %s",
+                self.trip_day.id,
+                e,
+                exc_info=True,
+            )
             return None, None
 
+    def optimize_events(
+        self, events: list[Event], lodging: Lodging | None
+    ) -> dict | None:
+        """
+        Optimize the day and return the events in their new order, together with
+        the route stats and geometry. Events the route service could not reach
+        are appended at the end.
+        """
+        agent, res = self.optimize(events, lodging)
+        if not agent or not res:
+            return None
+
+        parsed_res = self.parse_response(agent, res)
+        if not parsed_res:
+            return None
+
+        event_map = {str(e.id): e for e in events}
+        optimized_ids = parsed_res["ordered_ids"]
+        final_event_list = [
+            event_map[e_id] for e_id in optimized_ids if e_id in event_map
+        ]
+
+        optimized_set = set(optimized_ids)
+        missing_events = [e for e in events if str(e.id) not in optimized_set]
+
+        warning = None
+        if missing_events:
+            final_event_list.extend(missing_events)
+            warning = f"Could not route to {len(missing_events)} location(s). They were moved to the end."
+
+        return {
+            "events": final_event_list,
+            "stats": {
+                "total_distance_km": parsed_res["total_distance_km"],
+                "total_time_hours": parsed_res["total_time_hours"],
+            },
+            "warning": warning,
+            "geometry": parsed_res["route_geometry"],
+        }
+
+    def save_geometry(self, result: dict):
+        """Keep the geometry of an optimize_events() result for the day's route endpoint."""
+        return store_route_geometry(
+            self.trip_day, result["geometry"], self.mode, self.engine, result["stats"]
+        )
+
+    @staticmethod
+    def parse_response(agent: any, data: dict):
+        ordered_ids = []
+        if isinstance(agent, Event):
+            ordered_ids.append(str(agent.id))
+
+        try:
+            features = data.get("features", [])
+            feature = features[0] if features else None
+            if not feature:
+                logger.warning("No features found in route service response")
+                return None
+
+            props = feature.get("properties", {})
+            route_geometry = feature.get("geometry")
+
+            total_distance_km = props.get("distance", 0) / 1000
+            total_time_hours = props.get("time", 0) / 3600
+
+            for action in props.get("actions", []):
+                if action["type"] == "job":
+                    # extract job_id (same as event_id provided in the request)
+                    event_id = action["job_id"]
+                    ordered_ids.append(event_id)
+
+            return {
+                "total_distance_km": total_distance_km,
+                "total_time_hours": total_time_hours,
+                "ordered_ids": ordered_ids,
+                "route_geometry": route_geometry,
+            }
+        except (AttributeError, KeyError, TypeError) as e:
+            # Not the shape of a route planner answer
+            logger.warning("Could not parse the route service response: %s", e)
+            return None
+
+    def _solve(self, payload: dict, stop_places: list) -> dict:
+        if self.engine == RouteEngine.LOCAL:
+            matrix = self.distance_matrix or get_distance_matrix(
+                [stop_places], self.mode
+            )
+            distances, durations = matrix.submatrix([p.id for p in stop_places])
+            return LocalRouteSolver(self.mode).solve(payload, distances, durations)
+
+        response = get_http_client("geoapify").post(
+            self.URL.format(settings.GEOAPIFY_BASE_URL, settings.GEOAPIFY_API_KEY),
+            headers=self.headers,
+            json=payload,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _stop_places(self, agent: any, events: list[Event], jobs_list: list[dict]):
+        """Places in payload order: the agent's start, then every job."""
+        event_map = {str(e.id): e for e in events}
+        return [agent.place] + [event_map[job["id"]].place for job in jobs_list]
+
     def _build_payload(self, agent: any, jobs_list: list[dict]):
         try:
             # Handle both Event and Lodging objects safely
@@ -103,3 +238,162 @@ class RouteOptimizer:
         ]
 
         return agent, jobs_list
+
+
+def is_optimizable(events: list[Event], lodging: Lodging | None) -> bool:
+    # A route needs at least 3 events, or 2 events starting from a lodging
+    return len(events) > (1 if lodging else 2)
+
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Process-wide pool that bounds how many days are solved at the same time."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ROUTE_OPTIMIZER_MAX_WORKERS,
+            thread_name_prefix="route-optimizer",
+        )
+    return _executor
+
+
+def optimize_trip(trip: Trip, mode="drive", engine=None) -> list[dict]:
+    """
+    Optimize every day of a trip in one go.
+
+    All days (with their lodging) and events (with places) are loaded in two
+    queries up front, then the days are solved concurrently, so the wall time is roughly
+    that of the slowest day instead of the sum of all of them. The local engine
+    also gets every day's place distances from a single bulk read, with the
+    Geoapify calls for the missing ones made concurrently as well.
+    """
+    trip_days = get_lodging_coverage(trip)
+
+    events_by_day = defaultdict(list)
+    events = (
+        Event.objects.filter(trip_day__trip=trip)
+        .select_related("place")
+        .order_by("position")
+    )
+    for event in events:
+        events_by_day[event.trip_day_id].append(event)
+
+    days = [
+        (trip_day, events_by_day[trip_day.id], trip_day.lodging)
+        for trip_day in trip_days
+    ]
+
+    engine = engine or settings.ROUTE_OPTIMIZER_ENGINE
+    distance_matrix = None
+    if engine == RouteEngine.LOCAL:
+        place_groups = [
+            [e.place for e in day_events if e.place]
+            + ([lodging.place] if lodging and lodging.place else [])
+            for _, day_events, lodging in days
+            if is_optimizable(day_events, lodging)
+        ]
+        distance_matrix = get_distance_matrix(place_groups, mode)
+
+    results = []
+    futures = {}
+    for trip_day, day_events, lodging in days:
+        result = {
+            "trip_day": trip_day,
+            "status": "skipped",
+            "events": day_events,
+            "stats": None,
+            "warning": None,
+        }
+        results.append(result)
+
+        if is_optimizable(day_events, lodging):
+            optimizer = RouteOptimizer(
+                trip_day, mode=mode, engine=engine, distance_matrix=distance_matrix
+            )
+            futures[trip_day.id] = (
+                optimizer,
+                get_executor().submit(optimizer.optimize_events, day_events, lodging),
+            )
+
+    for result in results:
+        if result["trip_day"].id not in futures:
+            continue
+
+        optimizer, future = futures[result["trip_day"].id]
+        optimized = future.result()
+        if optimized:
+            optimizer.save_geometry(optimized)
+            result.update(status="optimized", **optimized)
+        else:
+            result["status"] = "failed"
+
+    return results
+
+
+def optimize_modes(
+    trip_day: TripDay,
+    events: list[Event],
+    lodging: Lodging | None,
+    modes: list[str],
+    engine=None,
+) -> list[dict]:
+    """
+    Optimize one day for several travel modes at once.
+
+    The day's events and lodging are loaded once by the caller and shared by
+    every mode, the local engine's distances for all modes come from a single
+    lookup, and the modes are solved concurrently, so comparing them costs
+    about as much as the slowest one. Only the first mode that could be
+    optimized keeps its geometry for the day's route endpoint.
+    """
+    engine = engine or settings.ROUTE_OPTIMIZER_ENGINE
+
+    distance_matrices = {}
+    if engine == RouteEngine.LOCAL:
+        places = [e.place for e in events if e.place]
+        if lodging and lodging.place:
+            places.append(lodging.place)
+        # One read for every mode, their missing distances fetched together
+        distance_matrices = get_distance_matrices([places], modes)
+
+    optimizers = [
+        RouteOptimizer(
+            trip_day,
+            mode=mode,
+            engine=engine,
+            distance_matrix=distance_matrices.get(mode),
+        )
+        for mode in modes
+    ]
+    if len(optimizers) == 1:
+        optimized = [optimizers[0].optimize_events(events, lodging)]
+    else:
+        futures = [
+            get_executor().submit(optimizer.optimize_events, events, lodging)
+            for optimizer in optimizers
+        ]
+        optimized = [future.result() for future in futures]
+
+    results = []
+    geometry_saved = False
+    for optimizer, result in zip(optimizers, optimized):
+        if not result:
+            results.append(
+                {
+                    "mode": optimizer.mode,
+                    "status": "failed",
+                    "events": events,
+                    "stats": None,
+                    "warning": None,
+                }
+            )
+            continue
+
+        if not geometry_saved:
+            optimizer.save_geometry(result)
+            geometry_saved = True
+        results.append({"mode": optimizer.mode, "status": "optimized", **result})
+
+    return results
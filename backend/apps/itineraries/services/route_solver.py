@@ -0,0 +1,258 @@
+import numpy as np
+
+from apps.places.geo import estimate_travel_matrices
+
+# Held-Karp is O(2^n * n^2), exact and still instant up to this many jobs.
+HELD_KARP_MAX_JOBS = 12
+
+# Or-opt moves chains of up to this many consecutive stops.
+OR_OPT_MAX_SEGMENT = 3
+
+
+class LocalRouteSolver:
+    """
+    In-process replacement for the Geoapify route planner.
+
+    Takes the same payload ``RouteOptimizer`` posts to Geoapify (one agent with a
+    ``start_location`` and a list of jobs) and returns a response with the same
+    ``features[0].properties.actions`` shape, so callers can't tell the engines
+    apart. The agent does not return to its start, so the route is an open path.
+    """
+
+    def __init__(self, mode: str = "drive"):
+        self.mode = mode
+
+    def solve(
+        self,
+        payload: dict,
+        distances: np.ndarray | None = None,
+        durations: np.ndarray | None = None,
+    ) -> dict:
+        """
+        ``distances``/``durations`` (meters/seconds, start first then jobs) can be
+        passed in from the place distance store; otherwise they are estimated.
+        """
+        agent = payload["agents"][0]
+        jobs = payload["jobs"]
+
+        # Node 0 is the agent start, nodes 1..n are the jobs (locations are [lng, lat])
+        locations = [agent["start_location"]] + [job["location"] for job in jobs]
+        if distances is None or durations is None:
+            coordinates = [(lat, lng) for lng, lat in locations]
+            distances, durations = estimate_travel_matrices(coordinates, self.mode)
+
+        order = self.solve_order(distances)
+        return self._build_response(payload, locations, distances, durations, order)
+
+    def solve_order(self, distances: np.ndarray) -> list[int]:
+        """Return the job visiting order as node indices (1..n), start excluded."""
+        job_count = len(distances) - 1
+        if job_count <= 1:
+            return list(range(1, job_count + 1))
+        if job_count <= HELD_KARP_MAX_JOBS:
+            return held_karp_path(distances)
+
+        matrix = distances.tolist()
+        route = nearest_neighbour_path(matrix)
+        return improve_path(matrix, route)[1:]
+
+    def _build_response(
+        self,
+        payload: dict,
+        locations: list[list[float]],
+        distances: np.ndarray,
+        durations: np.ndarray,
+        order: list[int],
+    ) -> dict:
+        jobs = payload["jobs"]
+        actions = [{"index": 0, "type": "start", "start_time": 0, "duration": 0}]
+        legs = []
+        total_distance = 0.0
+        clock = 0.0
+        previous = 0
+
+        for waypoint_index, node in enumerate(order, start=1):
+            job = jobs[node - 1]
+            leg_distance = float(distances[previous][node])
+            leg_time = float(durations[previous][node])
+            total_distance += leg_distance
+            clock += leg_time
+            legs.append(
+                {
+                    "from_waypoint_index": waypoint_index - 1,
+                    "to_waypoint_index": waypoint_index,
+                    "distance": round(leg_distance),
+                    "time": round(leg_time),
+                }
+            )
+
+            duration = job.get("duration", 0)
+            actions.append(
+                {
+                    "index": waypoint_index,
+                    "type": "job",
+                    "job_index": node - 1,
+                    "job_id": job.get("id"),
+                    "start_time": round(clock),
+                    "duration": duration,
+                    "waypoint_index": waypoint_index,
+                }
+            )
+            clock += duration
+            previous = node
+
+        actions.append(
+            {"index": len(actions), "type": "end", "start_time": round(clock)}
+        )
+
+        path = [locations[0]] + [locations[node] for node in order]
+        return {
+            "type": "FeatureCollection",
+            "properties": {"mode": self.mode, "engine": "local"},
+            "features": [
+                {
+                    "type": "Feature",
+                    "geometry": {
+                        "type": "MultiLineString",
+                        "coordinates": [
+                            [path[i], path[i + 1]] for i in range(len(path) - 1)
+                        ],
+                    },
+                    "properties": {
+                        "agent_index": 0,
+                        "mode": self.mode,
+                        "distance": round(total_distance),
+                        "time": round(clock),
+                        "start_time": 0,
+                        "end_time": round(clock),
+                        "actions": actions,
+                        "legs": legs,
+                    },
+                }
+            ],
+        }
+
+
+def held_karp_path(distances: np.ndarray) -> list[int]:
+    """
+    Exact shortest open path from node 0 through every other node.
+
+    Subsets are processed one cardinality layer at a time so each step is a
+    single vectorized min over all masks of that size.
+    """
+    n = len(distances) - 1
+    start_costs = distances[0, 1:]
+    job_costs = distances[1:, 1:]
+
+    full = 1 << n
+    costs = np.full((full, n), np.inf)
+    parents = np.full((full, n), -1, dtype=np.int64)
+    for j in range(n):
+        costs[1 << j, j] = start_costs[j]
+
+    masks = np.arange(full, dtype=np.int64)
+    sizes = np.bitwise_count(masks)
+
+    for size in range(2, n + 1):
+        layer = masks[sizes == size]
+        for j in range(n):
+            subset = layer[(layer >> j) & 1 == 1]
+            previous = subset ^ (1 << j)
+            # costs[previous, j] is inf since j is not in previous, so no self-loops
+            candidates = costs[previous] + job_costs[:, j]
+            best = np.argmin(candidates, axis=1)
+            costs[subset, j] = candidates[np.arange(len(subset)), best]
+            parents[subset, j] = best
+
+    mask = full - 1
+    last = int(np.argmin(costs[mask]))
+    order = []
+    while last != -1:
+        order.append(last + 1)
+        previous = int(parents[mask, last])
+        mask ^= 1 << last
+        last = previous
+
+    return order[::-1]
+
+
+def nearest_neighbour_path(matrix: list[list[float]]) -> list[int]:
+    route = [0]
+    remaining = set(range(1, len(matrix)))
+    while remaining:
+        current = matrix[route[-1]]
+        nearest = min(remaining, key=current.__getitem__)
+        route.append(nearest)
+        remaining.remove(nearest)
+    return route
+
+
+def path_cost(matrix: list[list[float]], route: list[int]) -> float:
+    return sum(matrix[route[i]][route[i + 1]] for i in range(len(route) - 1))
+
+
+def improve_path(matrix: list[list[float]], route: list[int]) -> list[int]:
+    """Alternate 2-opt and Or-opt passes until neither finds an improvement."""
+    route = list(route)
+    improved = True
+    while improved:
+        improved = two_opt(matrix, route)
+        improved = or_opt(matrix, route) or improved
+    return route
+
+
+def two_opt(matrix: list[list[float]], route: list[int]) -> bool:
+    """Reverse segments in place while it shortens the path. Node 0 stays first."""
+    improved_any = False
+    last = len(route) - 1
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, last):
+            for k in range(i + 1, last + 1):
+                before = route[i - 1]
+                candidate = route[:i] + route[i : k + 1][::-1] + route[k + 1 :]
+                # Segment reversal changes inner legs on asymmetric matrices,
+                # so compare the affected span instead of only the endpoints.
+                end = min(k + 2, last + 1)
+                old = path_cost(matrix, [before] + route[i:end])
+                new = path_cost(matrix, [before] + candidate[i:end])
+                if new + 1e-9 < old:
+                    route[:] = candidate
+                    improved = improved_any = True
+    return improved_any
+
+
+def or_opt(matrix: list[list[float]], route: list[int]) -> bool:
+    """Relocate chains of 1..OR_OPT_MAX_SEGMENT stops in place."""
+
+    def leg(a, b):
+        return matrix[a][b] if b is not None else 0.0
+
+    improved_any = False
+    improved = True
+    while improved:
+        improved = False
+        for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+            for i in range(1, len(route) - length + 1):
+                first, last = route[i], route[i + length - 1]
+                before = route[i - 1]
+                after = route[i + length] if i + length < len(route) else None
+                removal = leg(before, after) - matrix[before][first] - leg(last, after)
+
+                rest = route[:i] + route[i + length :]
+                best_delta, best_position = -1e-9, None
+                for position in range(1, len(rest) + 1):
+                    if position == i:
+                        continue
+                    a = rest[position - 1]
+                    b = rest[position] if position < len(rest) else None
+                    delta = removal + matrix[a][first] + leg(last, b) - leg(a, b)
+                    if delta < best_delta:
+                        best_delta, best_position = delta, position
+
+                if best_position is not None:
+                    segment = route[i : i + length]
+                    route[:] = rest[:best_position] + segment + rest[best_position:]
+                    improved = improved_any = True
+    return improved_any
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from ..constants import TripResource
+from ..models import Event, Lodging, Trip, TripDay, TripSavedPlace, TripTombstone
+
+PURGE_LOCK_KEY = "trip-tombstones:purged"
+
+
+def record_tombstone(resource: TripResource, trip_id, object_id):
+    record_tombstones(resource, trip_id, [object_id])
+
+
+def record_tombstones(resource: TripResource, trip_id, object_ids: list):
+    """Tombstones for several deleted rows of one trip, in a single insert."""
+    TripTombstone.objects.bulk_create(
+        TripTombstone(trip_id=trip_id, resource=resource, object_id=object_id)
+        for object_id in object_ids
+    )
+    # At most one purge per hour, whoever deletes something first
+    if cache.add(PURGE_LOCK_KEY, True, 60 * 60):
+        purge_expired_tombstones()
+
+
+def purge_expired_tombstones():
+    TripTombstone.objects.filter(
+        created_at__lt=timezone.now() - timedelta(seconds=settings.TRIP_TOMBSTONE_TTL)
+    ).delete()
+
+
+def is_cursor_expired(since: datetime) -> bool:
+    """Deletions before the cursor may have been purged already."""
+    return since < timezone.now() - timedelta(seconds=settings.TRIP_TOMBSTONE_TTL)
+
+
+def collect_trip_changes(trip: Trip, since: datetime) -> dict:
+    """
+    Rows of ``trip`` created or updated since ``since``, the ids of the ones
+    deleted since then, and the cursor to ask for the next changes with.
+
+    Events and lodgings whose place changed count as changed. Rows deleted along
+    with their day have no tombstone of their own.
+    """
+    # Taken first and moved back a little: anything committed after the reads
+    # below, or written by a transaction that was still open, shows up next time
+    cursor = timezone.now() - timedelta(seconds=settings.TRIP_CHANGES_OVERLAP)
+    changed = Q(updated_at__gte=since)
+    place_changed = changed | Q(place__updated_at__gte=since)
+
+    deleted = {resource.value: [] for resource in TripResource}
+    for resource, object_id in TripTombstone.objects.filter(
+        trip_id=trip.id, created_at__gte=since
+    ).values_list("resource", "object_id"):
+        deleted[resource].append(object_id)
+
+    return {
+        "cursor": cursor,
+        "trip": trip if trip.updated_at >= since else None,
+        TripResource.TRIP_DAYS: TripDay.objects.filter(changed, trip=trip).order_by(
+            "date"
+        ),
+        TripResource.EVENTS: Event.objects.filter(place_changed, trip_day__trip=trip)
+        .select_related("place")
+        .order_by("trip_day_id", "position"),
+        TripResource.LODGINGS: Lodging.objects.filter(place_changed, trip=trip)
+        .select_related("place")
+        .order_by("arrival_date"),
+        TripResource.SAVED_PLACES: TripSavedPlace.objects.filter(
+            place_changed, trip=trip
+        )
+        .select_related("place", "saved_by")
+        .order_by("created_at"),
+        "deleted": deleted,
+    }
@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+from uuid import uuid4
+
+from django.db import transaction
+
+from ..models import Event, Lodging, Trip, TripDay, TripSavedPlace, UserTrip
+from .lodging_coverage import refresh_lodging_coverage
+
+
+@transaction.atomic
+def clone_trip(
+    trip: Trip, user, name: str | None = None, start_date: date | None = None
+) -> Trip:
+    """
+    Copy ``trip`` with its days, events, lodgings and saved places for ``user``,
+    moved to ``start_date`` when given. The copy is private and ``user`` is its
+    only member.
+
+    Rows are read with one query per table and written with one bulk insert per
+    table, new ids are mapped in memory, so the cost does not grow with the
+    trip's size.
+    """
+    offset = timedelta(days=(start_date - trip.start_date).days if start_date else 0)
+
+    clone = Trip.objects.create(
+        name=name or trip.name,
+        start_date=trip.start_date + offset,
+        end_date=trip.end_date + offset,
+        user=user,
+    )
+    UserTrip.objects.create(user=user, trip=clone)
+
+    day_ids = {}
+    days = []
+    for trip_day in TripDay.objects.filter(trip=trip):
+        day_ids[trip_day.id] = uuid4()
+        days.append(
+            TripDay(id=day_ids[trip_day.id], trip=clone, date=trip_day.date + offset)
+        )
+    TripDay.objects.bulk_create(days)
+
+    Event.objects.bulk_create(
+        Event(
+            trip_day_id=day_ids[event.trip_day_id],
+            place_id=event.place_id,
+            type=event.type,
+            position=event.position,
+            notes=event.notes,
+        )
+        for event in Event.objects.filter(trip_day__trip=trip)
+    )
+    Lodging.objects.bulk_create(
+        Lodging(
+            trip=clone,
+            place_id=lodging.place_id,
+            arrival_date=lodging.arrival_date + offset,
+            departure_date=lodging.departure_date + offset,
+        )
+        for lodging in Lodging.objects.filter(trip=trip)
+    )
+    refresh_lodging_coverage(clone.id)
+    TripSavedPlace.objects.bulk_create(
+        TripSavedPlace(trip=clone, place_id=saved.place_id, saved_by=user)
+        for saved in TripSavedPlace.objects.filter(trip=trip)
+    )
+    return clone
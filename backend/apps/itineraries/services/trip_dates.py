@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.db.models import F, Max, Min
+from django.utils import timezone
+
+from ..models import Lodging, Trip, TripDay
+from .trip_snapshot import invalidate_trip_snapshots
+
+
+def shift_trip_dates(trip: Trip, days: int):
+    """
+    Move all of the trip's days and lodgings ``days`` later (earlier when
+    negative) with a few UPDATEs, whatever the trip's length. Events stay on
+    their day, so they move along.
+    """
+    if not days:
+        return
+
+    trip_days = TripDay.objects.filter(trip=trip)
+    bounds = trip_days.aggregate(first=Min("date"), last=Max("date"))
+    if bounds["first"] is None:
+        return
+
+    # (trip, date) is unique and checked row by row, so go through dates past
+    # both the old and the new range first
+    detour = (bounds["last"] - bounds["first"]).days + abs(days) + 1
+    now = timezone.now()
+    trip_days.update(date=F("date") + timedelta(days=days + detour), updated_at=now)
+    trip_days.update(date=F("date") - timedelta(days=detour), updated_at=now)
+    Lodging.objects.filter(trip=trip).update(
+        arrival_date=F("arrival_date") + timedelta(days=days),
+        departure_date=F("departure_date") + timedelta(days=days),
+        updated_at=now,
+    )
+
+    # Updates send no signals. Every day keeps its events and lodging, so the
+    # cached routes still hold
+    invalidate_trip_snapshots(trip.id)
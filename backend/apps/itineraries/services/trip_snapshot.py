@@ -0,0 +1,65 @@
+import hashlib
+
+from django.db import transaction
+
+from apps.core.renderer import StandardResponseRenderer
+from ..models import Trip, TripSnapshot
+
+
+def get_or_build_trip_snapshot(trip: Trip) -> TripSnapshot:
+    """
+    The trip's snapshot when there is one (select_related("snapshot") makes that
+    free), otherwise a freshly built one.
+    """
+    try:
+        return trip.snapshot
+    except TripSnapshot.DoesNotExist:
+        return build_trip_snapshot(trip)
+
+
+def build_trip_snapshot(trip: Trip) -> TripSnapshot:
+    from ..serializers import TripDetailSerializer
+
+    trip = Trip.objects.with_itinerary().get(pk=trip.pk)
+    content = (
+        StandardResponseRenderer().encode(TripDetailSerializer(trip).data).decode()
+    )
+    # One upsert, a concurrent read may have stored the snapshot meanwhile
+    snapshot = TripSnapshot(
+        trip=trip,
+        content=content,
+        checksum=hashlib.sha256(content.encode()).hexdigest()[:32],
+    )
+    TripSnapshot.objects.bulk_create(
+        [snapshot],
+        update_conflicts=True,
+        unique_fields=["trip"],
+        update_fields=["content", "checksum", "updated_at"],
+    )
+    return snapshot
+
+
+def invalidate_trip_snapshots(*trip_ids):
+    TripSnapshot.objects.filter(trip_id__in=trip_ids).delete()
+    # A concurrent read can rebuild from the rows as they were before this
+    # transaction commits, so drop whatever it stored once it has
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(
+            lambda: TripSnapshot.objects.filter(trip_id__in=trip_ids).delete()
+        )
+
+
+def invalidate_trip_day_snapshots(*trip_day_ids):
+    invalidate_trip_snapshots(
+        *Trip.objects.filter(trip_days__in=trip_day_ids)
+        .values_list("id", flat=True)
+        .distinct()
+    )
+
+
+def invalidate_place_snapshots(*place_ids):
+    invalidate_trip_snapshots(
+        *Trip.objects.filter(trip_days__events__place__in=place_ids)
+        .values_list("id", flat=True)
+        .distinct()
+    )
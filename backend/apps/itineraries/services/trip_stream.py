@@ -0,0 +1,21 @@
+from django.db import transaction
+
+from apps.core.pubsub import get_broker
+
+
+def trip_channel(trip_id) -> str:
+    return f"trip:{trip_id}"
+
+
+def publish_trip_change(trip_id, kind: str, **data):
+    """
+    Tell the trip's live listeners about a change once the transaction commits,
+    as ``{"type": kind, **data}``. Messages are small, listeners refetch what
+    they need (e.g. through the changes feed).
+    """
+    message = {"type": kind, **data}
+    transaction.on_commit(lambda: get_broker().publish(trip_channel(trip_id), message))
+
+
+def event_summary(event) -> dict:
+    return {"id": event.id, "trip_day": event.trip_day_id, "position": event.position}
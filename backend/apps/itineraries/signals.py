@@ -0,0 +1,181 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.places.models import Place
+from .constants import TripResource
+from .models import Event, Lodging, Trip, TripDay, TripSavedPlace, TripTombstone
+from .services import route_cache
+from .services.lodging_coverage import refresh_lodging_coverage
+from .services.public_trip import forget_missing_token
+from .services.event_batch import is_applying_batch
+from .services.route_geometry import discard_route_geometry
+from .services.trip_changes import record_tombstone
+from .services.trip_stream import event_summary, publish_trip_change
+from .services.trip_snapshot import (
+    invalidate_place_snapshots,
+    invalidate_trip_day_snapshots,
+    invalidate_trip_snapshots,
+)
+
+
+@receiver([post_save, post_delete], sender=Event)
+def invalidate_event_route(sender, instance: Event, **kwargs):
+    if is_applying_batch():
+        return
+    route_cache.invalidate(instance.trip_day_id)
+    discard_route_geometry(instance.trip_day_id)
+
+
+@receiver([post_save, post_delete], sender=Lodging)
+def invalidate_lodging_routes(sender, instance: Lodging, **kwargs):
+    # A lodging edit may have moved its date range, so drop every day of the trip
+    trip_day_ids = list(
+        TripDay.objects.filter(trip_id=instance.trip_id).values_list("id", flat=True)
+    )
+    route_cache.invalidate(*trip_day_ids)
+    discard_route_geometry(*trip_day_ids)
+
+
+@receiver(post_save, sender=Lodging)
+def refresh_lodging_days(sender, instance: Lodging, **kwargs):
+    refresh_lodging_coverage(instance.trip_id)
+
+
+@receiver(post_save, sender=Trip)
+def invalidate_trip_snapshot(sender, instance: Trip, **kwargs):
+    invalidate_trip_snapshots(instance.id)
+    if instance.is_public and instance.public_token:
+        forget_missing_token(instance.public_token)
+
+
+@receiver([post_save, post_delete], sender=TripDay)
+def invalidate_trip_day_snapshot(sender, instance: TripDay, **kwargs):
+    invalidate_trip_snapshots(instance.trip_id)
+
+
+@receiver([post_save, post_delete], sender=Event)
+def invalidate_event_snapshot(sender, instance: Event, **kwargs):
+    if is_applying_batch():
+        return
+    invalidate_trip_day_snapshots(instance.trip_day_id)
+
+
+@receiver(post_save, sender=Place)
+@receiver(pre_delete, sender=Place)
+def invalidate_place_snapshot(sender, instance: Place, **kwargs):
+    # Before the delete, while the events still point at the place (SET_NULL
+    # clears them with an UPDATE that sends no Event signals)
+    invalidate_place_snapshots(instance.id)
+
+
+def _event_trip_id(event: Event):
+    """
+    Trip of ``event``, from its day when that is loaded already, otherwise
+    looked up once and kept on the instance for the other receivers.
+    """
+    if Event.trip_day.is_cached(event):
+        return event.trip_day.trip_id
+    if not hasattr(event, "_trip_id"):
+        event._trip_id = (
+            TripDay.objects.filter(id=event.trip_day_id)
+            .values_list("trip_id", flat=True)
+            .first()
+        )
+    return event._trip_id
+
+
+def _deleted_along(origin, *models) -> bool:
+    """Whether the delete started from (a queryset of) one of ``models``."""
+    model = getattr(origin, "model", None) or type(origin)
+    return issubclass(model, models)
+
+
+@receiver(post_delete, sender=TripDay)
+def record_trip_day_tombstone(sender, instance: TripDay, origin=None, **kwargs):
+    if not _deleted_along(origin, Trip):
+        record_tombstone(TripResource.TRIP_DAYS, instance.trip_id, instance.id)
+
+
+@receiver(post_delete, sender=Event)
+def record_event_tombstone(sender, instance: Event, origin=None, **kwargs):
+    # Clients drop the events of a deleted day themselves, batches record theirs
+    if not _deleted_along(origin, Trip, TripDay) and not is_applying_batch():
+        record_tombstone(TripResource.EVENTS, _event_trip_id(instance), instance.id)
+
+
+@receiver(post_delete, sender=Lodging)
+def record_lodging_tombstone(sender, instance: Lodging, origin=None, **kwargs):
+    if not _deleted_along(origin, Trip):
+        record_tombstone(TripResource.LODGINGS, instance.trip_id, instance.id)
+
+
+@receiver(post_delete, sender=Lodging)
+def refresh_lodging_days_after_delete(sender, instance: Lodging, origin=None, **kwargs):
+    # SET_NULL already cleared the days, another lodging may cover them
+    if not _deleted_along(origin, Trip):
+        refresh_lodging_coverage(instance.trip_id)
+
+
+@receiver(post_delete, sender=TripSavedPlace)
+def record_saved_place_tombstone(
+    sender, instance: TripSavedPlace, origin=None, **kwargs
+):
+    if not _deleted_along(origin, Trip):
+        record_tombstone(TripResource.SAVED_PLACES, instance.trip_id, instance.id)
+
+
+@receiver(post_delete, sender=Trip)
+def discard_trip_tombstones(sender, instance: Trip, **kwargs):
+    TripTombstone.objects.filter(trip_id=instance.id).delete()
+
+
+@receiver(pre_delete, sender=Place)
+def touch_place_references(sender, instance: Place, **kwargs):
+    # SET_NULL clears the place with an UPDATE that leaves updated_at alone,
+    # bump it so the changes feed picks the events and lodgings up
+    now = timezone.now()
+    Event.objects.filter(place=instance).update(updated_at=now)
+    Lodging.objects.filter(place=instance).update(updated_at=now)
+
+
+@receiver(post_save, sender=Event)
+def publish_event_saved(sender, instance: Event, created: bool, **kwargs):
+    publish_trip_change(
+        _event_trip_id(instance),
+        "event.created" if created else "event.updated",
+        **event_summary(instance),
+    )
+
+
+@receiver(post_delete, sender=Event)
+def publish_event_deleted(sender, instance: Event, origin=None, **kwargs):
+    # Deleted days come with a trip.changed, batches with an events.changed
+    if not _deleted_along(origin, Trip, TripDay) and not is_applying_batch():
+        publish_trip_change(
+            _event_trip_id(instance),
+            "event.deleted",
+            id=instance.id,
+            trip_day=instance.trip_day_id,
+        )
+
+
+@receiver(post_save, sender=Lodging)
+def publish_lodging_saved(sender, instance: Lodging, **kwargs):
+    publish_trip_change(instance.trip_id, "lodging.changed", id=instance.id)
+
+
+@receiver(post_delete, sender=Lodging)
+def publish_lodging_deleted(sender, instance: Lodging, origin=None, **kwargs):
+    if not _deleted_along(origin, Trip):
+        publish_trip_change(instance.trip_id, "lodging.deleted", id=instance.id)
+
+
+@receiver(post_save, sender=Trip)
+def publish_trip_saved(sender, instance: Trip, **kwargs):
+    publish_trip_change(instance.id, "trip.changed", id=instance.id)
+
+
+@receiver(post_delete, sender=Trip)
+def publish_trip_deleted(sender, instance: Trip, **kwargs):
+    publish_trip_change(instance.id, "trip.deleted", id=instance.id)
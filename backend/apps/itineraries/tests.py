@@ -1 +1,1577 @@
-# Create your tests here.
+import asyncio
+import itertools
+import math
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection
+from django.db.models import Prefetch
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.core.pagination import KeysetPagination
+from apps.core.pubsub import get_broker
+from apps.places.models import Place
+from .benchmarks.fixtures import generate_trip
+from .constants import JobStatus
+from .services import route_cache
+from .services.day_planner import balanced_kmeans
+from .services.route_geometry import (
+    decode_polyline,
+    encode_polyline,
+    flatten_geometry,
+    simplify,
+)
+from .services.route_jobs import purge_expired_jobs, requeue_orphaned_jobs
+from .services.route_optimizer import RouteOptimizer, optimize_trip
+from .services.route_solver import (
+    LocalRouteSolver,
+    held_karp_path,
+    improve_path,
+    nearest_neighbour_path,
+    path_cost,
+)
+from .services.trip_stream import trip_channel
+from .models import (
+    POSITION_GAP,
+    Event,
+    Lodging,
+    RouteOptimizationJob,
+    Trip,
+    TripDay,
+    TripSavedPlace,
+    TripDayRoute,
+    TripSnapshot,
+    TripTombstone,
+    UserTrip,
+)
+
+User = get_user_model()
+
+# Trip (with its snapshot) when the snapshot is there
+TRIP_SNAPSHOT_QUERIES = 1
+# Plus the trip, its days and their events (places are joined in) to rebuild
+# it, and the snapshot upsert
+TRIP_REBUILD_QUERIES = 5
+TRIP_SIZES = [(1, 1), (7, 5), (30, 5)]
+
+
+def create_user(name: str):
+    return User.objects.create_user(
+        email=f"{name}@example.com",
+        first_name="Trip",
+        last_name=name.title(),
+        password=None,
+    )
+
+
+class TripTestCase(APITestCase):
+    """A user signed in to the API, named after the test class."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(cls.__name__.lower())
+
+    def setUp(self):
+        # Anonymous reads are throttled through the cache
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+
+class TripDetailQueryBudgetTests(TripTestCase):
+    """Reading a trip costs the same number of queries however big it is."""
+
+    def test_retrieve(self):
+        for days, events_per_day in TRIP_SIZES:
+            trip = generate_trip(self.user, days, events_per_day)
+            with self.subTest(days=days, events_per_day=events_per_day):
+                for budget in [TRIP_REBUILD_QUERIES, TRIP_SNAPSHOT_QUERIES]:
+                    with self.assertNumQueries(budget):
+                        response = self.client.get(f"/api/trips/{trip.id}/")
+                    self.assertEqual(response.status_code, 200)
+                    self.assertItineraryLoaded(
+                        response.json()["data"], days, events_per_day
+                    )
+
+    def test_public_trip(self):
+        self.client.force_authenticate(None)
+        for days, events_per_day in TRIP_SIZES:
+            trip = generate_trip(self.user, days, events_per_day)
+            trip.is_public = True
+            trip.save(update_fields=["is_public"])
+            with self.subTest(days=days, events_per_day=events_per_day):
+                for budget in [TRIP_REBUILD_QUERIES, TRIP_SNAPSHOT_QUERIES]:
+                    with self.assertNumQueries(budget):
+                        response = self.client.get(
+                            f"/api/trips/shared/{trip.public_token}/"
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertItineraryLoaded(
+                        response.json()["data"], days, events_per_day
+                    )
+
+    def assertItineraryLoaded(self, data, days, events_per_day):
+        trip_days = data["trip_days"]
+        self.assertEqual(len(trip_days), days)
+        self.assertEqual(
+            [day["date"] for day in trip_days],
+            sorted(day["date"] for day in trip_days),
+        )
+        for day in trip_days:
+            positions = [event["position"] for event in day["events"]]
+            self.assertEqual(
+                positions,
+                [POSITION_GAP * i for i in range(1, events_per_day + 1)],
+            )
+            self.assertTrue(all(event["place_details"] for event in day["events"]))
+
+
+class TripSnapshotTests(TripTestCase):
+    """Writes to anything the trip detail shows drop the trip's snapshot."""
+
+    def setUp(self):
+        super().setUp()
+        self.trip = generate_trip(self.user, 2, 3)
+        self.url = f"/api/trips/{self.trip.id}/"
+        self.client.get(self.url)
+        self.assertTrue(TripSnapshot.objects.filter(trip=self.trip).exists())
+
+    def get_events(self):
+        data = self.client.get(self.url).json()["data"]
+        return [event for day in data["trip_days"] for event in day["events"]]
+
+    def test_trip_update(self):
+        self.client.patch(
+            self.url,
+            {"name": "Renamed", "start_date": "2030-01-01", "end_date": "2030-01-03"},
+        )
+        data = self.client.get(self.url).json()["data"]
+        self.assertEqual(data["name"], "Renamed")
+        self.assertEqual(len(data["trip_days"]), 3)
+
+    def test_event_update(self):
+        event = Event.objects.filter(trip_day__trip=self.trip).first()
+        event.notes = "Book tickets"
+        event.save()
+        notes = {e["id"]: e["notes"] for e in self.get_events()}
+        self.assertEqual(notes[str(event.id)], "Book tickets")
+
+    def test_event_reorder(self):
+        trip_day = self.trip.trip_days.order_by("date").first()
+        event_ids = [
+            str(event_id)
+            for event_id in trip_day.events.order_by("-position").values_list(
+                "id", flat=True
+            )
+        ]
+        self.client.post(
+            f"/api/trips/{self.trip.id}/events/reorder/",
+            {"trip_day_id": str(trip_day.id), "event_ids": event_ids},
+            format="json",
+        )
+        day_events = [e for e in self.get_events() if e["trip_day"] == str(trip_day.id)]
+        self.assertEqual([e["id"] for e in day_events], event_ids)
+
+    def test_place_update(self):
+        place = Place.objects.get(event__trip_day__trip=self.trip, name="Stop 0")
+        place.name = "Louvre"
+        place.save()
+        names = {e["place_details"]["name"] for e in self.get_events()}
+        self.assertIn("Louvre", names)
+
+    def test_place_delete(self):
+        Place.objects.get(event__trip_day__trip=self.trip, name="Stop 0").delete()
+        self.assertIn(None, [e["place_details"] for e in self.get_events()])
+
+
+class PublicTripCachingTests(TripTestCase):
+    def setUp(self):
+        super().setUp()
+        # The shared trip is read anonymously
+        self.client.force_authenticate(None)
+        self.trip = generate_trip(self.user, 2, 3)
+        self.trip.is_public = True
+        self.trip.save(update_fields=["is_public"])
+        self.url = f"/api/trips/shared/{self.trip.public_token}/"
+
+    def test_conditional_requests(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("max-age", response["Cache-Control"])
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(
+                self.url, HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], response["ETag"])
+
+        not_modified = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_etag_changes_with_the_trip(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.trip.name = "Renamed"
+        self.trip.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_unknown_token_is_cached(self):
+        url = f"/api/trips/shared/{uuid.uuid4()}/"
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("max-age", response["Cache-Control"])
+
+    def test_malformed_token(self):
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/trips/shared/not-a-token/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_revoked_token(self):
+        self.client.get(self.url)
+        self.trip.is_public = False
+        self.trip.public_token = None
+        self.trip.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class SparseFieldsetTests(TripTestCase):
+    """?fields= and ?expand= shape the trip detail and what gets loaded for it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.trip = generate_trip(cls.user, 3, 4)
+        cls.url = f"/api/trips/{cls.trip.id}/"
+
+    def test_fields(self):
+        with self.assertNumQueries(1):
+            data = self.client.get(self.url, {"fields": "name,end_date"}).json()
+        self.assertEqual(set(data["data"]), {"name", "end_date"})
+
+        with self.assertNumQueries(3):
+            data = self.client.get(
+                self.url,
+                {"fields": "trip_days.date,trip_days.events.place_details.name"},
+            ).json()["data"]
+        self.assertEqual(set(data), {"trip_days"})
+        self.assertEqual(len(data["trip_days"]), 3)
+        for day in data["trip_days"]:
+            self.assertEqual(set(day), {"date", "events"})
+            self.assertEqual(len(day["events"]), 4)
+            for event in day["events"]:
+                self.assertEqual(
+                    event, {"place_details": {"name": event["place_details"]["name"]}}
+                )
+
+    def test_expand(self):
+        with self.assertNumQueries(2):
+            data = self.client.get(self.url, {"expand": "trip_days"}).json()["data"]
+        self.assertIn("name", data)
+        self.assertEqual(len(data["trip_days"]), 3)
+        self.assertTrue(all("events" not in day for day in data["trip_days"]))
+
+        data = self.client.get(self.url, {"expand": ""}).json()["data"]
+        self.assertNotIn("trip_days", data)
+
+    def test_event_list(self):
+        url = f"/api/trips/{self.trip.id}/events/"
+        response = self.client.get(url, {"fields": "id,notes"})
+        self.assertEqual(response.status_code, 200)
+        events = response.json()["data"]
+        self.assertEqual(len(events), 12)
+        self.assertTrue(all(set(event) == {"id", "notes"} for event in events))
+
+        events = self.client.get(url).json()["data"]
+        self.assertTrue(all(event["place_details"] for event in events))
+
+    def test_public_trip(self):
+        self.client.force_authenticate(None)
+        self.trip.is_public = True
+        self.trip.save(update_fields=["is_public"])
+        url = f"/api/trips/shared/{self.trip.public_token}/"
+
+        full = self.client.get(url)
+        shaped = self.client.get(url, {"fields": "name"})
+        self.assertEqual(shaped.json()["data"], {"name": self.trip.name})
+        self.assertNotEqual(shaped["ETag"], full["ETag"])
+
+        not_modified = self.client.get(
+            url, {"fields": "name"}, HTTP_IF_NONE_MATCH=shaped["ETag"]
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+
+class TripChangesTests(TripTestCase):
+    """The changes feed returns what was written or deleted after the cursor."""
+
+    def setUp(self):
+        super().setUp()
+        self.trip = generate_trip(self.user, 3, 2)
+        self.url = f"/api/trips/{self.trip.id}/changes/"
+        self.since = timezone.now()
+
+    def get_changes(self, since=None):
+        response = self.client.get(self.url, {"since": since or self.since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["data"]
+
+    def test_nothing_changed(self):
+        changes = self.get_changes()
+        self.assertIsNone(changes["trip"])
+        for resource in ["trip_days", "events", "lodgings", "saved_places"]:
+            self.assertEqual(changes[resource], [])
+            self.assertEqual(changes["deleted"][resource], [])
+        self.assertTrue(changes["cursor"])
+
+    def test_updated_and_deleted_events(self):
+        updated, deleted = Event.objects.filter(trip_day__trip=self.trip)[:2]
+        self.client.patch(
+            f"/api/trips/{self.trip.id}/events/{updated.id}/", {"notes": "Tickets"}
+        )
+        self.client.delete(f"/api/trips/{self.trip.id}/events/{deleted.id}/")
+
+        changes = self.get_changes()
+        changed = {event["id"]: event for event in changes["events"]}
+        self.assertEqual(changed[str(updated.id)]["notes"], "Tickets")
+        self.assertNotIn(str(deleted.id), changed)
+        self.assertEqual(changes["deleted"]["events"], [str(deleted.id)])
+
+    def test_reorder(self):
+        trip_day = self.trip.trip_days.order_by("date").first()
+        event_ids = list(
+            trip_day.events.order_by("-position").values_list("id", flat=True)
+        )
+        self.client.post(
+            f"/api/trips/{self.trip.id}/events/reorder/",
+            {"trip_day_id": str(trip_day.id), "event_ids": [str(i) for i in event_ids]},
+            format="json",
+        )
+        # Swapping two events moves only one of them
+        changed = [event["id"] for event in self.get_changes()["events"]]
+        self.assertEqual(changed, [str(event_ids[0])])
+
+    def test_shortened_trip(self):
+        last_day = self.trip.trip_days.order_by("date").last()
+        self.client.patch(
+            f"/api/trips/{self.trip.id}/",
+            {
+                "name": self.trip.name,
+                "start_date": self.trip.start_date,
+                "end_date": last_day.date - timedelta(days=1),
+            },
+        )
+        changes = self.get_changes()
+        self.assertEqual(changes["trip"]["id"], str(self.trip.id))
+        self.assertEqual(changes["deleted"]["trip_days"], [str(last_day.id)])
+        # Implied by the day
+        self.assertEqual(changes["deleted"]["events"], [])
+
+    def test_invalid_cursors(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        too_old = self.since - timedelta(days=365)
+        self.assertEqual(self.client.get(self.url, {"since": too_old}).status_code, 410)
+
+
+class TripDayDetailTests(TripTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.trip = generate_trip(cls.user, 5, 6)
+        cls.trip_day = cls.trip.trip_days.order_by("date")[2]
+
+    def test_retrieve(self):
+        # Membership, the day with its lodging, its events with their places
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                f"/api/trips/{self.trip.id}/days/{self.trip_day.id}/"
+            )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual(data["date"], str(self.trip_day.date))
+        self.assertEqual(
+            [event["position"] for event in data["events"]],
+            [POSITION_GAP * i for i in range(1, 7)],
+        )
+        self.assertTrue(all(event["place_details"] for event in data["events"]))
+        lodging = data["lodging"]
+        self.assertLessEqual(lodging["arrival_date"], data["date"])
+        self.assertGreaterEqual(lodging["departure_date"], data["date"])
+
+    def test_event_list_by_day(self):
+        url = f"/api/trips/{self.trip.id}/events/"
+        events = self.client.get(url, {"trip_day": self.trip_day.id}).json()["data"]
+        self.assertEqual(len(events), 6)
+        self.assertTrue(
+            all(event["trip_day"] == str(self.trip_day.id) for event in events)
+        )
+        self.assertEqual(self.client.get(url, {"trip_day": "nope"}).status_code, 400)
+
+    def test_event_list_by_day_in_position_order(self):
+        # Created in reverse itinerary order, so newest first would be position order
+        events = list(self.trip_day.events.order_by("position"))
+        for offset, event in enumerate(reversed(events)):
+            event.created_at = timezone.now() - timedelta(minutes=offset)
+        Event.objects.bulk_update(events, ["created_at"])
+
+        url = f"/api/trips/{self.trip.id}/events/"
+        body = self.client.get(url, {"trip_day": self.trip_day.id, "page_size": 4})
+        body = body.json()
+        positions = [event["position"] for event in body["data"]]
+        body = self.client.get(body["meta"]["next"]).json()
+        positions += [event["position"] for event in body["data"]]
+        self.assertEqual(positions, [POSITION_GAP * i for i in range(1, 7)])
+        self.assertIsNone(body["meta"]["next"])
+
+
+class LodgingCoverageTests(TripTestCase):
+    def setUp(self):
+        super().setUp()
+        # Comes with a lodging covering every day
+        self.trip = generate_trip(self.user, 5, 1)
+        self.days = list(self.trip.trip_days.order_by("date"))
+        self.place = Place.objects.create(
+            external_id="coverage:hotel",
+            name="Hotel",
+            latitude="48.8566",
+            longitude="2.3522",
+        )
+
+    def coverage(self):
+        return [
+            trip_day.lodging_id for trip_day in self.trip.trip_days.order_by("date")
+        ]
+
+    def test_follows_lodging_writes(self):
+        stay = Lodging.objects.get(trip=self.trip)
+        self.assertEqual(self.coverage(), [stay.id] * 5)
+
+        # Replaces the overlapping stay
+        response = self.client.post(
+            f"/api/trips/{self.trip.id}/lodgings/",
+            {
+                "arrival_date": self.days[1].date,
+                "departure_date": self.days[2].date,
+                "place": {
+                    "external_id": "coverage:hotel",
+                    "name": "Hotel",
+                    "latitude": "48.8566",
+                    "longitude": "2.3522",
+                },
+            },
+            format="json",
+        )
+        hotel = response.json()["data"]["id"]
+        self.assertEqual(
+            [str(lodging_id) for lodging_id in self.coverage()],
+            ["None", hotel, hotel, "None", "None"],
+        )
+
+        self.client.patch(
+            f"/api/trips/{self.trip.id}/lodgings/{hotel}/",
+            {"departure_date": self.days[4].date},
+        )
+        self.assertEqual(self.coverage()[1:], [uuid.UUID(hotel)] * 4)
+
+        # The first to arrive wins, the next one takes over once it is gone
+        first = Lodging.objects.create(
+            trip=self.trip,
+            place=self.place,
+            arrival_date=self.days[0].date,
+            departure_date=self.days[2].date,
+        )
+        self.assertEqual(self.coverage(), [first.id] * 3 + [uuid.UUID(hotel)] * 2)
+        first.delete()
+        self.assertEqual(self.coverage(), [None] + [uuid.UUID(hotel)] * 4)
+
+    def test_whole_trip_lookup(self):
+        stay = Lodging.objects.get(trip=self.trip)
+        # The trip's days with their lodgings, then their events
+        with self.assertNumQueries(2):
+            results = optimize_trip(self.trip, engine="local")
+        self.assertEqual(len(results), 5)
+
+        clone = self.client.post(f"/api/trips/{self.trip.id}/clone/").json()["data"]
+        clone_days = Trip.objects.get(id=clone["id"]).trip_days.all()
+        clone_lodging = Lodging.objects.get(trip_id=clone["id"])
+        self.assertNotEqual(clone_lodging.id, stay.id)
+        self.assertEqual(
+            {trip_day.lodging_id for trip_day in clone_days}, {clone_lodging.id}
+        )
+
+
+class EventPositionTests(TripTestCase):
+    """Adding, moving and deleting an event writes that event only."""
+
+    def setUp(self):
+        super().setUp()
+        self.trip = generate_trip(self.user, 1, 6)
+        self.trip_day = self.trip.trip_days.get()
+        self.url = f"/api/trips/{self.trip.id}/events/"
+
+    def positions(self):
+        return dict(self.trip_day.events.values_list("id", "position"))
+
+    def reorder(self, event_ids):
+        response = self.client.post(
+            f"{self.url}reorder/",
+            {"trip_day_id": self.trip_day.id, "event_ids": event_ids},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        ordered = list(
+            self.trip_day.events.order_by("position").values_list("id", flat=True)
+        )
+        self.assertEqual(ordered, event_ids)
+
+    def test_move(self):
+        event_ids = list(
+            self.trip_day.events.order_by("position").values_list("id", flat=True)
+        )
+        before = self.positions()
+        event_ids.insert(1, event_ids.pop())
+        self.reorder(event_ids)
+
+        after = self.positions()
+        moved = [event_id for event_id in after if after[event_id] != before[event_id]]
+        self.assertEqual(moved, [event_ids[1]])
+
+    def test_rebalance(self):
+        # Keep moving the last event to second place until the gap runs out
+        event_ids = list(
+            self.trip_day.events.order_by("position").values_list("id", flat=True)
+        )
+        for _ in range(15):
+            event_ids.insert(1, event_ids.pop())
+            self.reorder(event_ids)
+        self.assertEqual(len(set(self.positions().values())), 6)
+
+    def test_create_and_delete(self):
+        before = self.positions()
+        first = min(before, key=before.get)
+        self.client.delete(f"{self.url}{first}/")
+        del before[first]
+        self.assertEqual(self.positions(), before)
+
+        response = self.client.post(
+            self.url,
+            {
+                "trip_day_pk": self.trip_day.id,
+                "place": {
+                    "external_id": "positions:new",
+                    "name": "New stop",
+                    "latitude": "48.8566",
+                    "longitude": "2.3522",
+                },
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        event = response.json()["data"]
+        self.assertEqual(event["position"], max(before.values()) + POSITION_GAP)
+        self.assertEqual(
+            self.positions(), {**before, uuid.UUID(event["id"]): event["position"]}
+        )
+
+
+class EventBatchTests(TripTestCase):
+    def setUp(self):
+        super().setUp()
+        self.trip = generate_trip(self.user, 2, 3)
+        self.first_day, self.second_day = self.trip.trip_days.order_by("date")
+        self.url = f"/api/trips/{self.trip.id}/events/batch/"
+
+    def day_order(self, trip_day):
+        return list(trip_day.events.order_by("position").values_list("id", flat=True))
+
+    def create_op(self, name, trip_day, **kwargs):
+        return {
+            "op": "create",
+            "trip_day_pk": str(trip_day.id),
+            "place": {
+                "external_id": f"batch:{name}",
+                "name": name,
+                "latitude": "48.8566",
+                "longitude": "2.3522",
+            },
+            **kwargs,
+        }
+
+    def post(self, operations):
+        return self.client.post(self.url, {"operations": operations}, format="json")
+
+    def test_operations(self):
+        first = self.day_order(self.first_day)
+        second = self.day_order(self.second_day)
+        response = self.post(
+            [
+                self.create_op("Breakfast", self.first_day, index=0, type="MEAL"),
+                {"op": "update", "id": str(first[0]), "notes": "Early"},
+                {
+                    "op": "move",
+                    "id": str(first[1]),
+                    "trip_day_pk": str(self.second_day.id),
+                    "index": 1,
+                },
+                {"op": "delete", "id": str(second[2])},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual(data["deleted"], [str(second[2])])
+        created = next(e for e in data["events"] if e["type"] == "MEAL")
+
+        self.assertEqual(
+            self.day_order(self.first_day),
+            [uuid.UUID(created["id"]), first[0], first[2]],
+        )
+        self.assertEqual(
+            self.day_order(self.second_day), [second[0], first[1], second[1]]
+        )
+        self.assertEqual(Event.objects.get(id=first[0]).notes, "Early")
+
+    def count_queries(self, operations):
+        # Every run starts cold, e.g. each one purges the expired tombstones
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.post(operations).status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow(self):
+        def create_many(count, offset):
+            return self.count_queries(
+                [
+                    self.create_op(f"Stop {offset + i}", self.first_day)
+                    for i in range(count)
+                ]
+            )
+
+        self.assertEqual(create_many(2, 0), create_many(40, 100))
+        self.assertEqual(self.first_day.events.count(), 3 + 2 + 40)
+
+        def run(op, events, **kwargs):
+            return self.count_queries(
+                [{"op": op, "id": str(event_id), **kwargs} for event_id in events]
+            )
+
+        events = self.day_order(self.first_day)
+        for op, kwargs in [
+            ("update", {"notes": "Later"}),
+            ("move", {"trip_day_pk": str(self.second_day.id)}),
+            ("delete", {}),
+        ]:
+            with self.subTest(op=op):
+                self.assertEqual(
+                    run(op, events[:2], **kwargs), run(op, events[2:40], **kwargs)
+                )
+                if op == "move":
+                    events = self.day_order(self.second_day)
+        self.assertEqual(TripTombstone.objects.filter(trip_id=self.trip.id).count(), 40)
+
+    def test_invalid_operations(self):
+        other = generate_trip(self.user, 1, 1).trip_days.get()
+        event_id = str(self.first_day.events.first().id)
+        for operations in [
+            [{"op": "delete", "id": str(uuid.uuid4())}],
+            [{"op": "move", "id": event_id, "trip_day_pk": str(other.id)}],
+            [{"op": "move", "id": event_id}],
+            [{"op": "delete", "id": event_id}, {"op": "update", "id": event_id}],
+        ]:
+            with self.subTest(operations=operations):
+                self.assertEqual(self.post(operations).status_code, 400)
+        self.assertEqual(Event.objects.filter(trip_day__trip=self.trip).count(), 6)
+
+
+class TripDateShiftTests(TripTestCase):
+    def move(self, trip, start_offset, end_offset, date_change="shift"):
+        return self.client.put(
+            f"/api/trips/{trip.id}/",
+            {
+                "name": trip.name,
+                "start_date": trip.start_date + timedelta(days=start_offset),
+                "end_date": trip.end_date + timedelta(days=end_offset),
+                "date_change": date_change,
+            },
+        )
+
+    def itinerary(self, trip):
+        return {
+            day.date: sorted(day.events.values_list("id", flat=True))
+            for day in trip.trip_days.all()
+        }
+
+    def test_shift(self):
+        trip = generate_trip(self.user, 5, 3)
+        for offset in [7, 1, -3]:
+            with self.subTest(offset=offset):
+                trip.refresh_from_db()
+                before = self.itinerary(trip)
+                lodging = trip.lodgings.get()
+                self.assertEqual(self.move(trip, offset, offset).status_code, 200)
+
+                shifted = {
+                    date + timedelta(days=offset): events
+                    for date, events in before.items()
+                }
+                self.assertEqual(self.itinerary(trip), shifted)
+                moved = trip.lodgings.get()
+                self.assertEqual(
+                    moved.arrival_date, lodging.arrival_date + timedelta(days=offset)
+                )
+
+    def test_shift_and_shorten(self):
+        trip = generate_trip(self.user, 5, 3, with_lodging=False)
+        before = self.itinerary(trip)
+        self.assertEqual(self.move(trip, 2, 0).status_code, 200)
+        after = self.itinerary(trip)
+        self.assertEqual(len(after), 3)
+        for date, events in after.items():
+            self.assertEqual(events, before[date - timedelta(days=2)])
+
+    def test_query_count_does_not_grow(self):
+        counts = []
+        for days in [3, 30]:
+            trip = generate_trip(self.user, days, 4)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.move(trip, 10, 10).status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_resize(self):
+        trip = generate_trip(self.user, 3, 2)
+        first_day = trip.trip_days.order_by("date").first()
+        self.assertEqual(self.move(trip, 1, 1, date_change="resize").status_code, 200)
+        self.assertFalse(trip.trip_days.filter(id=first_day.id).exists())
+
+
+class TripCloneTests(TripTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.owner = create_user("owner")
+
+    def clone(self, trip, **data):
+        UserTrip.objects.get_or_create(user=self.user, trip=trip)
+        response = self.client.post(f"/api/trips/{trip.id}/clone/", data)
+        self.assertEqual(response.status_code, 201)
+        return Trip.objects.get(id=response.json()["data"]["id"])
+
+    def itinerary(self, trip):
+        return [
+            (day.date, [(e.place_id, e.position, e.type) for e in day.events.all()])
+            for day in trip.trip_days.order_by("date").prefetch_related(
+                Prefetch("events", Event.objects.order_by("position"))
+            )
+        ]
+
+    def test_clone(self):
+        trip = generate_trip(self.owner, 3, 4)
+        trip.saved_places.create(place=Place.objects.first(), saved_by=self.owner)
+        clone = self.clone(
+            trip, name="Again", start_date=trip.start_date + timedelta(days=30)
+        )
+
+        self.assertEqual(clone.name, "Again")
+        self.assertEqual(clone.user, self.user)
+        self.assertEqual(
+            list(clone.user_trips.values_list("user", flat=True)), [self.user.id]
+        )
+        self.assertFalse(clone.is_public)
+        shifted = [
+            (date + timedelta(days=30), events) for date, events in self.itinerary(trip)
+        ]
+        self.assertEqual(self.itinerary(clone), shifted)
+        lodging, cloned_lodging = trip.lodgings.get(), clone.lodgings.get()
+        self.assertEqual(
+            cloned_lodging.departure_date, lodging.departure_date + timedelta(days=30)
+        )
+        self.assertEqual(clone.saved_places.get().saved_by, self.user)
+        # The original is untouched
+        self.assertEqual(trip.trip_days.count(), 3)
+
+    def test_query_count_does_not_grow(self):
+        counts = []
+        for days in [2, 20]:
+            trip = generate_trip(self.owner, days, 5)
+            UserTrip.objects.create(user=self.user, trip=trip)
+            with CaptureQueriesContext(connection) as queries:
+                self.clone(trip)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_not_a_member(self):
+        trip = generate_trip(self.owner, 1, 1)
+        response = self.client.post(f"/api/trips/{trip.id}/clone/", {})
+        self.assertEqual(response.status_code, 404)
+
+
+class RecordingBroker:
+    """Broker stand-in keeping what was published."""
+
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, channel, message):
+        self.messages.append((channel, message))
+
+
+@override_settings(PUBSUB_BROKER="apps.itineraries.tests.RecordingBroker")
+class TripChangePublishingTests(TripTestCase):
+    def setUp(self):
+        super().setUp()
+        self.trip = generate_trip(self.user, 2, 3)
+        self.broker = get_broker()
+        self.broker.messages.clear()
+
+    def published(self):
+        return [
+            message["type"]
+            for channel, message in self.broker.messages
+            if channel == trip_channel(self.trip.id)
+        ]
+
+    def test_after_commit(self):
+        event = Event.objects.filter(trip_day__trip=self.trip).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                f"/api/trips/{self.trip.id}/events/{event.id}/", {"notes": "Hi"}
+            )
+            self.assertEqual(self.published(), [])
+        self.assertEqual(self.published(), ["event.updated"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/trips/{self.trip.id}/events/{event.id}/")
+        _, message = self.broker.messages[-1]
+        self.assertEqual(message["type"], "event.deleted")
+        self.assertEqual(message["id"], event.id)
+
+    def test_batch(self):
+        event = Event.objects.filter(trip_day__trip=self.trip).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                f"/api/trips/{self.trip.id}/events/batch/",
+                {"operations": [{"op": "delete", "id": str(event.id)}]},
+                format="json",
+            )
+        self.assertEqual(self.published(), ["events.changed"])
+
+    def test_rolled_back(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/api/trips/{self.trip.id}/events/batch/",
+                {"operations": [{"op": "delete", "id": str(uuid.uuid4())}]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.published(), [])
+
+
+class TripStreamTests(TripTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.outsider = create_user("outsider")
+        cls.trip = generate_trip(cls.user, 1, 1)
+        cls.url = f"/api/trips/{cls.trip.id}/live/"
+
+    def headers(self, user):
+        return {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+
+    async def test_stream(self):
+        response = await self.async_client.get(
+            self.url, headers=self.headers(self.user)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b": connected\n\n")
+
+        event_id = uuid.uuid4()
+        get_broker().publish(
+            trip_channel(self.trip.id), {"type": "event.deleted", "id": event_id}
+        )
+        chunk = await asyncio.wait_for(anext(stream), 1)
+        self.assertEqual(
+            chunk,
+            f'event: event.deleted\ndata: {{"type": "event.deleted", "id": "{event_id}"}}\n\n'.encode(),
+        )
+
+        # A client going away cancels the task waiting on the stream
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(get_broker().subscriber_count(trip_channel(self.trip.id)), 0)
+
+    async def test_members_only(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(
+            self.url, headers=self.headers(self.outsider)
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_not_served_under_wsgi(self):
+        response = self.client.get(self.url, headers=self.headers(self.user))
+        self.assertEqual(response.status_code, 501)
+        self.assertIn(f"/api/trips/{self.trip.id}/changes/", response.json()["message"])
+
+    def test_event_writes_read_only_the_trip_id(self):
+        day_table = TripDay._meta.db_table
+
+        def day_queries(event, write):
+            with CaptureQueriesContext(connection) as queries:
+                write(event)
+            return [
+                query["sql"]
+                for query in queries.captured_queries
+                if query["sql"].startswith("SELECT")
+                and f'FROM "{day_table}"' in query["sql"]
+            ]
+
+        # The day is loaded already: nothing to look up
+        event = Event.objects.select_related("trip_day").get(trip_day__trip=self.trip)
+        self.assertEqual(day_queries(event, Event.save), [])
+
+        # Otherwise one trip_id lookup, shared by the delete receivers
+        event = Event.objects.get(id=event.id)
+        queries = day_queries(event, Event.delete)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(
+            queries[0].startswith(f'SELECT "{day_table}"."trip_id" AS "trip_id" FROM')
+        )
+
+
+class RouteJobLifecycleTests(APITransactionTestCase):
+    """Jobs run on the real worker pool, so their rows have to be committed."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user("jobs")
+        self.client.force_authenticate(self.user)
+        self.trip = generate_trip(self.user, 1, 4)
+        self.trip_day = self.trip.trip_days.get()
+
+    def submit(self):
+        response = self.client.post(
+            f"/api/trips/{self.trip.id}/events/optimize-route/",
+            {"trip_day_id": self.trip_day.id, "engine": "local", "run_async": True},
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["data"]["status"], "PENDING")
+        return response.json()["data"]["id"]
+
+    def wait(self, job_id):
+        url = f"/api/trips/{self.trip.id}/events/optimize-route/jobs/{job_id}/"
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            job = self.client.get(url).json()["data"]
+            if job["status"] in [JobStatus.SUCCEEDED, JobStatus.FAILED]:
+                return job
+            time.sleep(0.05)
+        self.fail(f"Job {job_id} did not finish")
+
+    def test_succeeded(self):
+        job = self.wait(self.submit())
+        self.assertEqual(job["status"], JobStatus.SUCCEEDED)
+        self.assertEqual(len(job["result"]["events"]), 4)
+        self.assertIsNotNone(job["started_at"])
+        self.assertGreater(job["expires_at"], job["finished_at"])
+
+    def test_failed(self):
+        with (
+            mock.patch.object(
+                RouteOptimizer, "optimize_events", side_effect=RuntimeError("No route")
+            ),
+            self.assertLogs("apps.itineraries.services.route_jobs", "ERROR"),
+        ):
+            job = self.wait(self.submit())
+        self.assertEqual(job["status"], JobStatus.FAILED)
+        self.assertEqual(job["error"], "No route")
+        self.assertIsNone(job["result"])
+
+
+class RouteJobRecoveryTests(TripTestCase):
+    def setUp(self):
+        super().setUp()
+        self.trip = generate_trip(self.user, 1, 1)
+        self.trip_day = self.trip.trip_days.get()
+        self.long_ago = timezone.now() - timedelta(hours=1)
+
+    def create_job(self, **fields):
+        job = RouteOptimizationJob.objects.create(
+            trip=self.trip, trip_day=self.trip_day, requested_by=self.user
+        )
+        # created_at is auto_now_add
+        RouteOptimizationJob.objects.filter(id=job.id).update(**fields)
+        return job
+
+    def test_orphaned_jobs(self):
+        pending = self.create_job(created_at=self.long_ago)
+        fresh = self.create_job()
+        running = self.create_job(status=JobStatus.RUNNING, started_at=self.long_ago)
+        busy = self.create_job(status=JobStatus.RUNNING, started_at=timezone.now())
+
+        with mock.patch("apps.itineraries.services.route_jobs.enqueue") as enqueue:
+            requeue_orphaned_jobs()
+        enqueue.assert_called_once_with(pending.id)
+
+        statuses = dict(RouteOptimizationJob.objects.values_list("id", "status"))
+        self.assertEqual(statuses[fresh.id], JobStatus.PENDING)
+        self.assertEqual(statuses[running.id], JobStatus.FAILED)
+        self.assertEqual(statuses[busy.id], JobStatus.RUNNING)
+        self.assertIsNotNone(RouteOptimizationJob.objects.get(id=running.id).expires_at)
+
+    def test_polling_a_lost_job(self):
+        job = self.create_job(status=JobStatus.RUNNING, started_at=self.long_ago)
+        response = self.client.get(
+            f"/api/trips/{self.trip.id}/events/optimize-route/jobs/{job.id}/"
+        )
+        self.assertEqual(response.json()["data"]["status"], JobStatus.FAILED)
+
+    def test_purge_expired(self):
+        expired = self.create_job(status=JobStatus.SUCCEEDED, expires_at=self.long_ago)
+        kept = self.create_job(
+            status=JobStatus.SUCCEEDED,
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        purge_expired_jobs()
+        self.assertFalse(RouteOptimizationJob.objects.filter(id=expired.id).exists())
+        self.assertTrue(RouteOptimizationJob.objects.filter(id=kept.id).exists())
+
+
+class RouteSolverTests(SimpleTestCase):
+    def random_matrix(self, rng, size, symmetric=False):
+        matrix = rng.uniform(1, 100, (size, size))
+        if symmetric:
+            matrix = (matrix + matrix.T) / 2
+        np.fill_diagonal(matrix, 0)
+        return matrix
+
+    def best_cost(self, matrix):
+        """Brute force over every order of the jobs, node 0 fixed first."""
+        return min(
+            path_cost(matrix.tolist(), [0, *order])
+            for order in itertools.permutations(range(1, len(matrix)))
+        )
+
+    def test_held_karp_is_exact(self):
+        rng = np.random.default_rng(7)
+        for size in range(3, 9):
+            for symmetric in [True, False]:
+                with self.subTest(jobs=size - 1, symmetric=symmetric):
+                    matrix = self.random_matrix(rng, size, symmetric)
+                    order = held_karp_path(matrix)
+                    self.assertEqual(sorted(order), list(range(1, size)))
+                    self.assertAlmostEqual(
+                        path_cost(matrix.tolist(), [0, *order]),
+                        self.best_cost(matrix),
+                    )
+
+    def test_local_search(self):
+        rng = np.random.default_rng(11)
+        for size in [6, 8, 20]:
+            with self.subTest(jobs=size - 1):
+                matrix = self.random_matrix(rng, size).tolist()
+                start = nearest_neighbour_path(matrix)
+                route = improve_path(matrix, start)
+                # Start stays put, every job is visited once
+                self.assertEqual(route[0], 0)
+                self.assertEqual(sorted(route), list(range(size)))
+                self.assertLessEqual(path_cost(matrix, route), path_cost(matrix, start))
+                if size <= 8:
+                    # Not exact, but close on small instances
+                    best = self.best_cost(np.array(matrix))
+                    self.assertLessEqual(path_cost(matrix, route), best * 1.2)
+
+    def test_open_path_from_a_fixed_start(self):
+        # Jobs on a line, the start at one end: visit them in line order and
+        # don't come back
+        payload = {
+            "agents": [{"start_location": [2.30, 48.85]}],
+            "jobs": [
+                {"id": f"job-{i}", "location": [2.30 + 0.01 * i, 48.85]}
+                for i in [3, 1, 4, 2]
+            ],
+        }
+        response = LocalRouteSolver().solve(payload)
+        properties = response["features"][0]["properties"]
+        actions = properties["actions"]
+        self.assertEqual(actions[0]["type"], "start")
+        self.assertEqual(actions[-1]["type"], "end")
+        self.assertEqual(
+            [action["job_id"] for action in actions if action["type"] == "job"],
+            ["job-1", "job-2", "job-3", "job-4"],
+        )
+        # Legs are rounded one by one
+        legs = properties["legs"]
+        self.assertAlmostEqual(
+            properties["distance"],
+            sum(leg["distance"] for leg in legs),
+            delta=len(legs),
+        )
+
+
+class RouteAnchorTests(TripTestCase):
+    def setUp(self):
+        super().setUp()
+        self.trip = generate_trip(self.user, 1, 5)
+        self.trip_day = self.trip.trip_days.get()
+        self.events = list(
+            self.trip_day.events.select_related("place").order_by("position")
+        )
+        self.optimizer = RouteOptimizer(self.trip_day, engine="local")
+
+    def test_lodging_is_the_start(self):
+        lodging = self.optimizer.get_lodging()
+        agent, jobs = self.optimizer._determine_agent_and_jobs(self.events, lodging)
+        self.assertEqual(agent, lodging)
+        self.assertEqual(len(jobs), 5)
+        payload = self.optimizer._build_payload(agent, jobs)
+        self.assertEqual(
+            payload["agents"][0]["start_location"],
+            [float(lodging.place.longitude), float(lodging.place.latitude)],
+        )
+
+        result = self.optimizer.optimize_events(self.events, lodging)
+        self.assertEqual(
+            sorted(e.id for e in result["events"]), sorted(e.id for e in self.events)
+        )
+
+    def test_first_event_is_the_start_without_lodging(self):
+        result = self.optimizer.optimize_events(self.events, None)
+        self.assertEqual(result["events"][0], self.events[0])
+        self.assertEqual(len(result["events"]), 5)
+
+
+class BalancedKMeansTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        # Two well separated neighbourhoods, 10 km apart
+        self.west = rng.normal((0, 0), 0.5, (6, 2))
+        self.east = rng.normal((10, 0), 0.5, (6, 2))
+        self.points = np.vstack([self.west, self.east])
+
+    def test_balanced(self):
+        points = np.random.default_rng(5).uniform(0, 20, (23, 2))
+        labels = balanced_kmeans(points, 5, [None] * 5)
+        sizes = np.bincount(labels, minlength=5)
+        self.assertEqual(sizes.sum(), 23)
+        self.assertLessEqual(sizes.max(), math.ceil(23 / 5))
+
+    def test_sizes_are_within_one(self):
+        rng = np.random.default_rng(11)
+        for seed in range(20):
+            with self.subTest(seed=seed):
+                n, k = rng.integers(5, 40), rng.integers(2, 6)
+                # Tight neighbourhoods of uneven sizes tempt the nearest day
+                centres = rng.uniform(0, 30, (k, 2))
+                points = centres[rng.integers(0, k, n) ** 2 % k] + rng.normal(
+                    0, 0.3, (n, 2)
+                )
+                sizes = np.bincount(balanced_kmeans(points, k, [None] * k), minlength=k)
+                self.assertEqual(sizes.sum(), n)
+                self.assertGreaterEqual(sizes.min(), n // k)
+                self.assertLessEqual(sizes.max(), math.ceil(n / k))
+
+    def test_far_place_does_not_leave_a_day_short(self):
+        # 3 x 3 places around three hotels and one far away: the greedy fill
+        # alone gives 3, 3, 3, 1
+        rng = np.random.default_rng(2)
+        hotels = np.array([[0.0, 0.0], [10.0, 0.0], [0.0, 10.0], [40.0, 40.0]])
+        points = np.vstack(
+            [hotels[i] + rng.normal(0, 0.2, (3, 2)) for i in range(3)] + [hotels[3]]
+        )
+        labels = balanced_kmeans(points, 4, list(hotels))
+        self.assertEqual(sorted(np.bincount(labels, minlength=4)), [2, 2, 3, 3])
+
+    def test_deterministic(self):
+        first = balanced_kmeans(self.points, 3, [None] * 3)
+        self.assertTrue(
+            np.array_equal(first, balanced_kmeans(self.points, 3, [None] * 3))
+        )
+
+    def test_anchored(self):
+        # The first day sleeps east, so it gets the eastern places
+        labels = balanced_kmeans(self.points, 2, [np.array([10.0, 0.0]), None])
+        self.assertEqual(list(labels), [1] * 6 + [0] * 6)
+        labels = balanced_kmeans(self.points, 2, [None, np.array([10.0, 0.0])])
+        self.assertEqual(list(labels), [0] * 6 + [1] * 6)
+
+
+class AutoPlanTests(TripTestCase):
+    def plan(self, days, places):
+        trip = generate_trip(self.user, days, 0, with_lodging=False)
+        saved = Place.objects.bulk_create(
+            Place(
+                external_id=f"plan:{trip.id}:{i}",
+                name=f"Sight {i}",
+                latitude=48.80 + (i % 7) * 0.01,
+                longitude=2.30 + (i // 7) * 0.01,
+            )
+            for i in range(places)
+        )
+        trip.saved_places.bulk_create(
+            TripSavedPlace(trip=trip, place=place, saved_by=self.user)
+            for place in saved
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f"/api/trips/{trip.id}/auto-plan/")
+        self.assertEqual(response.status_code, 201)
+        return trip, response.json()["data"], len(queries)
+
+    def test_plan(self):
+        trip, events, _ = self.plan(3, 9)
+        self.assertEqual(len(events), 9)
+        per_day = {}
+        for event in events:
+            per_day.setdefault(event["trip_day"], []).append(event["position"])
+        self.assertEqual(len(per_day), 3)
+        for positions in per_day.values():
+            self.assertEqual(positions, [POSITION_GAP * i for i in range(1, 4)])
+        self.assertEqual(Event.objects.filter(trip_day__trip=trip).count(), 9)
+
+    def test_bulk_insert(self):
+        _, _, few = self.plan(2, 4)
+        _, _, many = self.plan(6, 36)
+        self.assertEqual(few, many)
+
+
+class RouteGeometryTests(SimpleTestCase):
+    def test_polyline_round_trip(self):
+        points = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453], [-0.00001, 0.0]]
+        polyline = encode_polyline(points)
+        # The reference example of the polyline format
+        self.assertTrue(polyline.startswith("_p~iF~ps|U_ulLnnqC_mqNvxq`@"))
+        np.testing.assert_allclose(decode_polyline(polyline), points, atol=1e-5)
+
+        rng = np.random.default_rng(0)
+        points = np.round(rng.uniform((-90, -180), (90, 180), (50, 2)), 5)
+        np.testing.assert_allclose(
+            decode_polyline(encode_polyline(points)), points, atol=1e-5
+        )
+
+    def test_simplify_keeps_endpoints(self):
+        # A straight street with a small wiggle and one real detour, [lng, lat]
+        coordinates = [
+            [2.30 + i * 0.001, 48.85 + 0.000001 * (i % 2)] for i in range(20)
+        ]
+        coordinates[10][1] += 0.01
+
+        points = simplify(coordinates, 5)
+        self.assertEqual(points.tolist()[0], coordinates[0][::-1])
+        self.assertEqual(points.tolist()[-1], coordinates[-1][::-1])
+        # Only the detour survives between the endpoints
+        self.assertEqual(
+            points.tolist(),
+            [coordinates[i][::-1] for i in (0, 9, 10, 11, 19)],
+        )
+
+    def test_flatten_multi_line_string(self):
+        geometry = {
+            "type": "MultiLineString",
+            "coordinates": [[[0, 0], [1, 1]], [[1, 1], [2, 2]]],
+        }
+        self.assertEqual(flatten_geometry(geometry), [[0, 0], [1, 1], [2, 2]])
+        self.assertEqual(
+            simplify(flatten_geometry(geometry), 5).tolist(), [[0, 0], [2, 2]]
+        )
+
+
+class TripPaginationTests(TripTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        today = timezone.localdate()
+        trips = Trip.objects.bulk_create(
+            Trip(name=f"Trip {i}", start_date=today, end_date=today, user=cls.user)
+            for i in range(7)
+        )
+        UserTrip.objects.bulk_create(UserTrip(user=cls.user, trip=t) for t in trips)
+        # Ties on created_at are broken by id
+        Trip.objects.filter(id__in=[t.id for t in trips[2:5]]).update(
+            created_at=trips[2].created_at
+        )
+
+    def pages(self, url):
+        ids = []
+        while url:
+            body = self.client.get(url).json()
+            ids.append([trip["id"] for trip in body["data"]])
+            url = body["meta"]["next"]
+        return ids
+
+    def test_cursor_is_stable(self):
+        expected = [
+            str(trip_id)
+            for trip_id in Trip.objects.order_by("-created_at", "-id").values_list(
+                "id", flat=True
+            )
+        ]
+        first = self.client.get("/api/trips/?page_size=3").json()
+        # Trips created while paging land before the cursor and do not shift it
+        today = timezone.localdate()
+        trip = Trip.objects.create(
+            name="New", start_date=today, end_date=today, user=self.user
+        )
+        UserTrip.objects.create(user=self.user, trip=trip)
+
+        pages = [[t["id"] for t in first["data"]]] + self.pages(first["meta"]["next"])
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(list(itertools.chain.from_iterable(pages)), expected)
+
+    @mock.patch.object(KeysetPagination, "page_size", 4)
+    @mock.patch.object(KeysetPagination, "max_page_size", 5)
+    def test_page_size_is_clamped(self):
+        self.assertEqual([len(page) for page in self.pages("/api/trips/")], [4, 3])
+        self.assertEqual(len(self.pages("/api/trips/?page_size=1000")[0]), 5)
+        # Invalid sizes fall back to the default
+        self.assertEqual(len(self.pages("/api/trips/?page_size=0")[0]), 4)
+        self.assertEqual(len(self.pages("/api/trips/?page_size=abc")[0]), 4)
+
+    def test_count(self):
+        body = self.client.get("/api/trips/?page_size=2").json()
+        self.assertIsNone(body["meta"]["count"])
+        body = self.client.get("/api/trips/?page_size=2&count=true").json()
+        self.assertEqual(body["meta"]["count"], 7)
+
+
+class RouteCacheTests(TripTestCase):
+    def setUp(self):
+        super().setUp()
+        caches[settings.ROUTE_CACHE_ALIAS].clear()
+        self.trip = generate_trip(self.user, 1, 4)
+        self.trip_day = self.trip.trip_days.get()
+        self.optimizer = RouteOptimizer(self.trip_day, engine="local")
+
+    def payload(self):
+        events = list(self.trip_day.events.select_related("place").order_by("position"))
+        lodging = self.optimizer.get_lodging()
+        agent, jobs = self.optimizer._determine_agent_and_jobs(events, lodging)
+        return self.optimizer._build_payload(agent, jobs)
+
+    def key(self, payload=None):
+        return route_cache.make_key(
+            self.trip_day.id, "local", payload or self.payload()
+        )
+
+    def test_unchanged_stops_are_served_from_cache(self):
+        url = f"/api/trips/{self.trip.id}/events/optimize-route/"
+        data = {"trip_day_id": self.trip_day.id, "engine": "local"}
+        with (
+            mock.patch.object(
+                LocalRouteSolver,
+                "solve",
+                autospec=True,
+                side_effect=LocalRouteSolver.solve,
+            ) as solve,
+            mock.patch(
+                "apps.itineraries.services.route_optimizer.get_http_client"
+            ) as http_client,
+        ):
+            first = self.client.post(url, data)
+            second = self.client.post(url, data)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.json()["data"], first.json()["data"])
+        self.assertEqual(solve.call_count, 1)
+        http_client.assert_not_called()
+
+    def test_job_order_does_not_change_the_key(self):
+        payload = self.payload()
+        reordered = {**payload, "jobs": list(reversed(payload["jobs"]))}
+        self.assertEqual(self.key(reordered), self.key(payload))
+
+        moved = {**payload, "jobs": [dict(payload["jobs"][0], location=[0, 0])]}
+        self.assertNotEqual(self.key(moved), self.key(payload))
+
+    def test_writes_invalidate_the_day(self):
+        event = self.trip_day.events.first()
+        lodging = self.trip.lodgings.get()
+        for instance in [event, lodging]:
+            with self.subTest(model=type(instance).__name__):
+                key = self.key()
+                route_cache.store(key, {"features": []})
+                self.assertEqual(route_cache.get(self.key()), {"features": []})
+
+                instance.save()
+                self.assertNotEqual(self.key(), key)
+                self.assertIsNone(route_cache.get(self.key()))
+
+
+class TripOptimizationTests(TripTestCase):
+    def test_day_statuses(self):
+        trip = generate_trip(self.user, 3, 4, with_lodging=False)
+        optimized, skipped, failed = trip.trip_days.order_by("date")
+        # Two events and no lodging leave nothing to reorder
+        Event.objects.filter(
+            id__in=list(skipped.events.values_list("id", flat=True)[:2])
+        ).delete()
+        failing = {str(pk) for pk in failed.events.values_list("id", flat=True)}
+        local_solve = LocalRouteSolver.solve
+
+        def solve(solver, payload, distances, durations):
+            if failing & {job["id"] for job in payload["jobs"]}:
+                raise ValueError("No route")
+            return local_solve(solver, payload, distances, durations)
+
+        with (
+            mock.patch.object(
+                LocalRouteSolver, "solve", autospec=True, side_effect=solve
+            ),
+            self.assertLogs("apps.itineraries.services.route_optimizer", "WARNING"),
+        ):
+            response = self.client.post(
+                f"/api/trips/{trip.id}/optimize-routes/", {"engine": "local"}
+            )
+        self.assertEqual(response.status_code, 200)
+        days = response.json()["data"]["days"]
+        self.assertEqual(
+            [(day["trip_day_id"], day["status"]) for day in days],
+            [
+                (str(optimized.id), "optimized"),
+                (str(skipped.id), "skipped"),
+                (str(failed.id), "failed"),
+            ],
+        )
+        self.assertEqual(len(days[0]["events"]), 4)
+        self.assertGreater(days[0]["stats"]["total_distance_km"], 0)
+        self.assertEqual(len(days[1]["events"]), 2)
+        self.assertIsNone(days[1]["stats"])
+        self.assertIsNone(days[2]["stats"])
+        self.assertEqual(
+            [event["id"] for event in days[2]["events"]],
+            [
+                str(pk)
+                for pk in failed.events.order_by("position").values_list(
+                    "id", flat=True
+                )
+            ],
+        )
+        # Only the optimized day keeps a route
+        self.assertEqual(
+            list(
+                TripDayRoute.objects.filter(trip_day__trip=trip).values_list(
+                    "trip_day", flat=True
+                )
+            ),
+            [optimized.id],
+        )
+
+
+class MultiModeRouteTests(TripTestCase):
+    def setUp(self):
+        super().setUp()
+        caches[settings.ROUTE_CACHE_ALIAS].clear()
+        self.trip = generate_trip(self.user, 1, 4)
+        self.trip_day = self.trip.trip_days.get()
+        self.url = f"/api/trips/{self.trip.id}/events/optimize-route/"
+
+    def post(self, modes, **data):
+        return self.client.post(
+            self.url,
+            {
+                "trip_day_id": self.trip_day.id,
+                "engine": "local",
+                "modes": modes,
+                **data,
+            },
+            format="json",
+        )
+
+    def test_modes(self):
+        response = self.post(["walk", "drive", "walk"])
+        self.assertEqual(response.status_code, 200)
+        routes = response.json()["data"]["routes"]
+        # Repeated modes are solved once, in the requested order
+        self.assertEqual([route["mode"] for route in routes], ["walk", "drive"])
+        for route in routes:
+            self.assertEqual(route["status"], "optimized")
+            self.assertEqual(len(route["events"]), 4)
+            self.assertEqual(
+                set(route["stats"]), {"total_distance_km", "total_time_hours"}
+            )
+        walk, drive = (route["stats"] for route in routes)
+        self.assertGreater(walk["total_time_hours"], drive["total_time_hours"])
+        self.assertEqual(TripDayRoute.objects.get(trip_day=self.trip_day).mode, "walk")
+
+    def test_first_optimized_mode_keeps_geometry(self):
+        local_solve = LocalRouteSolver.solve
+
+        def solve(solver, *args):
+            if solver.mode == "walk":
+                raise ValueError("No footpath")
+            return local_solve(solver, *args)
+
+        with (
+            mock.patch.object(
+                LocalRouteSolver, "solve", autospec=True, side_effect=solve
+            ),
+            self.assertLogs("apps.itineraries.services.route_optimizer", "WARNING"),
+        ):
+            response = self.post(["walk", "drive"])
+        walk, drive = response.json()["data"]["routes"]
+        self.assertEqual((walk["status"], walk["stats"]), ("failed", None))
+        self.assertEqual(drive["status"], "optimized")
+        self.assertEqual(TripDayRoute.objects.get(trip_day=self.trip_day).mode, "drive")
+
+    def test_run_async_takes_a_single_mode(self):
+        response = self.post(["walk", "drive"], run_async=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("modes", response.json()["errors"])
+        self.assertFalse(RouteOptimizationJob.objects.exists())
+
+
+class TripDayRouteTests(TripTestCase):
+    def setUp(self):
+        super().setUp()
+        caches[settings.ROUTE_CACHE_ALIAS].clear()
+        self.trip = generate_trip(self.user, 1, 4)
+        self.trip_day = self.trip.trip_days.get()
+        self.url = f"/api/trips/{self.trip.id}/days/{self.trip_day.id}/route/"
+        response = self.client.post(
+            f"/api/trips/{self.trip.id}/events/optimize-route/",
+            {"trip_day_id": self.trip_day.id, "engine": "local"},
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_route(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        route = TripDayRoute.objects.get(trip_day=self.trip_day)
+        self.assertEqual(response["ETag"], f'"{route.checksum}"')
+        data = response.json()["data"]
+        self.assertEqual(data["mode"], "drive")
+        self.assertEqual(len(decode_polyline(data["polyline"])), data["point_count"])
+
+        response = self.client.get(
+            self.url, headers={"If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        response = self.client.get(self.url, headers={"If-None-Match": '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_event_write_discards_the_route(self):
+        event = self.trip_day.events.first()
+        response = self.client.patch(
+            f"/api/trips/{self.trip.id}/events/{event.id}/", {"notes": "Moved"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
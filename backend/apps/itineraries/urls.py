@@ -1,3 +1,5 @@
+from django.urls import path
+
 from . import views
 from rest_framework_nested import routers
 
@@ -14,5 +16,11 @@ trips_router.register(r"events", views.TripEventViewset, basename="trip-events")
 
 trips_router.register(r"lodgings", views.TripLodgingViewset, basename="trip-lodgings")
 
+trips_router.register(r"days", views.TripDayViewset, basename="trip-days")
+
 
-urlpatterns = router.urls + trips_router.urls
+urlpatterns = (
+    router.urls
+    + trips_router.urls
+    + [path("trips/<uuid:trip_pk>/live/", views.trip_stream, name="trip-live")]
+)
@@ -4,8 +4,10 @@ from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework import status
-from .models import Event, Lodging
+from rest_framework.exceptions import NotFound, ValidationError
+from .models import Event, Lodging, RouteOptimizationJob, TripDayRoute
 from .models import Trip, UserTrip, TripDay, TripSavedPlace
+from .constants import JobStatus, TripDateChange
 from .permissions import IsTripMember
 from .serializers import (
     EventReorderSerializer,
@@ -17,12 +19,58 @@ from .serializers import (
     LodgingSerializer,
     UpdateLodgingSerializer,
     RouteOptimizationSerializer,
+    ModeRouteSerializer,
+    OptimizedRouteSerializer,
+    RouteOptimizationJobSerializer,
+    TripDayRouteSerializer,
+    TripRouteOptimizationSerializer,
+    AutoPlanSerializer,
     ShareTripSerializer,
     DateSuggestionRequestSerializer,
+    TripChangesQuerySerializer,
+    TripDayDetailSerializer,
+    CloneTripSerializer,
+    EventBatchSerializer,
+    EventBatchResultSerializer,
+    TripChangesSerializer,
 )
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from apps.core.conditional import conditional_response
+from apps.core.pagination import KeysetPagination
+from apps.core.serializers import has_dynamic_fields, model_field_names
+from apps.core.renderer import PreRenderedJSON
 from datetime import timedelta
-from .services.route_optimizer import RouteOptimizer
+import asyncio
+import hashlib
+import json
+import uuid
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from apps.core.pubsub import get_broker
+from .services.route_optimizer import RouteOptimizer, optimize_modes, optimize_trip
+from .services.route_jobs import job_timeout, requeue_orphaned_jobs, submit_job
+from .services.event_positions import reorder_events
+from .services.event_batch import apply_event_operations
+from .services.trip_snapshot import (
+    get_or_build_trip_snapshot,
+    invalidate_trip_snapshots,
+)
+from .services.public_trip import find_public_trip
+from .services.trip_changes import collect_trip_changes, is_cursor_expired
+from .services.trip_dates import shift_trip_dates
+from .services.trip_clone import clone_trip
+from .services.lodging_coverage import refresh_lodging_coverage
+from .services.trip_stream import event_summary, publish_trip_change, trip_channel
+from .services.day_planner import plan_trip_days
 from .services.llm.event_date_suggestor.service import EventDateSuggestor
 # from .services import RouteService
 
@@ -31,16 +79,48 @@ class TripViewset(viewsets.ModelViewSet):
     queryset = Trip.objects.all()
     serializer_class = TripSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.action in ["retrieve", "get_public_trip"]:
             return TripDetailSerializer
         elif self.action in ["toggle_share"]:
             return ShareTripSerializer
+        elif self.action in ["optimize_routes"]:
+            return TripRouteOptimizationSerializer
+        elif self.action in ["auto_plan"]:
+            return AutoPlanSerializer
+        elif self.action in ["changes"]:
+            return TripChangesSerializer
+        elif self.action in ["clone"]:
+            return CloneTripSerializer
         return TripSerializer
 
     def get_queryset(self):
-        return Trip.objects.filter(user_trips__user=self.request.user)
+        queryset = Trip.objects.filter(user_trips__user=self.request.user)
+        if self.action == "retrieve":
+            queryset = queryset.select_related("snapshot")
+        return queryset
+
+    def retrieve(self, request, *args, **kwargs):
+        trip = self.get_object()
+        if has_dynamic_fields(request):
+            return self._shaped_trip_response(trip)
+
+        snapshot = get_or_build_trip_snapshot(trip)
+        return Response(PreRenderedJSON(snapshot.content))
+
+    def _shaped_trip_response(self, trip: Trip) -> Response:
+        """
+        Trip detail narrowed by ?fields/?expand. Those are not snapshotted, so
+        the trip is serialized on the spot, loading only what is left to show.
+        """
+        serializer = self.get_serializer()
+        prefetch = serializer.get_itinerary_prefetch()
+        if prefetch is not None:
+            prefetch_related_objects([trip], prefetch)
+        serializer.instance = trip
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     def perform_create(self, serializer):
         with transaction.atomic():
@@ -52,9 +132,16 @@ class TripViewset(viewsets.ModelViewSet):
             self._sync_trip_days(trip)
 
     def perform_update(self, serializer):
+        previous_start_date = serializer.instance.start_date
+        date_change = serializer.validated_data.get(
+            "date_change", TripDateChange.RESIZE
+        )
         with transaction.atomic():
             # Save Trip Record
             trip = serializer.save()
+            if date_change == TripDateChange.SHIFT:
+                # Days keep their events, only the ones past the new end go
+                shift_trip_dates(trip, (trip.start_date - previous_start_date).days)
             # Sync TripDay Records
             self._sync_trip_days(trip)
 
@@ -77,6 +164,9 @@ class TripViewset(viewsets.ModelViewSet):
 
         if missing_dates:
             TripDay.objects.bulk_create(missing_dates)
+            # bulk_create sends no post_save for the new days
+            invalidate_trip_snapshots(trip.id)
+            refresh_lodging_coverage(trip.id)
 
     @action(
         detail=True,
@@ -91,6 +181,84 @@ class TripViewset(viewsets.ModelViewSet):
         serializer.save()
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="optimize-routes",
+        serializer_class=TripRouteOptimizationSerializer,
+    )
+    def optimize_routes(self, request, pk=None):
+        trip = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = optimize_trip(trip, engine=serializer.validated_data.get("engine"))
+
+        return Response(
+            {
+                "days": [
+                    {
+                        "trip_day_id": result["trip_day"].id,
+                        "date": result["trip_day"].date,
+                        "status": result["status"],
+                        **OptimizedRouteSerializer(result).data,
+                    }
+                    for result in results
+                ]
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="auto-plan",
+        serializer_class=AutoPlanSerializer,
+    )
+    def auto_plan(self, request, pk=None):
+        trip = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        events = plan_trip_days(
+            trip, include_scheduled=serializer.validated_data["include_scheduled"]
+        )
+
+        return Response(
+            EventSerializer(events, many=True).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=True, methods=["post"], url_path="clone")
+    def clone(self, request, pk=None):
+        """Copy the trip and its itinerary into a new trip of the user's."""
+        trip = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        clone = clone_trip(trip, request.user, **serializer.validated_data)
+        return Response(TripSerializer(clone).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["get"], url_path="changes")
+    def changes(self, request, pk=None):
+        """
+        What changed in the trip since ?since=, to update a loaded trip without
+        fetching it again. Start from the time the trip was loaded, then pass
+        each response's cursor. The same row may come back twice.
+        """
+        trip = self.get_object()
+        query = TripChangesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        since = query.validated_data["since"]
+        if is_cursor_expired(since):
+            return Response(
+                {"detail": "This cursor is too old, reload the trip."},
+                status=status.HTTP_410_GONE,
+            )
+
+        changes = collect_trip_changes(trip, since)
+        return Response(self.get_serializer(changes).data, status=status.HTTP_200_OK)
+
     @action(
         detail=False,
         methods=["get"],
@@ -99,11 +267,35 @@ class TripViewset(viewsets.ModelViewSet):
         permission_classes=[],
     )
     def get_public_trip(self, request, token=None):
-        print(f"token {token}")
-        trip = get_object_or_404(Trip, public_token=token, is_public=True)
-        print(f"trip {trip} | is_public {trip.is_public}")
-        serializer = self.get_serializer(trip)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        trip = find_public_trip(token)
+        if trip is None:
+            response = Response(
+                {"detail": NotFound.default_detail}, status=status.HTTP_404_NOT_FOUND
+            )
+            patch_cache_control(
+                response, public=True, max_age=settings.PUBLIC_TRIP_MISSING_TTL
+            )
+            return response
+
+        snapshot = get_or_build_trip_snapshot(trip)
+        if has_dynamic_fields(request):
+            # Same trip state, different shape: derive the ETag from both
+            shape = hashlib.sha256(request.META["QUERY_STRING"].encode()).hexdigest()
+            etag = f"{snapshot.checksum}-{shape[:16]}"
+            build = lambda: self._shaped_trip_response(trip)
+        else:
+            etag = snapshot.checksum
+            build = lambda: Response(
+                PreRenderedJSON(snapshot.content), status=status.HTTP_200_OK
+            )
+
+        response = conditional_response(
+            request, etag=etag, last_modified=snapshot.updated_at, build=build
+        )
+        # Anonymous and identical for everyone, so shared caches may keep it too
+        patch_cache_control(response, public=True, max_age=settings.PUBLIC_TRIP_MAX_AGE)
+        patch_vary_headers(response, ["Accept"])
+        return response
 
 
 class TripSavedPlaceViewset(
@@ -115,6 +307,7 @@ class TripSavedPlaceViewset(
 ):
     queryset = TripSavedPlace.objects.all()
     permission_classes = [permissions.IsAuthenticated, IsTripMember]
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.action == "destroy":
@@ -136,31 +329,40 @@ class TripEventViewset(viewsets.ModelViewSet):
     queryset = Event.objects.all()
     serializer_class = EventSerializer
     permission_classes = [permissions.IsAuthenticated, IsTripMember]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return super().get_queryset().filter(trip_day__trip=self.kwargs["trip_pk"])
+        queryset = super().get_queryset().filter(trip_day__trip=self.kwargs["trip_pk"])
+        trip_day = self.request.query_params.get("trip_day")
+        if trip_day and self.action == "list":
+            try:
+                queryset = queryset.filter(trip_day_id=uuid.UUID(trip_day))
+            except ValueError:
+                raise ValidationError({"trip_day": "Must be a valid UUID."})
+        if self.action in ["list", "retrieve"]:
+            # Load only what the (possibly ?fields/?expand narrowed) output needs
+            serializer = self.get_serializer()
+            if "place_details" in serializer.fields:
+                queryset = queryset.select_related("place")
+            queryset = queryset.only(
+                *model_field_names(
+                    serializer, Event, ["trip_day", "created_at", "position"]
+                )
+            )
+        return queryset
+
+    def get_pagination_ordering(self):
+        # A single day's events are listed in itinerary order, paged on
+        # event_position_idx, while the whole trip's list stays newest first
+        if self.action == "list" and self.request.query_params.get("trip_day"):
+            return ("position", "id")
+        return None
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["trip_pk"] = self.kwargs["trip_pk"]
         return context
 
-    def perform_create(self, serializer):
-        with transaction.atomic():
-            instance = serializer.save()
-            instance.trip_day.normalize_position()
-
-    def perform_update(self, serializer):
-        with transaction.atomic():
-            instance = serializer.save()
-            instance.trip_day.normalize_position()
-
-    def perform_destroy(self, instance):
-        with transaction.atomic():
-            trip_day = instance.trip_day
-            instance.delete()
-            trip_day.normalize_position()
-
     @action(
         detail=False,
         methods=["post"],
@@ -173,26 +375,40 @@ class TripEventViewset(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         event_ids = serializer.validated_data["event_ids"]
         trip_day = serializer.validated_data["trip_day_id"]
-        # Batch Update
         with transaction.atomic():
-            events_to_update = []
-            events = Event.objects.filter(
-                id__in=event_ids,
-                trip_day_id=trip_day,
+            events = reorder_events(trip_day, event_ids)
+            # bulk_update sends no post_save
+            invalidate_trip_snapshots(trip_pk)
+            publish_trip_change(
+                trip_pk,
+                "events.changed",
+                events=[event_summary(event) for event in events],
+                deleted=[],
             )
-            event_map = {str(e.id): e for e in events}
 
-            for index, event_id in enumerate(event_ids):
-                position = index + 1
-                event = event_map.get(str(event_id))
-                if event:
-                    event.position = position
-                    events_to_update.append(event)
+        return Response(
+            EventSerializer(events, many=True).data,
+            status=status.HTTP_200_OK,
+        )
 
-            Event.objects.bulk_update(events_to_update, ["position"])
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="batch",
+        serializer_class=EventBatchSerializer,
+        permission_classes=[permissions.IsAuthenticated, IsTripMember],
+    )
+    def batch(self, request, trip_pk=None):
+        """Create, update, delete and move many events in one transaction."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        trip = get_object_or_404(Trip, pk=trip_pk)
 
+        events, deleted = apply_event_operations(
+            trip, serializer.validated_data["operations"]
+        )
         return Response(
-            EventSerializer(events_to_update, many=True).data,
+            EventBatchResultSerializer({"events": events, "deleted": deleted}).data,
             status=status.HTTP_200_OK,
         )
 
@@ -207,89 +423,67 @@ class TripEventViewset(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         trip_day = serializer.validated_data["trip_day_id"]
+        engine = serializer.validated_data.get("engine")
+        modes = serializer.validated_data.get("modes")
+
+        if serializer.validated_data["run_async"]:
+            job = submit_job(
+                trip_day,
+                request.user,
+                mode=modes[0] if modes else "drive",
+                engine=engine,
+            )
+            return Response(
+                RouteOptimizationJobSerializer(job).data,
+                status=status.HTTP_202_ACCEPTED,
+            )
 
-        all_events = list(trip_day.events.all())
-        event_map = {str(e.id): e for e in all_events}
-
-        optimizer = RouteOptimizer(trip_day)
-        agent, res = optimizer.optimize_route()
+        optimizer = RouteOptimizer(trip_day, engine=engine)
+        events = list(trip_day.events.select_related("place").order_by("position"))
+        lodging = optimizer.get_lodging()
 
-        if not agent or not res:
+        if modes:
+            results = optimize_modes(trip_day, events, lodging, modes, engine=engine)
             return Response(
-                {"error": "Failed to generate route from API."},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                {"routes": ModeRouteSerializer(results, many=True).data},
+                status=status.HTTP_200_OK,
             )
 
-        parsed_res = self._parse_route_service_response(agent, res)
-        if not parsed_res:
+        result = optimizer.optimize_events(events, lodging)
+
+        if not result:
             return Response(
                 {"error": "Failed to optimize route"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        optimized_ids = parsed_res["ordered_ids"]
-        final_event_list = []
-
-        for e_id in optimized_ids:
-            event = event_map.get(e_id)
-            if event:
-                final_event_list.append(event)
-
-        optimized_set = set(optimized_ids)
-        missing_events = [e for e in all_events if str(e.id) not in optimized_set]
-
-        if missing_events:
-            final_event_list.extend(missing_events)
-            parsed_res["warning"] = (
-                f"Could not route to {len(missing_events)} location(s). They were moved to the end."
-            )
-
+        optimizer.save_geometry(result)
         return Response(
-            {
-                "events": EventSerializer(final_event_list, many=True).data,
-                "stats": {
-                    "total_distance_km": parsed_res["total_distance_km"],
-                    "total_time_hours": parsed_res["total_time_hours"],
-                },
-                "warning": parsed_res.get("warning"),
-            },
+            OptimizedRouteSerializer(result).data,
             status=status.HTTP_200_OK,
         )
 
-    def _parse_route_service_response(self, agent: any, data: dict):
-        ordered_ids = []
-        if isinstance(agent, Event):
-            ordered_ids.append(str(agent.id))
-
-        try:
-            features = data.get("features", [])
-            feature = features[0] if features else None
-            if not feature:
-                print("No features found in route service response")
-                return None
-
-            props = feature.get("properties", {})
-            # TODO: consider implementing route geometry later
-            # route_geometry = feature.get("geometry", {})
-
-            total_distance_km = props.get("distance", 0) / 1000
-            total_time_hours = props.get("time", 0) / 3600
-
-            for action in props.get("actions", []):
-                if action["type"] == "job":
-                    # extract job_id (same as event_id provided in the request)
-                    event_id = action["job_id"]
-                    ordered_ids.append(event_id)
-
-            return {
-                "total_distance_km": total_distance_km,
-                "total_time_hours": total_time_hours,
-                "ordered_ids": ordered_ids,
-                # "route_geometry": route_geometry,
-            }
-        except Exception as e:
-            print(f"Error parsing route service response: {e}")
-            return None
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="optimize-route/jobs/(?P<job_id>[0-9a-f-]{36})",
+        serializer_class=RouteOptimizationJobSerializer,
+        permission_classes=[permissions.IsAuthenticated, IsTripMember],
+    )
+    def optimize_route_job(self, request, job_id=None, trip_pk=None):
+        job = get_object_or_404(
+            RouteOptimizationJob.objects.exclude(expires_at__lt=timezone.now()),
+            pk=job_id,
+            trip=trip_pk,
+        )
+        if (
+            job.status == JobStatus.RUNNING
+            and job.started_at < timezone.now() - job_timeout()
+        ):
+            # Its worker is gone, don't keep the client polling
+            requeue_orphaned_jobs()
+            job.refresh_from_db()
+        return Response(self.get_serializer(job).data, status=status.HTTP_200_OK)
 
     @action(
         detail=False,
@@ -319,6 +513,7 @@ class TripLodgingViewset(viewsets.ModelViewSet):
     queryset = Lodging.objects.all()
     serializer_class = LodgingSerializer
     permission_classes = [permissions.IsAuthenticated, IsTripMember]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return super().get_queryset().filter(trip=self.kwargs["trip_pk"])
@@ -332,3 +527,119 @@ class TripLodgingViewset(viewsets.ModelViewSet):
         if self.action in ["update"]:
             return UpdateLodgingSerializer
         return LodgingSerializer
+
+
+class TripDayViewset(viewsets.GenericViewSet, mixins.RetrieveModelMixin):
+    queryset = TripDay.objects.all()
+    serializer_class = TripDayDetailSerializer
+    permission_classes = [permissions.IsAuthenticated, IsTripMember]
+
+    def get_queryset(self):
+        queryset = super().get_queryset().filter(trip=self.kwargs["trip_pk"])
+        if self.action != "retrieve":
+            return queryset
+        fields = self.get_serializer().fields
+        if "events" in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "events",
+                    queryset=Event.objects.select_related("place").order_by("position"),
+                )
+            )
+        if "lodging" in fields:
+            queryset = queryset.select_related("lodging__place")
+        return queryset
+
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path="route",
+        serializer_class=TripDayRouteSerializer,
+    )
+    def route(self, request, pk=None, trip_pk=None):
+        trip_day = self.get_object()
+        route = get_object_or_404(TripDayRoute, trip_day=trip_day)
+
+        return conditional_response(
+            request,
+            etag=route.checksum,
+            last_modified=route.updated_at,
+            build=lambda: Response(
+                self.get_serializer(route).data, status=status.HTTP_200_OK
+            ),
+        )
+
+
+def _authenticate(request):
+    """The user behind the request, through the API's authentication classes."""
+    authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    return Request(request, authenticators=authenticators).user
+
+
+def _error_response(detail, status_code):
+    # Same envelope as StandardResponseRenderer errors
+    return JsonResponse(
+        {"status": False, "message": str(detail), "errors": {"detail": detail}},
+        status=status_code,
+    )
+
+
+@require_GET
+async def trip_stream(request, trip_pk):
+    """
+    Server-sent events with the trip's changes as other members make them:
+    event.created/updated/deleted, events.changed (batches), lodging.changed/
+    deleted and trip.changed/deleted, each with the ids involved. A resync
+    event means messages were missed, reload the trip (or use the changes feed)
+    and reconnect.
+
+    Only served under ASGI (config.asgi): a WSGI worker would be held by every
+    open stream, so there the clients are sent to the changes feed instead.
+    """
+    if not isinstance(request, ASGIRequest):
+        return _error_response(
+            f"Live updates need the ASGI server, poll /api/trips/{trip_pk}/changes/ instead.",
+            status.HTTP_501_NOT_IMPLEMENTED,
+        )
+
+    try:
+        user = await sync_to_async(_authenticate)(request)
+    except APIException as exc:
+        return _error_response(exc.detail, exc.status_code)
+    if not user.is_authenticated:
+        return _error_response(
+            "Authentication credentials were not provided.",
+            status.HTTP_401_UNAUTHORIZED,
+        )
+    if not await UserTrip.objects.filter(trip_id=trip_pk, user=user).aexists():
+        return _error_response(
+            "You do not have permission to perform this action.",
+            status.HTTP_403_FORBIDDEN,
+        )
+
+    return StreamingHttpResponse(
+        _trip_events(trip_pk),
+        content_type="text/event-stream",
+        # Let each message through proxies as soon as it is written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _trip_events(trip_pk):
+    async with get_broker().subscribe(trip_channel(trip_pk)) as subscription:
+        yield ": connected\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    subscription.get(), settings.TRIP_STREAM_KEEPALIVE
+                )
+            except TimeoutError:
+                # Keeps idle connections from being closed along the way
+                yield ": ping\n\n"
+                continue
+
+            if message is None:
+                yield "event: resync\ndata: {}\n\n"
+                return
+            data = json.dumps(message, cls=DjangoJSONEncoder)
+            yield f"event: {message['type']}\ndata: {data}\n\n"
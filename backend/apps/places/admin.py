@@ -1,4 +1,5 @@
 from django.contrib import admin
-from apps.places.models import Place
+from apps.places.models import Place, PlaceDistance
 
 admin.site.register(Place)
+admin.site.register(PlaceDistance)
@@ -0,0 +1,54 @@
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_008.8
+
+# Average door-to-door speeds (km/h) used to turn distances into travel times.
+MODE_SPEEDS_KMH = {
+    "drive": 40.0,
+    "truck": 35.0,
+    "bus": 25.0,
+    "transit": 25.0,
+    "approximated_transit": 25.0,
+    "scooter": 25.0,
+    "motorcycle": 40.0,
+    "bicycle": 15.0,
+    "walk": 5.0,
+    "hike": 4.0,
+}
+DEFAULT_SPEED_KMH = 40.0
+
+# Straight-line distances underestimate the street network, so inflate them.
+MODE_DETOUR_FACTORS = {
+    "walk": 1.2,
+    "hike": 1.2,
+    "bicycle": 1.25,
+}
+DEFAULT_DETOUR_FACTOR = 1.3
+
+
+def haversine_matrix(coordinates) -> np.ndarray:
+    """
+    Pairwise great-circle distances (in meters) for a sequence of
+    ``(latitude, longitude)`` pairs, computed in one vectorized pass.
+    """
+    coords = np.radians(np.asarray(coordinates, dtype=float).reshape(-1, 2))
+    lat = coords[:, 0][:, np.newaxis]
+    lng = coords[:, 1][:, np.newaxis]
+
+    d_lat = lat.T - lat
+    d_lng = lng.T - lng
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat) * np.cos(lat.T) * np.sin(d_lng / 2) ** 2
+
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def estimate_travel_matrices(coordinates, mode: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Estimated street distances (meters) and travel times (seconds) between
+    ``(latitude, longitude)`` pairs for a travel mode, without any network call.
+    """
+    speed_mps = MODE_SPEEDS_KMH.get(mode, DEFAULT_SPEED_KMH) / 3.6
+    detour_factor = MODE_DETOUR_FACTORS.get(mode, DEFAULT_DETOUR_FACTOR)
+
+    distances = haversine_matrix(coordinates) * detour_factor
+    return distances, distances / speed_mps
@@ -0,0 +1,115 @@
+import json
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+from ...models import Place
+from ...services import get_or_create_places, place_cache
+
+PREFIX = "benchmark:places:"
+
+
+def workload(places: int, lookups: int, seed: int = 0) -> list[dict]:
+    """
+    ``lookups`` place payloads drawn from ``places`` distinct ones with a Zipf
+    like popularity, the way a few landmarks get added to most trips.
+    """
+    rng = random.Random(seed)
+    run = uuid.uuid4().hex[:8]
+    pool = [
+        {
+            "external_id": f"{PREFIX}{run}:{i}",
+            "name": f"Place {i}",
+            "address": f"{i} Benchmark Street",
+            "latitude": f"{48.8 + rng.random() / 10:.7f}",
+            "longitude": f"{2.3 + rng.random() / 10:.7f}",
+        }
+        for i in range(places)
+    ]
+    weights = [1 / (rank + 1) for rank in range(places)]
+    return rng.choices(pool, weights=weights, k=lookups)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-row Place.objects.get_or_create against the batched, "
+        "cached place resolution."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--places", type=int, default=500)
+        parser.add_argument("--lookups", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Also write the results as JSON here.")
+
+    def handle(self, *args, **options):
+        def get_or_create(payloads):
+            for data in payloads:
+                Place.objects.get_or_create(
+                    external_id=data["external_id"], defaults=data
+                )
+
+        def one_by_one(payloads):
+            for data in payloads:
+                get_or_create_places([data])
+
+        def one_by_one_uncached(payloads):
+            for data in payloads:
+                place_cache.clear()
+                get_or_create_places([data])
+
+        scenarios = {
+            "get_or_create": get_or_create,
+            "service_uncached": one_by_one_uncached,
+            "service_cached": one_by_one,
+            "service_batch": get_or_create_places,
+        }
+
+        results = {}
+        try:
+            for name, resolve in scenarios.items():
+                # A fresh set of places for each scenario: every one starts
+                # from an empty table and an empty cache
+                payloads = workload(
+                    options["places"], options["lookups"], options["seed"]
+                )
+                place_cache.clear()
+                # The query log is capped, start each scenario with an empty one
+                reset_queries()
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    resolve(payloads)
+                    elapsed = time.perf_counter() - start
+                results[name] = {
+                    "total_ms": round(elapsed * 1000, 3),
+                    "per_lookup_us": round(elapsed / len(payloads) * 1e6, 3),
+                    "queries": len(queries),
+                }
+        finally:
+            Place.objects.filter(external_id__startswith=PREFIX).delete()
+            place_cache.clear()
+
+        baseline = results["get_or_create"]["total_ms"]
+        for name, result in results.items():
+            result["speedup"] = round(baseline / result["total_ms"], 2)
+            self.stdout.write(
+                f"{name:<18} {result['total_ms']:>10.1f} ms "
+                f"{result['queries']:>7} queries   x{result['speedup']}"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as report_file:
+                json.dump(
+                    {
+                        "params": {
+                            key: options[key] for key in ["places", "lookups", "seed"]
+                        },
+                        "scenarios": results,
+                    },
+                    report_file,
+                    indent=2,
+                )
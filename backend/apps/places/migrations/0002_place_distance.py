@@ -0,0 +1,65 @@
+# Generated by Django 6.1.2 on 2026-10-17 23:40
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("places", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlaceDistance",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("mode", models.CharField(max_length=32)),
+                ("distance", models.FloatField()),
+                ("duration", models.FloatField()),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[("estimate", "Estimate"), ("geoapify", "Geoapify")],
+                        default="estimate",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "destination",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="distances_to",
+                        to="places.place",
+                    ),
+                ),
+                (
+                    "origin",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="distances_from",
+                        to="places.place",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("origin", "destination", "mode"),
+                        name="unique_place_distance_per_mode",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -12,3 +12,37 @@ class Place(BaseModel):
 
     def __str__(self):
         return self.name
+
+
+class DistanceSource(models.TextChoices):
+    ESTIMATE = "estimate", "Estimate"
+    GEOAPIFY = "geoapify", "Geoapify"
+
+
+class PlaceDistance(BaseModel):
+    """Cached travel relation between two places for one travel mode."""
+
+    origin = models.ForeignKey(
+        "Place", on_delete=models.CASCADE, related_name="distances_from"
+    )
+    destination = models.ForeignKey(
+        "Place", on_delete=models.CASCADE, related_name="distances_to"
+    )
+    mode = models.CharField(max_length=32)
+
+    distance = models.FloatField()  # meters
+    duration = models.FloatField()  # seconds
+    source = models.CharField(
+        max_length=20, choices=DistanceSource.choices, default=DistanceSource.ESTIMATE
+    )
+
+    def __str__(self):
+        return f"{self.origin_id} -> {self.destination_id} ({self.mode})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["origin", "destination", "mode"],
+                name="unique_place_distance_per_mode",
+            ),
+        ]
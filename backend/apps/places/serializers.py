@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Place
+from .services import get_or_create_place
 
 
 class PlaceSerializer(serializers.ModelSerializer):
@@ -28,13 +29,4 @@ class CreatePlaceSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         # Get or create place based on external_id
-        place, _ = Place.objects.get_or_create(
-            external_id=validated_data["external_id"],
-            defaults={
-                "name": validated_data["name"],
-                "address": validated_data["address"],
-                "latitude": validated_data["latitude"],
-                "longitude": validated_data["longitude"],
-            },
-        )
-        return place
+        return get_or_create_place(validated_data)
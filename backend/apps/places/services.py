@@ -0,0 +1,331 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from django.conf import settings
+from django.db import transaction
+
+from apps.core.exceptions import CircuitOpenError
+from apps.core.http_client import get_http_client
+from .geo import estimate_travel_matrices
+from .models import DistanceSource, Place, PlaceDistance
+
+logger = logging.getLogger(__name__)
+
+GEOAPIFY_MATRIX_URL = "{}/v1/routematrix?apiKey={}"
+
+
+class PlaceDistanceMatrix:
+    """Distances (meters) and durations (seconds) between a set of places."""
+
+    def __init__(self, place_ids: list, distances: np.ndarray, durations: np.ndarray):
+        self.index = {place_id: i for i, place_id in enumerate(place_ids)}
+        self.distances = distances
+        self.durations = durations
+
+    def submatrix(self, place_ids: list) -> tuple[np.ndarray, np.ndarray]:
+        """Matrices for ``place_ids`` in that order (repeats are allowed)."""
+        indices = [self.index[place_id] for place_id in place_ids]
+        grid = np.ix_(indices, indices)
+        return self.distances[grid], self.durations[grid]
+
+
+class PlaceCache:
+    """
+    Bounded, thread-safe LRU of stored places by external_id. Keeps the field
+    values rather than the instances, every hit gets a Place of its own.
+
+    Saves and deletes only discard entries in their own process, so entries
+    also expire after ``ttl`` seconds: a place another worker deleted or
+    recreated is looked up again after that, instead of being written as a
+    foreign key that no longer exists.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._fields = [field.attname for field in Place._meta.concrete_fields]
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, external_ids) -> dict[str, Place]:
+        now = time.monotonic()
+        with self._lock:
+            rows = {}
+            for external_id in external_ids:
+                entry = self._rows.get(external_id)
+                if entry is None:
+                    continue
+                expires_at, row = entry
+                if expires_at <= now:
+                    del self._rows[external_id]
+                    continue
+                self._rows.move_to_end(external_id)
+                rows[external_id] = row
+        return {
+            external_id: Place.from_db("default", self._fields, row)
+            for external_id, row in rows.items()
+        }
+
+    def set_many(self, places: dict[str, Place]):
+        expires_at = time.monotonic() + self.ttl
+        rows = {
+            external_id: (
+                expires_at,
+                tuple(getattr(place, name) for name in self._fields),
+            )
+            for external_id, place in places.items()
+        }
+        with self._lock:
+            self._rows.update(rows)
+            for external_id in rows:
+                self._rows.move_to_end(external_id)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+
+    def discard(self, external_id: str):
+        with self._lock:
+            self._rows.pop(external_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+place_cache = PlaceCache(settings.PLACE_CACHE_SIZE, settings.PLACE_CACHE_TTL)
+
+
+def get_or_create_places(place_data: list[dict]) -> dict[str, Place]:
+    """
+    Places for a batch of CreatePlaceSerializer payloads, by external_id. Like
+    get_or_create, places that already exist are left as they are.
+
+    Cached places cost no query, the others one SELECT, plus a single
+    INSERT .. ON CONFLICT DO NOTHING and a SELECT for those that are new.
+    """
+    payloads = {data["external_id"]: data for data in place_data}
+    places = place_cache.get_many(payloads)
+    missing = [external_id for external_id in payloads if external_id not in places]
+    if not missing:
+        return places
+
+    found = Place.objects.in_bulk(missing, field_name="external_id")
+    new = [external_id for external_id in missing if external_id not in found]
+    if new:
+        # Another request may be creating some of the same places meanwhile
+        Place.objects.bulk_create(
+            [Place(**payloads[external_id]) for external_id in new],
+            ignore_conflicts=True,
+        )
+        found.update(Place.objects.in_bulk(new, field_name="external_id"))
+
+    # Only cache rows that are there for everyone, not ones a rollback may undo
+    transaction.on_commit(lambda: place_cache.set_many(found))
+    places.update(found)
+    return places
+
+
+def get_or_create_place(place_data: dict) -> Place:
+    return get_or_create_places([place_data])[place_data["external_id"]]
+
+
+def get_distance_matrix(
+    place_groups: list[list[Place]], mode: str = "drive", source: str | None = None
+) -> PlaceDistanceMatrix:
+    """
+    Load the stored relations between the places of every group in one query,
+    and fill in the pairs that are still missing inside a group.
+
+    Missing pairs are computed group by group, either by the local estimator or
+    by one Geoapify route matrix call per incomplete group (made concurrently),
+    and persisted in one insert so later reads don't redo the work. Pairs
+    between places of different groups are never computed, they are only
+    returned if already stored.
+
+    When Geoapify is the source, estimated pairs count as missing and are
+    replaced once it answers. Estimates made because it did not answer are
+    only used for this call, never stored.
+    """
+    return get_distance_matrices(place_groups, [mode], source)[mode]
+
+
+def get_distance_matrices(
+    place_groups: list[list[Place]], modes: list[str], source: str | None = None
+) -> dict[str, PlaceDistanceMatrix]:
+    """
+    get_distance_matrix() for several travel modes at once, by mode: still one
+    read and one insert, and the Geoapify calls of every mode run together.
+    """
+    source = source or settings.PLACE_DISTANCE_SOURCE
+
+    places = list(
+        {place.id: place for group in place_groups for place in group}.values()
+    )
+    place_ids = [place.id for place in places]
+    index = {place_id: i for i, place_id in enumerate(place_ids)}
+
+    size = len(places)
+    matrices = {}
+    for mode in modes:
+        distances = np.full((size, size), np.nan)
+        durations = np.full((size, size), np.nan)
+        np.fill_diagonal(distances, 0.0)
+        np.fill_diagonal(durations, 0.0)
+        matrices[mode] = (distances, durations)
+
+    stored = PlaceDistance.objects.filter(
+        mode__in=modes, origin_id__in=place_ids, destination_id__in=place_ids
+    ).values_list(
+        "mode", "origin_id", "destination_id", "distance", "duration", "source"
+    )
+    for mode, origin_id, destination_id, distance, duration, stored_source in stored:
+        if source == DistanceSource.GEOAPIFY and stored_source != source:
+            continue
+        distances, durations = matrices[mode]
+        i, j = index[origin_id], index[destination_id]
+        distances[i, j] = distance
+        durations[i, j] = duration
+
+    pending = []
+    for mode, (distances, _) in matrices.items():
+        for group in place_groups:
+            indices = list(dict.fromkeys(index[place.id] for place in group))
+            missing = sorted(_incomplete_indices(indices, distances))
+            if missing:
+                pending.append((mode, missing))
+
+    new_rows = []
+    computed = _compute_matrices(places, pending, source)
+    for (mode, missing), (group_matrices, store) in zip(pending, computed):
+        new_rows += _fill_missing(
+            places, missing, group_matrices, store, *matrices[mode], mode, source
+        )
+    if source == DistanceSource.GEOAPIFY:
+        # Replaces the estimates stored for the same pairs
+        PlaceDistance.objects.bulk_create(
+            new_rows,
+            update_conflicts=True,
+            unique_fields=["origin", "destination", "mode"],
+            update_fields=["distance", "duration", "source", "updated_at"],
+        )
+    else:
+        # Another request may have stored some of the same pairs in the meantime
+        PlaceDistance.objects.bulk_create(new_rows, ignore_conflicts=True)
+
+    return {
+        mode: PlaceDistanceMatrix(place_ids, distances, durations)
+        for mode, (distances, durations) in matrices.items()
+    }
+
+
+def _incomplete_indices(indices: list[int], distances: np.ndarray) -> set[int]:
+    block = np.isnan(distances[np.ix_(indices, indices)])
+    rows, cols = np.nonzero(block)
+    return {indices[k] for k in np.concatenate([rows, cols])}
+
+
+def _compute_matrices(places, pending, source) -> list[tuple[tuple, bool]]:
+    """
+    The matrices between the ``missing`` places of each ``(mode, missing)``
+    group, and whether to store them. The Geoapify calls of several groups run
+    at the same time, so their latency doesn't add up.
+    """
+    calls = [
+        (
+            [(float(places[i].latitude), float(places[i].longitude)) for i in missing],
+            mode,
+        )
+        for mode, missing in pending
+    ]
+
+    fetched = [None] * len(calls)
+    if source == DistanceSource.GEOAPIFY and len(calls) == 1:
+        fetched = [_fetch_geoapify_matrix(*calls[0])]
+    elif source == DistanceSource.GEOAPIFY and calls:
+        with ThreadPoolExecutor(
+            max_workers=min(len(calls), settings.PLACE_MATRIX_MAX_WORKERS),
+            thread_name_prefix="route-matrix",
+        ) as pool:
+            fetched = list(pool.map(lambda args: _fetch_geoapify_matrix(*args), calls))
+
+    computed = []
+    for (coordinates, mode), matrices in zip(calls, fetched):
+        # A fallback estimate is not kept, the next call asks Geoapify again
+        store = matrices is not None or source == DistanceSource.ESTIMATE
+        if matrices is None:
+            matrices = estimate_travel_matrices(coordinates, mode)
+        computed.append((matrices, store))
+    return computed
+
+
+def _fill_missing(
+    places, missing, matrices, store, distances, durations, mode, source
+) -> list[PlaceDistance]:
+    """
+    Copy the pairs among ``missing`` that are still unknown from ``matrices``,
+    return the ones to store as unsaved rows.
+    """
+    computed_distances, computed_durations = matrices
+
+    new_rows = []
+    for a, i in enumerate(missing):
+        for b, j in enumerate(missing):
+            if not np.isnan(distances[i, j]):
+                continue
+            distances[i, j] = computed_distances[a, b]
+            durations[i, j] = computed_durations[a, b]
+            if not store:
+                continue
+            new_rows.append(
+                PlaceDistance(
+                    origin=places[i],
+                    destination=places[j],
+                    mode=mode,
+                    distance=float(computed_distances[a, b]),
+                    duration=float(computed_durations[a, b]),
+                    source=source,
+                )
+            )
+    return new_rows
+
+
+def _fetch_geoapify_matrix(coordinates, mode) -> tuple[np.ndarray, np.ndarray] | None:
+    locations = [{"location": [lng, lat]} for lat, lng in coordinates]
+    try:
+        response = get_http_client("geoapify").post(
+            GEOAPIFY_MATRIX_URL.format(
+                settings.GEOAPIFY_BASE_URL, settings.GEOAPIFY_API_KEY
+            ),
+            json={"mode": mode, "sources": locations, "targets": locations},
+        )
+        response.raise_for_status()
+        data = response.json()
+    except (requests.RequestException, CircuitOpenError, ValueError) as e:
+        # Unreachable, failing or not answering JSON
+        logger.warning("Route matrix request failed, falling back to estimates: %s", e)
+        return None
+
+    size = len(coordinates)
+    distances = np.full((size, size), np.nan)
+    durations = np.full((size, size), np.nan)
+    for row in data.get("sources_to_targets", []):
+        for cell in row:
+            i, j = cell["source_index"], cell["target_index"]
+            if cell.get("distance") is not None:
+                distances[i, j] = cell["distance"]
+                durations[i, j] = cell["time"]
+
+    # Unreachable pairs get an estimate so the solver still has a finite cost
+    if np.isnan(distances).any():
+        estimated_distances, estimated_durations = estimate_travel_matrices(
+            coordinates, mode
+        )
+        gaps = np.isnan(distances)
+        distances[gaps] = estimated_distances[gaps]
+        durations[gaps] = estimated_durations[gaps]
+
+    return distances, durations
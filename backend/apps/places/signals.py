@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Place
+from .services import place_cache
+
+
+@receiver([post_save, post_delete], sender=Place)
+def discard_cached_place(sender, instance: Place, **kwargs):
+    place_cache.discard(instance.external_id)
@@ -1 +1,215 @@
-# Create your tests here.
+import threading
+import time
+from unittest import mock
+
+import numpy as np
+import requests
+from django.test import TestCase
+
+from apps.core.exceptions import CircuitOpenError
+from .geo import estimate_travel_matrices
+from .models import DistanceSource, Place, PlaceDistance
+from .services import (
+    PlaceCache,
+    get_distance_matrices,
+    get_distance_matrix,
+    get_or_create_places,
+    place_cache,
+)
+
+
+def payload(external_id, name=None):
+    return {
+        "external_id": external_id,
+        "name": name or external_id,
+        "latitude": "48.8566000000000000",
+        "longitude": "2.3522000000000000",
+    }
+
+
+class GetOrCreatePlacesTests(TestCase):
+    def setUp(self):
+        place_cache.clear()
+        self.existing = Place.objects.create(**payload("existing", "Stored name"))
+
+    def test_new_and_existing(self):
+        # Lookup, insert of the new ones, lookup of the new ones
+        with self.assertNumQueries(3):
+            places = get_or_create_places(
+                [payload("existing", "Other name"), payload("new"), payload("new")]
+            )
+        self.assertEqual(places["existing"].id, self.existing.id)
+        self.assertEqual(places["existing"].name, "Stored name")
+        self.assertEqual(places["new"], Place.objects.get(external_id="new"))
+
+    def test_cached_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            get_or_create_places([payload("existing")])
+        with self.assertNumQueries(0):
+            place = get_or_create_places([payload("existing")])["existing"]
+        self.assertEqual(place, self.existing)
+        self.assertEqual(place.name, "Stored name")
+
+        # Saving a place drops it from the cache
+        self.existing.name = "Renamed"
+        self.existing.save()
+        place = get_or_create_places([payload("existing")])["existing"]
+        self.assertEqual(place.name, "Renamed")
+
+    def test_not_cached_without_commit(self):
+        get_or_create_places([payload("existing")])
+        self.assertEqual(place_cache.get_many(["existing"]), {})
+
+
+class PlaceCacheTests(TestCase):
+    def test_least_recently_used_goes_first(self):
+        cache = PlaceCache(maxsize=2, ttl=60)
+        places = {
+            external_id: Place.objects.create(**payload(external_id))
+            for external_id in ["a", "b", "c"]
+        }
+        cache.set_many({"a": places["a"], "b": places["b"]})
+        cache.get_many(["a"])
+        cache.set_many({"c": places["c"]})
+        self.assertEqual(set(cache.get_many(["a", "b", "c"])), {"a", "c"})
+
+    def test_entries_expire(self):
+        cache = PlaceCache(maxsize=10, ttl=60)
+        place = Place.objects.create(**payload("a"))
+        with mock.patch("apps.places.services.time.monotonic", return_value=1000):
+            cache.set_many({"a": place})
+        with mock.patch("apps.places.services.time.monotonic", return_value=1059):
+            self.assertEqual(cache.get_many(["a"]), {"a": place})
+        with mock.patch("apps.places.services.time.monotonic", return_value=1060):
+            self.assertEqual(cache.get_many(["a"]), {})
+        self.assertEqual(len(cache._rows), 0)
+
+    def test_place_deleted_by_another_process(self):
+        place = Place.objects.create(**payload("gone"))
+        with self.captureOnCommitCallbacks(execute=True):
+            get_or_create_places([payload("gone")])
+        # No post_delete in this process, like a delete made by another worker
+        Place.objects.filter(id=place.id)._raw_delete(Place.objects.db)
+
+        with mock.patch(
+            "apps.places.services.time.monotonic",
+            return_value=time.monotonic() + place_cache.ttl,
+        ):
+            recreated = get_or_create_places([payload("gone")])["gone"]
+        self.assertNotEqual(recreated.id, place.id)
+        self.assertTrue(Place.objects.filter(id=recreated.id).exists())
+
+
+class DistanceMatrixTests(TestCase):
+    def setUp(self):
+        self.days = [
+            [
+                Place.objects.create(
+                    external_id=f"day{day}:{i}",
+                    name=f"Stop {i}",
+                    latitude=48.85 + day * 0.1 + i * 0.01,
+                    longitude=2.35 + i * 0.01,
+                )
+                for i in range(3)
+            ]
+            for day in range(4)
+        ]
+
+    def test_fills_each_group(self):
+        # The stored pairs, then one insert of the missing ones
+        with self.assertNumQueries(2):
+            matrix = get_distance_matrix(self.days, source=DistanceSource.ESTIMATE)
+        # 3 × 2 ordered pairs per day, none across days
+        self.assertEqual(PlaceDistance.objects.count(), 4 * 6)
+
+        first, second = self.days[0], self.days[1]
+        distances, _ = matrix.submatrix([place.id for place in first])
+        self.assertFalse(np.isnan(distances).any())
+        across, _ = matrix.submatrix([first[0].id, second[0].id])
+        self.assertTrue(np.isnan(across[0, 1]))
+
+        # Everything needed is stored now
+        with self.assertNumQueries(1):
+            get_distance_matrix(self.days, source=DistanceSource.ESTIMATE)
+
+    def test_several_modes(self):
+        # One read and one insert for every mode
+        with self.assertNumQueries(2):
+            matrices = get_distance_matrices(
+                self.days, ["walk", "drive"], source=DistanceSource.ESTIMATE
+            )
+        self.assertEqual(PlaceDistance.objects.count(), 2 * 4 * 6)
+        ids = [place.id for place in self.days[0]]
+        _, walk = matrices["walk"].submatrix(ids)
+        _, drive = matrices["drive"].submatrix(ids)
+        self.assertTrue(
+            (walk[~np.eye(3, dtype=bool)] > drive[~np.eye(3, dtype=bool)]).all()
+        )
+
+    def test_geoapify_failure_is_not_stored(self):
+        day = self.days[0]
+        with mock.patch(
+            "apps.places.services._fetch_geoapify_matrix", return_value=None
+        ) as fetch:
+            matrix = get_distance_matrix([day], source=DistanceSource.GEOAPIFY)
+            distances, _ = matrix.submatrix([place.id for place in day])
+            # Estimated for this call only
+            self.assertFalse(np.isnan(distances).any())
+            self.assertFalse(PlaceDistance.objects.exists())
+
+            get_distance_matrix([day], source=DistanceSource.GEOAPIFY)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_geoapify_groups_are_fetched_concurrently(self):
+        # Every day's call has to be in flight before any of them can return
+        barrier = threading.Barrier(len(self.days), timeout=5)
+
+        def fetch(coordinates, mode):
+            barrier.wait()
+            return estimate_travel_matrices(coordinates, mode)
+
+        with mock.patch(
+            "apps.places.services._fetch_geoapify_matrix", side_effect=fetch
+        ) as fetch_matrix:
+            get_distance_matrix(self.days, source=DistanceSource.GEOAPIFY)
+        self.assertEqual(fetch_matrix.call_count, len(self.days))
+        self.assertEqual(
+            PlaceDistance.objects.filter(source=DistanceSource.GEOAPIFY).count(),
+            4 * 6,
+        )
+
+    def test_geoapify_unreachable(self):
+        day = self.days[0]
+        for error in [
+            requests.ConnectionError("refused"),
+            CircuitOpenError("geoapify"),
+        ]:
+            with (
+                self.subTest(error=type(error).__name__),
+                mock.patch("apps.places.services.get_http_client") as http_client,
+                self.assertLogs("apps.places.services", "WARNING") as logs,
+            ):
+                http_client.return_value.post.side_effect = error
+                matrix = get_distance_matrix([day], source=DistanceSource.GEOAPIFY)
+            self.assertIn("falling back to estimates", logs.output[0])
+        distances, _ = matrix.submatrix([place.id for place in day])
+        self.assertFalse(np.isnan(distances).any())
+        self.assertFalse(PlaceDistance.objects.exists())
+
+    def test_geoapify_replaces_estimates(self):
+        day = self.days[0]
+        get_distance_matrix([day], source=DistanceSource.ESTIMATE)
+        self.assertEqual(PlaceDistance.objects.count(), 6)
+
+        answer = (np.full((3, 3), 1234.0), np.full((3, 3), 56.0))
+        with mock.patch(
+            "apps.places.services._fetch_geoapify_matrix", return_value=answer
+        ):
+            matrix = get_distance_matrix([day], source=DistanceSource.GEOAPIFY)
+        distances, _ = matrix.submatrix([day[0].id, day[1].id])
+        self.assertEqual(distances[0, 1], 1234.0)
+        self.assertEqual(
+            set(PlaceDistance.objects.values_list("source", "distance")),
+            {(DistanceSource.GEOAPIFY, 1234.0)},
+        )
+        self.assertEqual(PlaceDistance.objects.count(), 6)
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     "allauth.socialaccount",
     "corsheaders",
     "django_extensions",
+    "apps.core",
     "apps.accounts",
     "apps.itineraries",
     "apps.places",
@@ -120,6 +121,22 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Optimized route results, keyed on the stops' content (LRU + TTL eviction)
+    "routes": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "routes",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -263,6 +280,54 @@ FRONTEND_PASSWORD_RESET_PATH_NAME = os.environ.get(
 FRONTEND_SHARE_PATH_NAME = os.environ.get("FRONTEND_SHARE_PATH_NAME", "share-trip")
 
 GEOAPIFY_API_KEY = os.environ.get("GEOAPIFY_API_KEY")
+GEOAPIFY_BASE_URL = os.environ.get("GEOAPIFY_BASE_URL", "https://api.geoapify.com")
+# Per-service overrides for apps.core.http_client (timeouts in seconds)
+EXTERNAL_HTTP_CLIENTS = {
+    "geoapify": {
+        "connect_timeout": 3.05,
+        "read_timeout": float(os.environ.get("GEOAPIFY_READ_TIMEOUT", 15)),
+        "retries": 2,
+        "pool_maxsize": 10,
+        "failure_threshold": 5,
+        "reset_timeout": 30,
+    },
+}
+# Route optimizer engine: "geoapify" (external API) or "local" (in-process solver)
+ROUTE_OPTIMIZER_ENGINE = os.environ.get("ROUTE_OPTIMIZER_ENGINE", "geoapify")
+# Upper bound on days solved concurrently by whole-trip optimization
+ROUTE_OPTIMIZER_MAX_WORKERS = int(os.environ.get("ROUTE_OPTIMIZER_MAX_WORKERS", 8))
+# Background route optimization jobs
+ROUTE_JOB_WORKERS = int(os.environ.get("ROUTE_JOB_WORKERS", 4))
+ROUTE_JOB_RESULT_TTL = int(os.environ.get("ROUTE_JOB_RESULT_TTL", 60 * 60))
+ROUTE_JOB_STALE_AFTER = int(os.environ.get("ROUTE_JOB_STALE_AFTER", 5 * 60))
+# Running jobs older than this were lost with their process and are failed
+ROUTE_JOB_TIMEOUT = int(os.environ.get("ROUTE_JOB_TIMEOUT", 10 * 60))
+# Route geometry simplification tolerance, in meters (0 keeps every point)
+ROUTE_GEOMETRY_TOLERANCE = float(os.environ.get("ROUTE_GEOMETRY_TOLERANCE", 5))
+# Where missing place-to-place distances come from: "estimate" or "geoapify"
+PLACE_DISTANCE_SOURCE = os.environ.get("PLACE_DISTANCE_SOURCE", "estimate")
+# How many Geoapify route matrix calls one distance lookup makes at the same time
+PLACE_MATRIX_MAX_WORKERS = int(os.environ.get("PLACE_MATRIX_MAX_WORKERS", 8))
+# How many places (by external_id) each process keeps in memory
+PLACE_CACHE_SIZE = int(os.environ.get("PLACE_CACHE_SIZE", 10000))
+# Seconds before a cached place is looked up again, other processes' writes
+# never reach this one's cache
+PLACE_CACHE_TTL = float(os.environ.get("PLACE_CACHE_TTL", 60))
+ROUTE_CACHE_ALIAS = "routes"
+ROUTE_CACHE_TIMEOUT = int(os.environ.get("ROUTE_CACHE_TIMEOUT", 60 * 60 * 24))
+# Shared trip links: how long browsers and shared caches may reuse a response,
+# and how long an unknown or revoked token is answered with a 404 from cache
+PUBLIC_TRIP_MAX_AGE = int(os.environ.get("PUBLIC_TRIP_MAX_AGE", 60))
+PUBLIC_TRIP_MISSING_TTL = int(os.environ.get("PUBLIC_TRIP_MISSING_TTL", 30))
+# Trip changes feed: deletions are remembered this many seconds, older cursors
+# must reload the trip, and each cursor is moved back by the overlap so rows
+# written by transactions still in flight are not skipped
+TRIP_TOMBSTONE_TTL = int(os.environ.get("TRIP_TOMBSTONE_TTL", 60 * 60 * 24 * 30))
+TRIP_CHANGES_OVERLAP = int(os.environ.get("TRIP_CHANGES_OVERLAP", 5))
+# Live trip updates: the publish/subscribe backend (swap it for one shared by
+# all processes when running several), and how often idle streams get a ping
+PUBSUB_BROKER = os.environ.get("PUBSUB_BROKER", "apps.core.pubsub.InProcessBroker")
+TRIP_STREAM_KEEPALIVE = int(os.environ.get("TRIP_STREAM_KEEPALIVE", 15))
 LLM_PROVIDER_API_KEY = os.environ.get("LLM_PROVIDER_API_KEY")
 LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "groq")
 LLM_MODEL = os.environ.get("LLM_MODEL", "llama3-8b-8192")
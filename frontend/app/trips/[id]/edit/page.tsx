@@ -147,7 +147,7 @@ export default function EditItineraryPage() {
 
                     // Fetch lodgings
                     try {
-                        const lodgingsData = await api.get(`/trips/${tripId}/lodgings/`);
+                        const lodgingsData = await api.list(`/trips/${tripId}/lodgings/`);
                         setLodgings(lodgingsData);
                     } catch (lodgingError) {
                         console.error('Failed to fetch lodgings:', lodgingError);
@@ -164,7 +164,7 @@ export default function EditItineraryPage() {
                 // Trip exists, but make sure we have lodgings
                 const fetchLodgings = async () => {
                     try {
-                        const lodgingsData = await api.get(`/trips/${tripId}/lodgings/`);
+                        const lodgingsData = await api.list(`/trips/${tripId}/lodgings/`);
                         setLodgings(lodgingsData);
                     } catch (lodgingError) {
                         console.error('Failed to fetch lodgings:', lodgingError);
@@ -143,14 +143,14 @@ export default function TripDetailPage() {
                 setTrip(tripData);
 
                 try {
-                    const savedPlacesData = await api.get(`/trips/${tripId}/saved-places/`);
+                    const savedPlacesData = await api.list(`/trips/${tripId}/saved-places/`);
                     setFavorites(savedPlacesData);
                 } catch (favError) {
                     setFavorites([]);
                 }
 
                 try {
-                    const lodgingsData = await api.get(`/trips/${tripId}/lodgings/`);
+                    const lodgingsData = await api.list(`/trips/${tripId}/lodgings/`);
                     setLodgings(lodgingsData);
                 } catch (lodgingError) {
                     setLodgings([]);
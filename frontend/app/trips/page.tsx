@@ -55,7 +55,7 @@ export default function TripsPage() {
   useEffect(() => {
     const fetchTrips = async () => {
       try {
-        const data = await api.get<Trip[]>('/trips/');
+        const data = await api.list<Trip>('/trips/');
         setTrips(data);
       } catch (error) {
         console.error('Failed to fetch trips:', error);
@@ -5,14 +5,24 @@ const API_BASE = process.env.NEXT_PUBLIC_DJANGO_API_BASE?.replace(/\/$/, '') ||
 
 interface FetchOptions extends RequestInit {
   requiresAuth?: boolean;
+  // Return the whole { status, message, data, meta } response instead of data
+  envelope?: boolean;
 }
 
 interface ApiResponse<T = any> {
   status: boolean;
   message: string;
   data: T;
+  meta?: {
+    count: number | null;
+    next: string | null;
+    previous: string | null;
+  };
 }
 
+// Largest page the API serves, so long lists take as few requests as possible
+const LIST_PAGE_SIZE = 200;
+
 /**
  * Fetch helper that works in both client and server
  * Auto-handles auth tokens and refresh on 401
@@ -21,7 +31,7 @@ export async function apiFetch<T = any>(
   endpoint: string,
   options: FetchOptions = {}
 ): Promise<T> {
-  const { requiresAuth = true, headers = {}, ...restOptions } = options;
+  const { requiresAuth = true, envelope = false, headers = {}, ...restOptions } = options;
   const url = endpoint.startsWith('http') ? endpoint : `${API_BASE}${endpoint}`;
   const token = cookieManager.getAccessToken();
 
@@ -71,7 +81,7 @@ export async function apiFetch<T = any>(
         }
 
         const retryData = JSON.parse(retryText);
-        return unwrapResponse<T>(retryData);
+        return envelope ? retryData : unwrapResponse<T>(retryData);
       } else {
         // Refresh failed, redirect to login
         if (typeof window !== 'undefined') {
@@ -101,7 +111,7 @@ export async function apiFetch<T = any>(
     }
 
     const data = JSON.parse(text);
-    return unwrapResponse<T>(data);
+    return envelope ? data : unwrapResponse<T>(data);
   } catch (error) {
     console.error('API Fetch Error:', error);
     throw error;
@@ -153,6 +163,18 @@ export const api = {
   get: <T = any>(endpoint: string, options?: FetchOptions) =>
     apiFetch<T>(endpoint, { ...options, method: 'GET' }),
 
+  // Every item of a paginated list, following meta.next until the last page
+  list: async <T = any>(endpoint: string, options?: FetchOptions): Promise<T[]> => {
+    const items: T[] = [];
+    let next: string | null = `${endpoint}${endpoint.includes('?') ? '&' : '?'}page_size=${LIST_PAGE_SIZE}`;
+    while (next) {
+      const page: ApiResponse<T[]> = await apiFetch(next, { ...options, method: 'GET', envelope: true });
+      items.push(...(page.data || []));
+      next = page.meta?.next ?? null;
+    }
+    return items;
+  },
+
   post: <T = any>(endpoint: string, data?: any, options?: FetchOptions) =>
     apiFetch<T>(endpoint, {
       ...options,
@@ -350,7 +350,7 @@ export const useTripStore = create<TripState>((set, get) => ({
       });
       
       // Refetch favorites to get the new ID
-      const savedPlacesData = await api.get(`/trips/${tripId}/saved-places/`);
+      const savedPlacesData = await api.list(`/trips/${tripId}/saved-places/`);
       get().setFavorites(savedPlacesData);
       
       // Update selected place if it's the same one
@@ -445,7 +445,7 @@ export const useTripStore = create<TripState>((set, get) => ({
       });
       
       // Refetch lodgings
-      const lodgingsData = await api.get(`/trips/${tripId}/lodgings/`);
+      const lodgingsData = await api.list(`/trips/${tripId}/lodgings/`);
       get().setLodgings(lodgingsData);
       
     } catch (error) {
@@ -496,7 +496,7 @@ export const useTripStore = create<TripState>((set, get) => ({
       await api.delete(`/trips/${tripId}/lodgings/${lodgingId}/`);
       
       // Refetch lodgings
-      const lodgingsData = await api.get(`/trips/${tripId}/lodgings/`);
+      const lodgingsData = await api.list(`/trips/${tripId}/lodgings/`);
       get().setLodgings(lodgingsData);
       
     } catch (error) {